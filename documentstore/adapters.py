@@ -10,10 +10,19 @@ implementações.
 """
 import logging
 import json
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Mapping
 
 import pymongo
 import bson
 from bson.objectid import ObjectId
+from prometheus_client import Counter
 
 from . import interfaces
 from . import exceptions
@@ -22,6 +31,38 @@ from . import domain
 
 LOGGER = logging.getLogger(__name__)
 
+_PERSISTED_MANIFESTS = weakref.WeakKeyDictionary()
+"""Associa cada instância de entidade lida ou escrita por meio de `BaseStore`
+ao manifesto que se encontra persistido. É a partir dessa informação que as
+atualizações parciais são calculadas.
+"""
+
+_MISSING = object()
+
+MANIFESTCACHE_HITS_TOTAL = Counter(
+    "kernel_manifestcache_hits_total",
+    "Total number of entities served from the shared manifest cache",
+)
+MANIFESTCACHE_MISSES_TOTAL = Counter(
+    "kernel_manifestcache_misses_total",
+    "Total number of entities not found in the shared manifest cache",
+)
+MANIFESTCACHE_INVALIDATIONS_TOTAL = Counter(
+    "kernel_manifestcache_invalidations_total",
+    "Total number of shared manifest cache entries invalidated by changes",
+)
+
+CHANGES_ENTITIES_NAMESPACES = {
+    "Document": "Document",
+    "DocumentRendition": "Document",
+    "DocumentsBundle": "DocumentsBundle",
+    "Journal": "Journal",
+}
+"""Associa o valor do campo `entity` dos registros de mudança ao espaço de
+nomes, em `ManifestCache`, das entidades correspondentes, que é o nome de sua
+classe de domínio.
+"""
+
 
 class MongoDB:
     """Abstrai a configuração do MongoDB de maneira que nenhum outro objeto do 
@@ -91,7 +132,55 @@ class MongoDB:
     def changes(self):
         return self._collection("changes")
 
+    @property
+    def rendered_documents(self):
+        return self._collection("rendered_documents")
+
+    @property
+    def changes_blobs(self):
+        return self._collection("changes_blobs")
+
+    @property
+    def changes_latest(self):
+        return self._collection("changes_latest")
+
     def create_indexes(self):
+        self.changes_latest.create_index(
+            [("entity", pymongo.ASCENDING), ("id", pymongo.ASCENDING)],
+            unique=True,
+            background=True,
+        )
+        self.changes_latest.create_index(
+            [("timestamp", pymongo.ASCENDING), ("change_id", pymongo.ASCENDING)],
+            background=True,
+        )
+        self.changes_latest.create_index(
+            [
+                ("entity", pymongo.ASCENDING),
+                ("timestamp", pymongo.ASCENDING),
+                ("change_id", pymongo.ASCENDING),
+            ],
+            background=True,
+        )
+        self.changes.create_index(
+            [
+                ("entity", pymongo.ASCENDING),
+                ("timestamp", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+            ],
+            background=True,
+        )
+        self.changes.create_index(
+            [
+                ("id", pymongo.ASCENDING),
+                ("timestamp", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+            ],
+            background=True,
+        )
+        self.changes.create_index(
+            [("content_hash", pymongo.ASCENDING)], sparse=True, background=True
+        )
         self.changes.create_index(
             [("timestamp", pymongo.ASCENDING)], unique=True, background=True
         )
@@ -100,40 +189,319 @@ class MongoDB:
 class Session(interfaces.Session):
     """Implementação de `interfaces.Session` para armazenamento em MongoDB.
     Trata-se de uma classe concreta e não deve ser generalizada.
+
+    As instâncias de `DataStore` são criadas uma única vez por sessão e
+    compartilham um mapa de identidade, de maneira que as entidades lidas ou
+    escritas durante o tempo de vida da sessão sejam obtidas novamente sem
+    acesso ao banco de dados. As escritas continuam sendo imediatas.
+
+    :param mongodb_client: instância de `MongoDB`.
+    :param materialize_documents: (opcional) se os XMLs dos documentos devem
+    ser armazenados já renderizados, evitando o acesso ao object-store durante
+    a leitura.
+    :param manifest_cache: (opcional) instância de `ManifestCache` em que são
+    mantidos os manifestos dos pacotes de documentos e dos periódicos. Para que
+    o cache não seja alimentado com dados obsoletos, essas entidades passam a
+    ser lidas sempre do membro primário do replicaset.
+    :param dedup_changes: (opcional) se os conteúdos dos registros de mudança
+    devem ser armazenados uma única vez, endereçados pelo seu hash.
+    :param compact_changes: (opcional) se a mudança mais recente de cada
+    entidade deve ser mantida na coleção `changes_latest`, o que permite a
+    consulta compactada da lista de mudanças.
     """
 
-    def __init__(self, mongodb_client):
+    def __init__(
+        self,
+        mongodb_client,
+        materialize_documents=False,
+        manifest_cache=None,
+        dedup_changes=False,
+        compact_changes=False,
+    ):
         self._mongodb_client = mongodb_client
+        self._materialize_documents = materialize_documents
+        self._manifest_cache = manifest_cache
+        self._dedup_changes = dedup_changes
+        self._compact_changes = compact_changes
+        self._stores = {}
+
+    def _cached_collection(self, collection):
+        if self._manifest_cache is None:
+            return collection
+        return collection.with_options(read_preference=pymongo.ReadPreference.PRIMARY)
+
+    def _store(self, name, factory):
+        try:
+            return self._stores[name]
+        except KeyError:
+            store = self._stores[name] = factory()
+            return store
 
     @property
     def documents(self):
-        return DocumentStore(self._mongodb_client.documents)
+        return self._store(
+            "documents",
+            lambda: DocumentStore(self._mongodb_client.documents, identity_map={}),
+        )
 
     @property
     def documents_bundles(self):
-        return DocumentsBundleStore(self._mongodb_client.documents_bundles)
+        return self._store(
+            "documents_bundles",
+            lambda: DocumentsBundleStore(
+                self._cached_collection(self._mongodb_client.documents_bundles),
+                identity_map={},
+                shared_cache=self._manifest_cache,
+            ),
+        )
 
     @property
     def journals(self):
-        return JournalStore(self._mongodb_client.journals)
+        return self._store(
+            "journals",
+            lambda: JournalStore(
+                self._cached_collection(self._mongodb_client.journals),
+                identity_map={},
+                shared_cache=self._manifest_cache,
+            ),
+        )
 
     @property
     def changes(self):
-        return ChangesStore(self._mongodb_client.changes)
+        return self._store(
+            "changes",
+            lambda: ChangesStore(
+                self._mongodb_client.changes,
+                blobs=self._mongodb_client.changes_blobs
+                if self._dedup_changes
+                else None,
+                latest=self._mongodb_client.changes_latest
+                if self._compact_changes
+                else None,
+            ),
+        )
+
+    @property
+    def rendered_documents(self):
+        if not self._materialize_documents:
+            return None
+        return self._store(
+            "rendered_documents",
+            lambda: RenderedDocumentStore(self._mongodb_client.rendered_documents),
+        )
+
+
+class ManifestCache:
+    """Cache LRU, em memória e compartilhado entre as sessões do processo, dos
+    manifestos das entidades lidas ou escritas por meio de `BaseStore`.
+
+    A coerência com os demais processos -- workers ou réplicas da aplicação --
+    é mantida por meio de uma thread que consulta periodicamente a coleção
+    `changes`, a cada `poll_interval` segundos, e invalida as entradas
+    correspondentes às entidades modificadas. Como as mudanças podem ser
+    registradas fora da ordem de seus timestamps, cada consulta revisita os
+    últimos `lookbehind` segundos. As mudanças escritas com atraso superior a
+    esse intervalo não invalidam as entradas, que por isso expiram
+    `max_age` segundos após sua inserção. Caso `max_age` seja 0, as entradas
+    não expiram.
+
+    As leituras que precedem a inserção de uma entrada obtêm uma geração por
+    meio de `generation` e a inserção é descartada caso a entrada tenha sido
+    invalidada no intervalo, o que evita que um manifesto obsoleto ocupe o
+    cache.
+
+    :param changes: função que retorna a coleção `changes` do MongoDB. Caso
+    omitida, as entradas são invalidadas apenas pelas escritas realizadas no
+    próprio processo.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        changes=None,
+        poll_interval: float = 1.0,
+        lookbehind: float = 10.0,
+        max_age: float = 60.0,
+    ):
+        self.max_entries = int(max_entries)
+        self.poll_interval = float(poll_interval)
+        self.lookbehind = timedelta(seconds=lookbehind)
+        self.max_age = float(max_age)
+        self._changes = changes
+        self._entries = OrderedDict()  # (namespace, id) -> (entrada, expiração)
+        self._invalidations = OrderedDict()  # (namespace, id) -> geração
+        self._generation = 0
+        self._floor = 0  # gerações anteriores não podem inserir entradas
+        self._lock = threading.Lock()
+        self._follower_pid = None
+        self._since = None
+        self._seen = {}  # ids das mudanças já processadas -> timestamp
+        self._stop = threading.Event()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, namespace: str, id: str):
+        if not self._is_following():
+            return None
+
+        key = (namespace, id)
+        with self._lock:
+            try:
+                entry, expires = self._entries[key]
+            except KeyError:
+                MANIFESTCACHE_MISSES_TOTAL.inc()
+                return None
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                MANIFESTCACHE_MISSES_TOTAL.inc()
+                return None
+            self._entries.move_to_end(key)
+        MANIFESTCACHE_HITS_TOTAL.inc()
+        return entry
+
+    def set(self, namespace: str, id: str, entry, generation: int) -> None:
+        key = (namespace, id)
+        with self._lock:
+            if generation < self._floor or generation < self._invalidations.get(
+                key, 0
+            ):
+                return None
+            expires = time.monotonic() + self.max_age if self.max_age > 0 else None
+            self._entries[key] = (entry, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str, id: str) -> None:
+        key = (namespace, id)
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+            self._invalidations[key] = self._generation
+            self._invalidations.move_to_end(key)
+            while len(self._invalidations) > self.max_entries:
+                _, generation = self._invalidations.popitem(last=False)
+                self._floor = max(self._floor, generation)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._invalidations.clear()
+            self._floor = self._generation
+
+    def _is_following(self) -> bool:
+        """Garante que a thread que acompanha a coleção `changes` esteja em
+        execução no processo atual, o que é verificado a cada acesso pois o
+        processo pode ter sido bifurcado após a criação da instância. Retorna
+        `False` enquanto as mudanças ainda não puderem ser acompanhadas.
+        """
+        if self._changes is None:
+            return True
+
+        pid = os.getpid()
+        if self._follower_pid != pid:
+            with self._lock:
+                if self._follower_pid != pid:
+                    self._follower_pid = pid
+                    self._since = None
+                    threading.Thread(
+                        target=self._follow, name="manifest-cache", daemon=True
+                    ).start()
+        return self._since is not None
+
+    def _follow(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                LOGGER.exception("cannot poll changes to invalidate manifest cache")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def poll(self) -> None:
+        """Invalida as entradas correspondentes às mudanças registradas desde a
+        consulta anterior. Na primeira execução apenas determina o ponto de
+        partida, descartando eventuais entradas preexistentes.
+        """
+        collection = self._changes().with_options(
+            read_preference=pymongo.ReadPreference.PRIMARY
+        )
+        if self._since is None:
+            last = list(
+                collection.find(
+                    {},
+                    sort=[("timestamp", pymongo.DESCENDING)],
+                    projection={"timestamp": 1},
+                ).limit(1)
+            )
+            # as entradas inseridas até aqui não podem ser invalidadas
+            self.clear()
+            self._since = last[0]["timestamp"] if last else ""
+            return None
+
+        since = domain.shift_timestamp(self._since, -self.lookbehind)
+        changes = collection.find(
+            {"timestamp": {"$gt": since}},
+            sort=[("timestamp", pymongo.ASCENDING)],
+            projection={"entity": 1, "id": 1, "timestamp": 1},
+        )
+        for change in changes:
+            if change["_id"] in self._seen:
+                continue
+            self._seen[change["_id"]] = change["timestamp"]
+            namespace = CHANGES_ENTITIES_NAMESPACES.get(change.get("entity"))
+            if namespace is not None:
+                self.invalidate(namespace, change["id"])
+                MANIFESTCACHE_INVALIDATIONS_TOTAL.inc()
+            self._since = max(self._since, change["timestamp"])
+
+        since = domain.shift_timestamp(self._since, -self.lookbehind)
+        self._seen = {
+            id: timestamp for id, timestamp in self._seen.items() if timestamp > since
+        }
+
+
+def _from_latest(latest: dict) -> dict:
+    """Produz o registro de mudança a partir de sua referência na coleção
+    `changes_latest`."""
+    change = {"_id": latest.pop("change_id")}
+    change.update(latest)
+    return change
 
 
 class BaseStore(interfaces.DataStore):
     """Implementação de `interfaces.DataStore` para armazenamento em MongoDB.
     Trata-se de uma classe abstrata que deve ser estendida por outras que
     implementam/definem o atributo `DomainClass`.
+
+    As atualizações de entidades obtidas ou registradas por meio de instâncias
+    de `BaseStore` são traduzidas em operações parciais do MongoDB (`$push`,
+    `$set` e `$unset`) que contemplam apenas as partes modificadas do manifesto.
+    Como as funções que manipulam os manifestos compartilham as estruturas
+    inalteradas, as modificações são identificadas por meio da comparação de
+    identidade entre os valores do manifesto persistido e do atual.
+
+    Opcionalmente, os manifestos podem ser compartilhados entre as sessões por
+    meio de `shared_cache`, instância de `ManifestCache`.
     """
 
-    def __init__(self, collection):
+    def __init__(
+        self,
+        collection,
+        identity_map: dict = None,
+        shared_cache: "ManifestCache" = None,
+    ):
         self._collection = collection
+        self._identity_map = identity_map
+        self._shared_cache = shared_cache
 
     def _pre_write(self, data) -> dict:
         """Tratamento anterior ao armazenamento do dado no MongoDB."""
-        _manifest = data.manifest
+        _manifest = dict(data.manifest_view)
         if not _manifest.get("_id"):
             _manifest["_id"] = data.id()
         return _manifest["_id"], _manifest
@@ -142,56 +510,714 @@ class BaseStore(interfaces.DataStore):
         """Tratamento posterior à leitura do dado no MongoDB."""
         return data
 
+    def _supports_partial_update(self, data: dict) -> bool:
+        """Indica se o dado lido do MongoDB está num formato que permite
+        atualizações parciais."""
+        return True
+
+    def _generation(self):
+        """Geração de `ManifestCache` a ser obtida antes das leituras e
+        escritas cujo resultado será registrado por meio de `_remember`."""
+        if self._shared_cache is not None:
+            return self._shared_cache.generation()
+        return None
+
+    def _remember(self, data, manifest: dict, rev: int, generation: int = None) -> None:
+        """Registra a revisão `rev` do dado persistido e, caso seja possível
+        atualizá-lo parcialmente, seu manifesto."""
+        _PERSISTED_MANIFESTS[data] = (manifest, rev)
+        current = data.manifest_view
+        _id = current.get("_id") or data.id()
+        if self._identity_map is not None:
+            self._identity_map[_id] = (dict(current), manifest, rev)
+        if generation is not None and manifest is not None:
+            self._shared_cache.set(
+                self.DomainClass.__name__,
+                _id,
+                (dict(current), manifest, rev, domain.DataMemo()),
+                generation,
+            )
+
+    def _from_identity_map(self, id: str):
+        """Produz uma nova instância de `DomainClass` a partir do mapa de
+        identidade, ou `None` caso a entidade não tenha sido lida ou escrita
+        por meio deste objeto. Como os manifestos não são modificados, mas
+        substituídos, as instâncias podem compartilhá-los com segurança."""
+        try:
+            current, persisted, rev = self._identity_map[id]
+        except (KeyError, TypeError):
+            return self._from_shared_cache(id)
+        data = self.DomainClass(manifest=current)
+        _PERSISTED_MANIFESTS[data] = (persisted, rev)
+        return data
+
+    def _from_shared_cache(self, id: str):
+        if self._shared_cache is None:
+            return None
+        entry = self._shared_cache.get(self.DomainClass.__name__, id)
+        if entry is None:
+            return None
+        current, persisted, rev, data_memo = entry
+        data = self.DomainClass(manifest=current, data_memo=data_memo)
+        self._remember(data, persisted, rev)
+        return data
+
+    def _forget(self, id: str) -> None:
+        if self._identity_map is not None:
+            self._identity_map.pop(id, None)
+        if self._shared_cache is not None:
+            self._shared_cache.invalidate(self.DomainClass.__name__, id)
+
+    def _update_operations(self, persisted: dict, manifest: Mapping) -> dict:
+        """Produz as operações de atualização do MongoDB que transformam
+        `persisted` em `manifest`. Retorna `None` caso não seja possível
+        representar a modificação de maneira parcial.
+        """
+        operations = {}
+        for key in persisted.keys() - manifest.keys():
+            operations.setdefault("$unset", {})[key] = ""
+
+        for key, value in manifest.items():
+            old_value = persisted.get(key, _MISSING)
+            if value is old_value:
+                continue
+            elif key == "metadata" and old_value is not _MISSING:
+                _metadata_operations(operations, old_value, value)
+            elif key == "items" and old_value is not _MISSING:
+                _list_operations(operations, key, old_value, value)
+            else:
+                operations.setdefault("$set", {})[key] = value
+
+        return operations
+
     def add(self, data) -> None:
+        generation = self._generation()
         try:
             _, _manifest = self._pre_write(data)
+            _manifest["_rev"] = 1
             self._collection.insert_one(_manifest)
         except pymongo.errors.DuplicateKeyError:
             raise exceptions.AlreadyExists(
                 "cannot add data with id " '"%s": the id is already in use' % data.id()
             ) from None
+        self._remember(data, dict(data.manifest_view), 1, generation)
+
+    def add_many(self, data: list) -> list:
+        """Registra as entidades de `data` por meio de uma única operação
+        `insert_many` não ordenada. Veja `interfaces.DataStore.add_many`.
+
+        As falhas de escrita são informadas por item, inclusive as que não
+        decorrem de identificadores duplicados, de maneira que as mudanças das
+        entidades registradas com sucesso possam ser registradas.
+        """
+        if not data:
+            return []
+
+        manifests = []
+        for item in data:
+            _, _manifest = self._pre_write(item)
+            _manifest["_rev"] = 1
+            manifests.append(_manifest)
+
+        results = [None] * len(data)
+        generation = self._generation()
+        try:
+            self._collection.insert_many(manifests, ordered=False)
+        except pymongo.errors.BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                index = error["index"]
+                if error.get("code") == 11000:
+                    results[index] = exceptions.AlreadyExists(
+                        "cannot add data with id "
+                        '"%s": the id is already in use' % data[index].id()
+                    )
+                else:
+                    results[index] = exceptions.NonRetryableError(
+                        'cannot add data with id "%s": %s'
+                        % (data[index].id(), error.get("errmsg"))
+                    )
+
+        for item, result in zip(data, results):
+            if result is None:
+                self._remember(item, dict(item.manifest_view), 1, generation)
+        return results
 
     def update(self, data) -> None:
-        _id, _manifest = self._pre_write(data)
-        result = self._collection.replace_one({"_id": _id}, _manifest)
+        """Atualiza os dados de `data`.
+
+        Caso `data` tenha sido obtido ou registrado por meio de `BaseStore`, a
+        atualização é condicionada à revisão do dado persistido no momento da
+        leitura, e `exceptions.UpdateConflict` é levantada caso ele tenha sido
+        modificado desde então.
+        """
+        try:
+            persisted, rev = _PERSISTED_MANIFESTS[data]
+            conditional = True
+        except KeyError:
+            persisted, rev, conditional = None, None, False
+
+        if persisted is not None:
+            operations = self._update_operations(persisted, data.manifest_view)
+        else:
+            operations = None
+
+        generation = self._generation()
+
+        if operations is None:
+            _id, _manifest = self._pre_write(data)
+            if conditional:
+                _manifest["_rev"] = (rev or 0) + 1
+                result = self._collection.replace_one(
+                    {"_id": _id, "_rev": rev}, _manifest
+                )
+            else:
+                result = self._collection.replace_one({"_id": _id}, _manifest)
+        elif operations:
+            _id = data.manifest_view.get("_id") or data.id()
+            operations["$inc"] = {"_rev": 1}
+            result = self._collection.update_one({"_id": _id, "_rev": rev}, operations)
+        else:
+            return
+
         if result.matched_count == 0:
+            self._forget(_id)
+            if conditional and self._collection.count_documents(
+                {"_id": _id}, limit=1
+            ):
+                raise exceptions.UpdateConflict(
+                    "cannot update data with id "
+                    '"%s": data was modified by another writer' % data.id()
+                )
             raise exceptions.DoesNotExist(
                 "cannot update data with id " '"%s": data does not exist' % data.id()
             )
 
+        if conditional:
+            self._remember(data, dict(data.manifest_view), (rev or 0) + 1, generation)
+        else:
+            self._forget(_id)
+
+    def _to_domain(self, manifest: dict, generation: int = None):
+        """Produz a instância de `DomainClass` a partir do dado lido do
+        MongoDB."""
+        rev = manifest.pop("_rev", None)
+        data = self.DomainClass(manifest=self._post_read(manifest))
+        if self._supports_partial_update(manifest):
+            self._remember(data, dict(data.manifest_view), rev, generation)
+        else:
+            self._remember(data, None, rev)
+        return data
+
     def fetch(self, id: str):
+        data = self._from_identity_map(id)
+        if data is not None:
+            return data
+
+        generation = self._generation()
         manifest = self._collection.find_one({"_id": id})
         if manifest:
-            return self.DomainClass(manifest=self._post_read(manifest))
+            return self._to_domain(manifest, generation)
         else:
             raise exceptions.DoesNotExist(
                 "cannot fetch data with id " '"%s": data does not exist' % id
             )
 
+    def scan(self, batch_size: int = 500):
+        """As entidades produzidas não são mantidas no mapa de identidade nem
+        em `shared_cache`, o que permite percorrer coleções inteiras com uso
+        constante de memória.
+        """
+        for manifest in self._collection.find(
+            {}, sort=[("_id", pymongo.ASCENDING)], batch_size=batch_size
+        ):
+            manifest.pop("_rev", None)
+            yield self.DomainClass(manifest=self._post_read(manifest))
+
+    def fetch_many(self, ids: list) -> list:
+        """Recupera as entidades identificadas por `ids` por meio de uma única
+        consulta. Veja `interfaces.DataStore.fetch_many`.
+        """
+        domain_instances = {}
+        for id in ids:
+            data = self._from_identity_map(id)
+            if data is not None:
+                domain_instances[id] = data
+
+        missing = list({id for id in ids if id not in domain_instances})
+        if missing:
+            generation = self._generation()
+            for manifest in self._collection.find({"_id": {"$in": missing}}):
+                domain_instances[manifest["_id"]] = self._to_domain(
+                    manifest, generation
+                )
+        return [domain_instances.get(id) for id in ids]
+
+
+def _list_operations(operations: dict, path: str, old_list: list, new_list: list):
+    """Produz as operações que transformam `old_list` em `new_list`. Adições
+    no final da lista ou a inserção de um único item em qualquer posição são
+    traduzidas em `$push`; qualquer outra modificação resulta num `$set` da
+    lista inteira.
+    """
+    old_len = len(old_list)
+    if len(new_list) > old_len and all(
+        new is old for new, old in zip(new_list, old_list)
+    ):
+        operations.setdefault("$push", {})[path] = {"$each": new_list[old_len:]}
+        return
+
+    if len(new_list) == old_len + 1:
+        for position, (new, old) in enumerate(zip(new_list, old_list)):
+            if new is not old:
+                break
+        else:
+            position = old_len
+        if all(
+            new is old for new, old in zip(new_list[position + 1 :], old_list[position:])
+        ):
+            operations.setdefault("$push", {})[path] = {
+                "$each": [new_list[position]],
+                "$position": position,
+            }
+            return
+
+    operations.setdefault("$set", {})[path] = new_list
+
+
+def _metadata_operations(operations: dict, old_metadata: dict, new_metadata: dict):
+    """Produz as operações que transformam `old_metadata` em `new_metadata`,
+    considerando cada um dos metadados individualmente."""
+    for name in old_metadata.keys() - new_metadata.keys():
+        operations.setdefault("$unset", {})["metadata.%s" % name] = ""
+
+    for name, values in new_metadata.items():
+        old_values = old_metadata.get(name, _MISSING)
+        if values is old_values:
+            continue
+        elif old_values is _MISSING:
+            operations.setdefault("$set", {})["metadata.%s" % name] = values
+        else:
+            _list_operations(operations, "metadata.%s" % name, old_values, values)
+
 
 class ChangesStore(interfaces.ChangesDataStore):
     """Implementação de `interfaces.ChangesDataStore` para armazenamento em 
     MongoDB.
+
+    Caso a coleção `blobs` seja informada, os conteúdos das mudanças que
+    possuem `content_hash` são armazenados uma única vez nessa coleção,
+    endereçados pelo hash, e as mudanças passam a conter apenas a referência.
+    Os conteúdos são recuperados por meio de `fetch` e descartados, quando não
+    mais referenciados, por meio de `prune_blobs`.
+
+    Caso a coleção `latest` seja informada, nela é mantida a referência à
+    mudança mais recente de cada entidade, o que permite a consulta compactada
+    da lista de mudanças, por meio de `filter`, e o descarte das mudanças
+    sucedidas, por meio de `prune`.
     """
 
-    def __init__(self, collection):
+    def __init__(self, collection, blobs=None, latest=None):
         self._collection = collection
+        self._blobs = blobs
+        self._latest = latest
+
+    def _store_blobs(self, changes: list) -> list:
+        """Armazena os conteúdos de `changes` na coleção de blobs e retorna
+        as mudanças que devem ser armazenadas, sem os conteúdos."""
+        if self._blobs is None:
+            return changes
+
+        operations = {}
+        stored = []
+        for change in changes:
+            if "content_gz" in change and "content_hash" in change:
+                # `used` registra a mudança mais recente que referencia o
+                # conteúdo, o que impede seu descarte concorrente.
+                operations[change["content_hash"]] = pymongo.UpdateOne(
+                    {"_id": change["content_hash"]},
+                    {
+                        "$setOnInsert": {
+                            "content_gz": change["content_gz"],
+                            "content_type": change.get("content_type"),
+                        },
+                        "$max": {"used": change["timestamp"]},
+                    },
+                    upsert=True,
+                )
+                change = {k: v for k, v in change.items() if k != "content_gz"}
+            stored.append(change)
+
+        if operations:
+            self._blobs.bulk_write(list(operations.values()), ordered=False)
+        return stored
+
+    @staticmethod
+    def _latest_operation(change: dict):
+        """Produz a operação que torna `change` a mudança mais recente de sua
+        entidade em `changes_latest`, caso seja posterior à atual.
+
+        O campo `retain_since` contém o timestamp a partir do qual as mudanças
+        da entidade devem ser mantidas para que o conteúdo de `change` possa
+        ser reconstruído, i.e., o início de sua cadeia de deltas. Caso seja
+        desconhecido, o valor ``""`` impede o descarte das mudanças.
+        """
+        fields = {"timestamp": change["timestamp"], "change_id": change["_id"]}
+        if "delta_base" in change:
+            fields["retain_since"] = change.get("delta_keyframe", "")
+        else:
+            fields["retain_since"] = change["timestamp"]
+        unset = {}
+        for field in ("deleted", "content_hash"):
+            if field in change:
+                fields[field] = change[field]
+            else:
+                unset[field] = ""
+        update = {"$set": fields}
+        if unset:
+            update["$unset"] = unset
+        return pymongo.UpdateOne(
+            {
+                "entity": change["entity"],
+                "id": change["id"],
+                "timestamp": {"$lt": change["timestamp"]},
+            },
+            update,
+            upsert=True,
+        )
+
+    def _store_latest(self, changes: list) -> None:
+        """Atualiza `changes_latest` a partir de `changes`, já armazenadas.
+
+        Como o par ``(entity, id)`` é único, a atualização de uma entidade que
+        já possui mudança mais recente, ou a inserção concorrente da mesma
+        entidade, resulta em erro de chave duplicada. Neste caso a operação é
+        repetida uma única vez, quando a condição de `_latest_operation`
+        passa a ser avaliada contra a mudança já registrada. Outras falhas são
+        apenas registradas em log, já que a coleção pode ser reconstruída por
+        meio de `rebuild_latest`.
+        """
+        if self._latest is None:
+            return
+
+        newest = {}
+        for change in changes:
+            if "entity" not in change or "id" not in change:
+                continue
+            key = (change["entity"], change["id"])
+            if key not in newest or newest[key]["timestamp"] < change["timestamp"]:
+                newest[key] = change
+        operations = [self._latest_operation(change) for change in newest.values()]
+
+        for _ in range(2):
+            if not operations:
+                return
+            try:
+                self._latest.bulk_write(operations, ordered=False)
+                return
+            except pymongo.errors.BulkWriteError as exc:
+                errors = exc.details.get("writeErrors", [])
+                if any(error.get("code") != 11000 for error in errors):
+                    LOGGER.error("cannot update the latest changes: %s", errors)
+                    return
+                operations = [operations[error["index"]] for error in errors]
+            except pymongo.errors.PyMongoError as exc:
+                LOGGER.error("cannot update the latest changes: %s", exc)
+                return
 
     def add(self, change: dict):
+        """Caso `change` já tenha sido armazenada, e.g., numa tentativa
+        anterior cuja confirmação foi perdida, `changes_latest` é atualizada
+        antes do levantamento de `AlreadyExists`.
+        """
+        stored = self._store_blobs([change])[0]
         try:
-            self._collection.insert_one(change)
+            self._collection.insert_one(stored)
         except pymongo.errors.DuplicateKeyError as exc:
+            written = self._collection.find_one({"_id": stored["_id"]})
+            if written is not None and written["timestamp"] == stored["timestamp"]:
+                self._store_latest([stored])
+            raise exceptions.AlreadyExists(
+                'cannot add data with id "%s": %s' % (stored["_id"], exc)
+            ) from None
+        finally:
+            if stored is not change and "_id" in stored:
+                change["_id"] = stored["_id"]
+        self._store_latest([change])
+
+    def add_many(self, changes: list) -> None:
+        """As mudanças são inseridas em ordem. Caso uma delas falhe, as
+        anteriores permanecem armazenadas e `changes_latest` é atualizada a
+        partir delas antes do levantamento de `AlreadyExists`.
+        """
+        if not changes:
+            return
+        stored = self._store_blobs(changes)
+        try:
+            self._collection.insert_many(stored)
+        except pymongo.errors.BulkWriteError as exc:
+            inserted = exc.details.get("nInserted", 0)
+            self._store_latest(stored[:inserted])
             raise exceptions.AlreadyExists(
-                'cannot add data with id "%s": %s' % (change["_id"], exc)
+                "cannot add changes: %s" % exc.details.get("writeErrors")
             ) from None
+        finally:
+            for change, stored_change in zip(changes, stored):
+                if stored_change is not change and "_id" in stored_change:
+                    change["_id"] = stored_change["_id"]
+        self._store_latest(changes)
+
+    def filter(
+        self,
+        since: str = "",
+        limit: int = 500,
+        since_id: str = None,
+        until: str = "",
+        entity: str = "",
+        id: str = "",
+        id_prefix: str = "",
+        compacted: bool = False,
+    ):
+        """As consultas filtradas por `entity`, `id` ou `id_prefix` são
+        atendidas pelos índices criados em `MongoDB.create_indexes`. O filtro
+        por `id_prefix` é convertido numa expressão regular ancorada no início,
+        que o MongoDB resolve como um intervalo do índice.
+
+        As consultas compactadas são atendidas pela coleção `latest` e levantam
+        `ValueError` caso não tenha sido informada.
+        """
+        id_field = "change_id" if compacted else "_id"
+        query = {"timestamp": {"$gt": since}}
+        if since_id is not None:
+            query = {
+                "$or": [
+                    query,
+                    {"timestamp": since, id_field: {"$gt": ObjectId(since_id)}},
+                ]
+            }
+            if until:
+                query["timestamp"] = {"$lte": until}
+        elif until:
+            query["timestamp"]["$lte"] = until
+        if entity:
+            query["entity"] = entity
+        if id:
+            query["id"] = id
+        elif id_prefix:
+            query["id"] = {"$regex": "^" + re.escape(id_prefix)}
+
+        if compacted:
+            if self._latest is None:
+                raise ValueError("compacted changes are not enabled")
+            return (
+                _from_latest(latest)
+                for latest in self._latest.find(
+                    query,
+                    sort=[
+                        ("timestamp", pymongo.ASCENDING),
+                        ("change_id", pymongo.ASCENDING),
+                    ],
+                    projection={"_id": False, "retain_since": False},
+                ).limit(limit)
+            )
 
-    def filter(self, since: str = "", limit: int = 500):
         return self._collection.find(
-            {"timestamp": {"$gt": since}},
+            query,
             sort=[("timestamp", pymongo.ASCENDING)],
-            projection={"content_gz": False, "content_type": False},
+            projection={
+                "content_gz": False,
+                "content_type": False,
+                "delta_gz": False,
+            },
         ).limit(limit)
 
+    def rebuild_latest(self, since: str = "", batch_size: int = 1000) -> int:
+        """Atualiza a coleção `latest` a partir das mudanças posteriores a
+        `since`, e.g., na primeira compactação de uma base de dados existente.
+        Retorna o total de mudanças processadas.
+        """
+        total = 0
+        batch = []
+        for change in self._collection.find(
+            {"timestamp": {"$gt": since}},
+            sort=[("timestamp", pymongo.ASCENDING)],
+            projection={
+                "content_gz": False,
+                "content_type": False,
+                "delta_gz": False,
+            },
+            batch_size=batch_size,
+        ):
+            batch.append(change)
+            if len(batch) >= batch_size:
+                self._store_latest(batch)
+                total, batch = total + len(batch), []
+        self._store_latest(batch)
+        return total + len(batch)
+
+    def prune(self, before: str, batch_size: int = 1000) -> int:
+        """Descarta as mudanças anteriores ao timestamp `before` que foram
+        sucedidas por outras da mesma entidade. Retorna o total de mudanças
+        descartadas.
+
+        São mantidas as cadeias de deltas das mudanças mais recentes de cada
+        entidade e das mudanças posteriores a `before`, bem como as de todos os
+        deltas mantidos, por meio de `_retained_since`. Os deltas registrados
+        sem `delta_keyframe` têm o início de sua cadeia desconhecido e impedem
+        o descarte das mudanças de sua entidade. Apenas as entidades presentes
+        na coleção `latest` são consideradas.
+        """
+        if self._latest is None:
+            raise ValueError("compacted changes are not enabled")
+
+        keyframes = {
+            (group["_id"]["entity"], group["_id"]["id"]): group["keyframe"]
+            for group in self._collection.aggregate(
+                [
+                    {
+                        "$match": {
+                            "timestamp": {"$gte": before},
+                            "delta_base": {"$exists": True},
+                        }
+                    },
+                    {
+                        "$group": {
+                            "_id": {"entity": "$entity", "id": "$id"},
+                            "keyframe": {
+                                "$min": {"$ifNull": ["$delta_keyframe", ""]}
+                            },
+                        }
+                    },
+                ]
+            )
+        }
+
+        total = 0
+        operations = []
+        latest_changes = self._latest.find(
+            {"retain_since": {"$gt": ""}},
+            projection={"_id": False, "entity": True, "id": True, "retain_since": True},
+            batch_size=batch_size,
+        )
+        for latest in latest_changes:
+            key = (latest["entity"], latest["id"])
+            cutoff = min(latest["retain_since"], before, keyframes.get(key, before))
+            if cutoff < before:
+                cutoff = self._retained_since(latest["entity"], latest["id"], cutoff)
+            if not cutoff:
+                continue
+            operations.append(
+                pymongo.DeleteMany(
+                    {
+                        "entity": latest["entity"],
+                        "id": latest["id"],
+                        "timestamp": {"$lt": cutoff},
+                    }
+                )
+            )
+            if len(operations) >= batch_size:
+                total += self._delete_many(operations)
+                operations = []
+        return total + self._delete_many(operations)
+
+    def prune_blobs(self, before: str, batch_size: int = 1000) -> int:
+        """Descarta os conteúdos da coleção `blobs` que não são referenciados
+        por nenhuma mudança e que não foram utilizados desde o timestamp
+        `before`. Deve ser executado após `prune`. Retorna o total de conteúdos
+        descartados.
+
+        A condição sobre o uso é verificada novamente no descarte, de maneira
+        que os conteúdos reutilizados por escritas concorrentes sejam mantidos.
+        """
+        if self._blobs is None:
+            raise ValueError("content deduplication is not enabled")
+
+        unused = {"$or": [{"used": {"$lt": before}}, {"used": {"$exists": False}}]}
+        total = 0
+        unreferenced = []
+        for blob in self._blobs.find(
+            unused, projection={"_id": True}, batch_size=batch_size
+        ):
+            if (
+                self._collection.find_one(
+                    {"content_hash": blob["_id"]}, projection={"_id": True}
+                )
+                is None
+            ):
+                unreferenced.append(blob["_id"])
+            if len(unreferenced) >= batch_size:
+                total += self._delete_blobs(unreferenced, unused)
+                unreferenced = []
+        return total + self._delete_blobs(unreferenced, unused)
+
+    def _delete_blobs(self, ids: list, unused: dict) -> int:
+        if not ids:
+            return 0
+        return self._blobs.delete_many({"_id": {"$in": ids}, **unused}).deleted_count
+
+    def _retained_since(self, entity: str, id: str, cutoff: str) -> str:
+        """Recua `cutoff` até o keyframe mais antigo do qual dependem os deltas
+        da entidade posteriores a ele. Os deltas registrados por processos
+        distintos podem partir de keyframes anteriores a outros já registrados,
+        de maneira que o início de uma cadeia pode preceder `cutoff`.
+        """
+        while cutoff:
+            delta = self._collection.find_one(
+                {
+                    "entity": entity,
+                    "id": id,
+                    "timestamp": {"$gte": cutoff},
+                    "delta_base": {"$exists": True},
+                    "$or": [
+                        {"delta_keyframe": {"$lt": cutoff}},
+                        {"delta_keyframe": {"$exists": False}},
+                    ],
+                },
+                sort=[("delta_keyframe", pymongo.ASCENDING)],
+                projection={"_id": False, "delta_keyframe": True},
+            )
+            if delta is None:
+                break
+            cutoff = delta.get("delta_keyframe", "")
+        return cutoff
+
+    def _delete_many(self, operations: list) -> int:
+        if not operations:
+            return 0
+        return self._collection.bulk_write(operations, ordered=False).deleted_count
+
+    def last(self) -> dict:
+        return self._collection.find_one(
+            {},
+            sort=[("timestamp", pymongo.DESCENDING)],
+            projection={"content_gz": False, "delta_gz": False},
+        )
+
+    def ranges(self, parts: int) -> list:
+        """Os limites dos intervalos são obtidos percorrendo-se o índice de
+        `timestamp` em saltos de tamanho igual ao total estimado de mudanças,
+        obtido dos metadados da coleção, dividido por `parts`. As consultas são
+        atendidas exclusivamente pelo índice.
+        """
+        if parts < 1:
+            raise ValueError("parts must be greater than zero: %s" % parts)
+        step = -(-self._collection.estimated_document_count() // parts)
+        bounds = [""]
+        while step and len(bounds) < parts:
+            boundary = list(
+                self._collection.find(
+                    {"timestamp": {"$gt": bounds[-1]}},
+                    sort=[("timestamp", pymongo.ASCENDING)],
+                    projection={"_id": False, "timestamp": True},
+                )
+                .skip(step - 1)
+                .limit(1)
+            )
+            if not boundary:
+                break
+            bounds.append(boundary[0]["timestamp"])
+        bounds.append("")
+        return list(zip(bounds, bounds[1:]))
+
     def fetch(self, id: str) -> dict:
         try:
             change = self._collection.find_one({"_id": ObjectId(id)})
@@ -199,15 +1225,62 @@ class ChangesStore(interfaces.ChangesDataStore):
             raise exceptions.DoesNotExist(
                 'cannot fetch data with id "%s": %s' % (id, exc)
             ) from None
-        if change:
-            return change
-        else:
+        if not change:
             raise exceptions.DoesNotExist(
                 "cannot fetch data with id " '"%s": data does not exist' % id
             )
 
+        if (
+            self._blobs is not None
+            and "content_hash" in change
+            and "content_gz" not in change
+            and "delta_gz" not in change
+        ):
+            blob = self._blobs.find_one({"_id": change["content_hash"]})
+            if blob:
+                change["content_gz"] = blob["content_gz"]
+        return change
+
+
+class RenderedDocumentStore(interfaces.RenderedDocumentsDataStore):
+    """Implementação de `interfaces.RenderedDocumentsDataStore` para
+    armazenamento em MongoDB.
+
+    Como o conteúdo é endereçado pelo seu hash, um mesmo XML é armazenado
+    uma única vez e nunca é modificado, o que torna as escritas idempotentes.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def add(self, key: str, data: bytes) -> None:
+        self._collection.update_one(
+            {"_id": key}, {"$setOnInsert": {"data": data}}, upsert=True
+        )
+
+    def fetch(self, key: str) -> bytes:
+        rendered = self._collection.find_one({"_id": key})
+        if rendered:
+            return bytes(rendered["data"])
+        else:
+            raise exceptions.DoesNotExist(
+                "cannot fetch data with key " '"%s": data does not exist' % key
+            )
+
 
 class DocumentStore(BaseStore):
+    """Os documentos são armazenados na forma:
+
+        {"_id": <id>, "document": <manifesto sem as versões, em JSON>,
+         "versions": [<versão em JSON>, ...]}
+
+    o que permite que novas versões sejam adicionadas por meio de `$push` e
+    que a modificação de uma versão, e.g., o registro de um novo ativo
+    digital, reescreva apenas a versão em questão. Documentos armazenados no
+    formato anterior, em que todo o manifesto é serializado no campo
+    `document`, continuam sendo lidos e são convertidos na primeira escrita.
+    """
+
     DomainClass = domain.Document
 
     def _pre_write(self, data) -> dict:
@@ -217,14 +1290,66 @@ class DocumentStore(BaseStore):
         Mais infos:
         https://docs.mongodb.com/manual/reference/limits/#Restrictions-on-Field-Names"""
         _id, _manifest = super()._pre_write(data)
-        return _id, {"_id": _id, "document": json.dumps(_manifest)}
+        versions = _manifest.pop("versions", [])
+        return (
+            _id,
+            {
+                "_id": _id,
+                "document": json.dumps(_manifest),
+                "versions": [json.dumps(version) for version in versions],
+            },
+        )
 
     def _post_read(self, data: dict) -> dict:
         """Tratamento posterior à leitura do dado no MongoDB. Para Document, o
         dado é armazenado em JSON e precisa ser convertido em dict.
         Mais infos em 'DocumentStore._pre_write' e:
         https://docs.mongodb.com/manual/reference/limits/#Restrictions-on-Field-Names"""
-        return json.loads(data["document"])
+        manifest = json.loads(data["document"])
+        if "versions" in data:
+            manifest["versions"] = [json.loads(version) for version in data["versions"]]
+        return manifest
+
+    def _supports_partial_update(self, data: dict) -> bool:
+        return "versions" in data
+
+    def _update_operations(self, persisted: dict, manifest: Mapping) -> dict:
+        operations = {}
+
+        old_head = {k: v for k, v in persisted.items() if k != "versions"}
+        head = {k: v for k, v in manifest.items() if k != "versions"}
+        if old_head.keys() != head.keys() or any(
+            head[k] is not old_head[k] for k in head
+        ):
+            head.setdefault("_id", manifest.get("id", ""))
+            operations["$set"] = {"document": json.dumps(head)}
+
+        old_versions = persisted.get("versions", [])
+        versions = manifest.get("versions", [])
+        if len(versions) < len(old_versions):
+            return None
+
+        changed = [
+            i for i, old in enumerate(old_versions) if versions[i] is not old
+        ]
+        if changed:
+            operations.setdefault("$set", {}).update(
+                {
+                    "versions.%d" % i: json.dumps(versions[i])
+                    for i in [*changed, *range(len(old_versions), len(versions))]
+                }
+            )
+        elif len(versions) > len(old_versions):
+            operations["$push"] = {
+                "versions": {
+                    "$each": [
+                        json.dumps(version)
+                        for version in versions[len(old_versions) :]
+                    ]
+                }
+            }
+
+        return operations
 
 
 class DocumentsBundleStore(BaseStore):
@@ -1,18 +1,23 @@
 import itertools
+import bisect
+from collections import OrderedDict
 from copy import deepcopy
 from io import BytesIO
 import re
-from typing import Union, Callable, Any, Tuple, List, Dict
-from datetime import datetime
+import threading
+from types import MappingProxyType
+from typing import Union, Callable, Any, Tuple, List, Dict, Mapping
+from datetime import datetime, timedelta
 import time
 import os
 import functools
 import logging
 import json
+import hashlib
 
 import requests
 from lxml import etree
-from prometheus_client import Counter, Summary
+from prometheus_client import Counter, Gauge, Summary
 
 from . import exceptions
 
@@ -49,14 +54,49 @@ OBJECTSTORE_REQUEST_FAILURES_TOTAL = Counter(
     "kernel_objectstore_request_failures_total",
     "Total number of exceptions raised when requesting for an XML from the object-store",
 )
+OBJECTSTORE_REQUESTS_INPROGRESS = Gauge(
+    "kernel_objectstore_requests_inprogress",
+    "Current number of requests being made to the object-store",
+)
+OBJECTSTORE_POOL_CONNECTIONS = Gauge(
+    "kernel_objectstore_pool_connections",
+    "Number of connections opened by the active object-store client pools",
+)
+OBJECTSTORE_POOL_REQUESTS = Gauge(
+    "kernel_objectstore_pool_requests",
+    "Number of requests made through the active object-store client pools",
+)
+XMLCACHE_MAX_BYTES = int(os.environ.get("KERNEL_LIB_XMLCACHE_MAX_BYTES", "67108864"))
+XMLCACHE_HITS_TOTAL = Counter(
+    "kernel_xmlcache_hits_total", "Total number of XMLs served from the local cache"
+)
+XMLCACHE_MISSES_TOTAL = Counter(
+    "kernel_xmlcache_misses_total",
+    "Total number of XMLs not found in the local cache",
+)
+XMLCACHE_SIZE_BYTES = Gauge(
+    "kernel_xmlcache_size_bytes", "Total size of the XMLs held by the local cache"
+)
 
 
 def utcnow():
     return str(datetime.utcnow().isoformat() + "Z")
 
 
+def shift_timestamp(timestamp: str, delta: timedelta) -> str:
+    """Desloca em `delta` o timestamp UTC, em formato textual, `timestamp`."""
+    if not timestamp:
+        return timestamp
+    _datetime = datetime.fromisoformat(timestamp.rstrip("Z")) + delta
+    return _datetime.isoformat(timespec="microseconds") + "Z"
+
+
 class DocumentManifest:
     """Namespace para funções que manipulam o manifesto do documento.
+
+    As funções nunca modificam o manifesto recebido: produzem um novo manifesto
+    que compartilha com o anterior todas as estruturas que não foram alteradas,
+    copiando apenas o caminho até o ponto da modificação.
     """
 
     @staticmethod
@@ -82,7 +122,6 @@ class DocumentManifest:
         renditions: Union[dict, list] = None,
         now: Callable[[], str] = utcnow,
     ) -> dict:
-        _manifest = deepcopy(manifest)
         version = DocumentManifest._new_version(data_uri, assets, now=now)
         for asset_id in assets:
             try:
@@ -94,25 +133,23 @@ class DocumentManifest:
                     version = DocumentManifest._new_asset_version(
                         version, asset_id, asset_uri, now=now
                     )
-        _manifest["versions"].append(version)
-        return _manifest
+        return {**manifest, "versions": [*manifest["versions"], version]}
 
     def _new_asset_version(
         version: dict, asset_id: str, asset_uri: str, now: Callable[[], str] = utcnow
     ) -> dict:
-        _version = deepcopy(version)
-        _version["assets"][asset_id].append((now(), asset_uri))
-        return _version
+        asset_versions = [*version["assets"][asset_id], (now(), asset_uri)]
+        return {**version, "assets": {**version["assets"], asset_id: asset_versions}}
 
     @staticmethod
     def add_asset_version(
         manifest: dict, asset_id: str, asset_uri: str, now: Callable[[], str] = utcnow
     ) -> dict:
-        _manifest = deepcopy(manifest)
-        _manifest["versions"][-1] = DocumentManifest._new_asset_version(
-            _manifest["versions"][-1], asset_id, asset_uri, now=now
+        versions = list(manifest["versions"])
+        versions[-1] = DocumentManifest._new_asset_version(
+            versions[-1], asset_id, asset_uri, now=now
         )
-        return _manifest
+        return {**manifest, "versions": versions}
 
     @staticmethod
     def add_rendition_version(
@@ -124,17 +161,18 @@ class DocumentManifest:
         size_bytes: int,
         now: Callable[[], str] = utcnow,
     ) -> dict:
-        _manifest = deepcopy(manifest)
-        latest_renditions = _manifest["versions"][-1]["renditions"]
+        latest_version = manifest["versions"][-1]
+        latest_renditions = list(latest_version["renditions"])
         try:
-            selected_rendition = [
-                r
-                for r in latest_renditions
+            index, selected_rendition = [
+                (i, r)
+                for i, r in enumerate(latest_renditions)
                 if r["filename"] == filename
                 and r["lang"] == lang
                 and r["mimetype"] == mimetype
             ][0]
         except IndexError:
+            index = len(latest_renditions)
             selected_rendition = {
                 "filename": filename,
                 "data": [],
@@ -143,16 +181,21 @@ class DocumentManifest:
             }
             latest_renditions.append(selected_rendition)
 
-        selected_rendition["data"].append(
-            {"timestamp": now(), "url": data_uri, "size_bytes": size_bytes}
-        )
-        return _manifest
+        latest_renditions[index] = {
+            **selected_rendition,
+            "data": [
+                *selected_rendition["data"],
+                {"timestamp": now(), "url": data_uri, "size_bytes": size_bytes},
+            ],
+        }
+        versions = list(manifest["versions"])
+        versions[-1] = {**latest_version, "renditions": latest_renditions}
+        return {**manifest, "versions": versions}
 
     @staticmethod
     def add_deleted_version(manifest: dict, now: Callable[[], str] = utcnow) -> dict:
-        _manifest = deepcopy(manifest)
-        _manifest["versions"].append({"deleted": True, "timestamp": now()})
-        return _manifest
+        deleted_version = {"deleted": True, "timestamp": now()}
+        return {**manifest, "versions": [*manifest["versions"], deleted_version]}
 
 
 def get_static_assets(xml_et):
@@ -179,10 +222,79 @@ def get_static_assets(xml_et):
     ]
 
 
+def _running_max(timestamps: List[str]) -> List[str]:
+    return list(itertools.accumulate(timestamps, max))
+
+
+def _index_at(running_max: List[str], timestamp: str) -> int:
+    """Obtém, por meio de busca binária, o índice do item vigente no momento
+    `timestamp`, ou -1 caso não haja nenhum.
+
+    `running_max` é a sequência dos maiores timestamps observados até cada
+    posição do histórico, conforme produzido por `_running_max`. O resultado
+    é o mesmo obtido pela varredura linear do histórico: é considerado apenas
+    o trecho inicial cujos timestamps são anteriores ou iguais a `timestamp`
+    e, dentre eles, o primeiro item com o maior timestamp.
+    """
+    end = bisect.bisect_right(running_max, timestamp)
+    if end == 0:
+        return -1
+    return bisect.bisect_left(running_max, running_max[end - 1], 0, end)
+
+
+class DocumentTimeline:
+    """Índice temporal das versões de um documento, de seus ativos digitais e
+    de suas manifestações. Os índices de cada histórico são construídos sob
+    demanda e memoizados, de maneira que a resolução de uma versão num dado
+    momento seja feita por meio de busca binária.
+
+    :param versions: lista de versões do manifesto do documento. Não deve ser
+    modificada durante o tempo de vida da instância.
+    """
+
+    def __init__(self, versions: list):
+        self._versions = versions
+        self._versions_index = None
+        self._assets_index = {}
+        self._renditions_index = {}
+
+    def version(self, timestamp: str) -> int:
+        if self._versions_index is None:
+            self._versions_index = _running_max(
+                [version.get("timestamp", "") for version in self._versions]
+            )
+        return _index_at(self._versions_index, timestamp)
+
+    def asset(self, version_index: int, asset_id: str, timestamp: str) -> int:
+        key = (version_index, asset_id)
+        try:
+            index = self._assets_index[key]
+        except KeyError:
+            uris = self._versions[version_index]["assets"][asset_id]
+            index = self._assets_index[key] = _running_max(
+                [asset[0] for asset in uris]
+            )
+        return _index_at(index, timestamp)
+
+    def rendition(
+        self, version_index: int, rendition_index: int, timestamp: str
+    ) -> int:
+        key = (version_index, rendition_index)
+        try:
+            index = self._renditions_index[key]
+        except KeyError:
+            rendition = self._versions[version_index]["renditions"][rendition_index]
+            index = self._renditions_index[key] = _running_max(
+                [r_data["timestamp"] for r_data in rendition["data"]]
+            )
+        return _index_at(index, timestamp)
+
+
 class retry_gracefully:
     """Produz decorador que torna o objeto decorado resiliente às exceções dos
     tipos informados em `exc_list`. Tenta no máximo `max_retries` vezes com
-    intervalo exponencial entre as tentativas.
+    intervalo exponencial entre as tentativas, de `backoff_base` multiplicado
+    por `backoff_factor` elevado ao número da tentativa.
     """
 
     def __init__(
@@ -190,10 +302,12 @@ class retry_gracefully:
         max_retries=MAX_RETRIES,
         backoff_factor=BACKOFF_FACTOR,
         exc_list=(exceptions.RetryableError,),
+        backoff_base=1,
     ):
         self.max_retries = int(max_retries)
         self.backoff_factor = float(backoff_factor)
         self.exc_list = tuple(exc_list)
+        self.backoff_base = float(backoff_base)
 
     def _sleep(self, seconds):
         time.sleep(seconds)
@@ -207,7 +321,7 @@ class retry_gracefully:
                     return func(*args, **kwargs)
                 except self.exc_list as exc:
                     if retry <= self.max_retries:
-                        wait_seconds = self.backoff_factor ** retry
+                        wait_seconds = self.backoff_base * self.backoff_factor ** retry
                         LOGGER.info(
                             'could not get the result for "%s" with *args "%s" '
                             'and **kwargs "%s". retrying in %s seconds '
@@ -227,12 +341,114 @@ class retry_gracefully:
         return wrapper
 
 
+class ObjectStoreClient:
+    """Cliente HTTP para o object-store que mantém as conexões abertas entre
+    as requisições, num pool por host, evitando o custo do estabelecimento de
+    conexões TCP e TLS a cada XML obtido.
+
+    As instâncias podem ser compartilhadas entre threads.
+
+    :param pool_connections: (opcional) total de pools, i.e., de hosts
+    distintos, mantidos simultaneamente.
+    :param pool_maxsize: (opcional) total máximo de conexões mantidas por host.
+    :param keepalive: (opcional) se as conexões devem ser reaproveitadas.
+    :param timeout: (opcional) timeout padrão, em segundos, das requisições.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        keepalive: bool = True,
+        timeout: float = 2,
+    ):
+        self.pool_connections = int(pool_connections)
+        self.pool_maxsize = int(pool_maxsize)
+        self.keepalive = bool(keepalive)
+        self.timeout = float(timeout)
+        self._session_instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def _session(self) -> requests.Session:
+        """Posterga a criação da sessão HTTP até o seu primeiro uso."""
+        if self._session_instance is None:
+            with self._lock:
+                if self._session_instance is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    if not self.keepalive:
+                        session.headers["Connection"] = "close"
+                    self._session_instance = session
+        return self._session_instance
+
+    def get(self, url: str, timeout: float = None) -> requests.Response:
+        with OBJECTSTORE_REQUESTS_INPROGRESS.track_inprogress():
+            return self._session.get(
+                url, timeout=self.timeout if timeout is None else timeout
+            )
+
+    def _pools(self) -> list:
+        if self._session_instance is None:
+            return []
+        pools = []
+        adapters = {id(a): a for a in self._session_instance.adapters.values()}
+        for adapter in adapters.values():
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is not None:
+                    pools.append(pool)
+        return pools
+
+    def connections_count(self) -> int:
+        """Total de conexões abertas pelos pools ativos."""
+        return sum(pool.num_connections for pool in self._pools())
+
+    def requests_count(self) -> int:
+        """Total de requisições feitas por meio dos pools ativos."""
+        return sum(pool.num_requests for pool in self._pools())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session_instance is not None:
+                self._session_instance.close()
+                self._session_instance = None
+
+
+OBJECTSTORE_CLIENT = ObjectStoreClient()
+OBJECTSTORE_POOL_CONNECTIONS.set_function(
+    lambda: OBJECTSTORE_CLIENT.connections_count()
+)
+OBJECTSTORE_POOL_REQUESTS.set_function(
+    lambda: OBJECTSTORE_CLIENT.requests_count()
+)
+
+
+def set_objectstore_client(client: ObjectStoreClient) -> None:
+    """Substitui o cliente utilizado no acesso ao object-store, encerrando as
+    conexões mantidas pelo cliente anterior.
+    """
+    global OBJECTSTORE_CLIENT
+    previous, OBJECTSTORE_CLIENT = OBJECTSTORE_CLIENT, client
+    if previous is not client:
+        previous.close()
+
+
 @retry_gracefully()
 @OBJECTSTORE_REQUEST_FAILURES_TOTAL.count_exceptions()
 @OBJECTSTORE_RESPONSE_TIME_SECONDS.time()
-def fetch_data(url: str, timeout: float = 2) -> bytes:
+def fetch_data(url: str, timeout: float = None) -> bytes:
+    """Obtém o conteúdo de `url` por meio do cliente compartilhado
+    `OBJECTSTORE_CLIENT`. Caso `timeout` não seja informado, será utilizado o
+    valor padrão do cliente.
+    """
     try:
-        response = requests.get(url, timeout=timeout)
+        response = OBJECTSTORE_CLIENT.get(url, timeout=timeout)
     except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
         raise exceptions.RetryableError(exc) from exc
     except (
@@ -255,12 +471,118 @@ def fetch_data(url: str, timeout: float = 2) -> bytes:
     return response.content
 
 
+class XMLCache:
+    """Cache LRU, em memória, do conteúdo dos XMLs obtidos do object-store e
+    das posições de seus ativos digitais, indexado pela URL do XML.
+
+    As URLs das versões dos documentos apontam para conteúdos imutáveis, por
+    isso as entradas nunca expiram: são descartadas, das menos para as mais
+    recentemente utilizadas, apenas quando o total de bytes armazenados excede
+    `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = XMLCACHE_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(data: bytes, positions: list) -> int:
+        return len(data) + sum(len(href) for href, _ in positions)
+
+    def get(self, url: str) -> Union[Tuple[bytes, list], None]:
+        with self._lock:
+            try:
+                entry = self._entries[url]
+            except KeyError:
+                XMLCACHE_MISSES_TOTAL.inc()
+                return None
+            self._entries.move_to_end(url)
+        XMLCACHE_HITS_TOTAL.inc()
+        return entry
+
+    def set(self, url: str, data: bytes, positions: list) -> None:
+        size = self._sizeof(data, positions)
+        if size > self.max_bytes:
+            return None
+
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            if previous is not None:
+                self._size -= self._sizeof(*previous)
+            self._entries[url] = (data, positions)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= self._sizeof(*evicted)
+            XMLCACHE_SIZE_BYTES.set(self._size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            XMLCACHE_SIZE_BYTES.set(0)
+
+
+DEFAULT_XMLCACHE = XMLCache()
+
+
 def assets_from_remote_xml(
-    url: str, timeout: float = 2, parser=DEFAULT_XMLPARSER
+    url: str, timeout: float = None, parser=DEFAULT_XMLPARSER, cache=DEFAULT_XMLCACHE
 ) -> list:
+    """Obtém o XML em `url` e a lista que associa as URIs de seus ativos
+    digitais aos nós onde se encontram.
+
+    O conteúdo do XML e as posições dos ativos, na ordem de iteração dos nós,
+    são mantidos em `cache`, de maneira que as leituras subsequentes não
+    dependam do object-store nem da varredura do XML em busca dos ativos.
+    """
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None:
+        data, positions = cached
+        xml = etree.parse(BytesIO(data), parser)
+        elements = list(xml.iter())
+        return xml, [(href, elements[position]) for href, position in positions]
+
     data = fetch_data(url, timeout)
     xml = etree.parse(BytesIO(data), parser)
-    return xml, get_static_assets(xml)
+    assets = get_static_assets(xml)
+    if cache is not None:
+        elements = {element: i for i, element in enumerate(xml.iter())}
+        cache.set(url, data, [(href, elements[element]) for href, element in assets])
+    return xml, assets
+
+
+class DataMemo:
+    """Memoriza os valores produzidos pelas entidades, e.g., o resultado de
+    `data()` e `data_bytes()`, para um manifesto específico, identificado pela
+    sua identidade e não pelo seu valor.
+
+    Como os manifestos nunca são modificados, mas substituídos, os valores
+    memorizados são válidos enquanto a entidade apontar para o mesmo manifesto.
+    Dessa forma, os subscribers de um mesmo evento compartilham a serialização
+    da entidade. Uma mesma instância pode ainda ser compartilhada por várias
+    entidades que compartilham o manifesto, como ocorre com as obtidas por meio
+    de `adapters.ManifestCache`. Os valores produzidos não devem ser
+    modificados.
+    """
+
+    __slots__ = ("_entry",)
+
+    def __init__(self):
+        self._entry = (None, {})
+
+    def get(self, manifest: dict, compute: Callable[[], Any], name="data") -> Any:
+        memo_manifest, values = self._entry
+        if memo_manifest is not manifest:
+            values = {}
+            self._entry = (manifest, values)
+        try:
+            return values[name]
+        except KeyError:
+            value = values[name] = compute()
+            return value
 
 
 class Document:
@@ -269,23 +591,43 @@ class Document:
     )
     data_type = "text/xml"
 
-    def __init__(self, id=None, manifest=None):
+    def __init__(self, id=None, manifest=None, data_memo: DataMemo = None):
         assert any([id, manifest])
         self.manifest = manifest or DocumentManifest.new(id)
+        self._data_memo = data_memo or DataMemo()
 
     @property
     def manifest(self):
+        """Cópia profunda do manifesto, que pode ser modificada livremente.
+        Para apenas consultar os dados prefira `manifest_view`.
+        """
         return deepcopy(self._manifest)
 
     @manifest.setter
     def manifest(self, value):
         self._manifest = value
+        self._timeline = None
+
+    def timeline(self) -> DocumentTimeline:
+        """Índice temporal da versão atual do manifesto."""
+        if self._timeline is None:
+            self._timeline = DocumentTimeline(self._manifest.get("versions", []))
+        return self._timeline
+
+    @property
+    def manifest_view(self) -> Mapping:
+        """Visão somente-leitura do manifesto, obtida sem cópia.
+
+        Os valores aninhados são compartilhados com a instância e não devem ser
+        modificados.
+        """
+        return MappingProxyType(self._manifest)
 
     def id(self):
-        return self.manifest.get("id", "")
+        return self._manifest.get("id", "")
 
     def new_version(
-        self, data_url, assets_getter=assets_from_remote_xml, timeout=2
+        self, data_url, assets_getter=assets_from_remote_xml, timeout=None
     ) -> None:
         """Adiciona `data_url` como uma nova versão do documento.
 
@@ -320,12 +662,12 @@ class Document:
 
     def version(self, index=-1) -> dict:
         try:
-            version = self.manifest["versions"][index]
+            version = self._manifest["versions"][index]
         except IndexError:
             raise ValueError("missing version for index: %s" % index) from None
 
         if version.get("deleted"):
-            return version
+            return dict(version)
 
         def _latest(uris):
             try:
@@ -349,10 +691,8 @@ class Document:
             }
 
         assets = {a: _latest(u) for a, u in version["assets"].items()}
-        version["assets"] = assets
         renditions = [_latest_renditions(r) for r in version["renditions"]]
-        version["renditions"] = renditions
-        return version
+        return {**version, "assets": assets, "renditions": renditions}
 
     def version_at(self, timestamp: str) -> dict:
         """Obtém os metadados da versão no momento `timestamp`.
@@ -374,40 +714,26 @@ class Document:
         if re.match(r"^\d{4}-\d{2}-\d{2}$", timestamp):
             timestamp = f"{timestamp}T23:59:59.999999Z"
 
-        try:
-            target_version = max(
-                itertools.takewhile(
-                    lambda version: version.get("timestamp", "") <= timestamp,
-                    self.manifest["versions"],
-                ),
-                key=lambda version: version.get("timestamp", ""),
-            )
-        except ValueError:
-            raise ValueError("missing version for timestamp: %s" % timestamp) from None
+        timeline = self.timeline()
+        version_index = timeline.version(timestamp)
+        if version_index < 0:
+            raise ValueError("missing version for timestamp: %s" % timestamp)
 
+        target_version = self._manifest["versions"][version_index]
         if target_version.get("deleted"):
-            return target_version
+            return dict(target_version)
 
-        def _at_time(uris):
-            try:
-                target = max(
-                    itertools.takewhile(lambda asset: asset[0] <= timestamp, uris),
-                    key=lambda asset: asset[0],
-                )
-            except ValueError:
+        def _at_time(asset_id, uris):
+            index = timeline.asset(version_index, asset_id, timestamp)
+            if index < 0:
                 return ""
-            return target[1]
+            return uris[index][1]
 
-        def _rendition_at_time(r):
-            try:
-                target_data = max(
-                    itertools.takewhile(
-                        lambda r_data: r_data["timestamp"] <= timestamp, r["data"]
-                    ),
-                    key=lambda r_data: r_data["timestamp"],
-                )
-            except ValueError:
+        def _rendition_at_time(rendition_index, r):
+            index = timeline.rendition(version_index, rendition_index, timestamp)
+            if index < 0:
                 return {}
+            target_data = r["data"][index]
             rendition = {
                 "filename": r["filename"],
                 "mimetype": r["mimetype"],
@@ -417,20 +743,24 @@ class Document:
             }
             return rendition
 
-        target_assets = {a: _at_time(u) for a, u in target_version["assets"].items()}
-        target_version["assets"] = target_assets
+        target_assets = {
+            a: _at_time(a, u) for a, u in target_version["assets"].items()
+        }
         target_renditions = [
-            _rendition_at_time(r) for r in target_version["renditions"]
+            _rendition_at_time(i, r) for i, r in enumerate(target_version["renditions"])
         ]
-        target_version["renditions"] = target_renditions
-        return target_version
+        return {
+            **target_version,
+            "assets": target_assets,
+            "renditions": target_renditions,
+        }
 
     def data(
         self,
         version_index=-1,
         version_at=None,
         assets_getter=assets_from_remote_xml,
-        timeout=2,
+        timeout=None,
     ) -> bytes:
         """Retorna o conteúdo do XML, codificado em UTF-8, já com as
         referências aos ativos digitais correspondendo às da versão solicitada.
@@ -446,7 +776,23 @@ class Document:
         Note que o argumento `version_at` é muito mais poderoso, uma vez que,
         diferentemente do `version_index`, também recupera o estado desejado
         no nível dos ativos digitais do documento.
+
+        O XML da versão mais recente é memorizado enquanto o manifesto não for
+        modificado, de maneira que seja produzido uma única vez mesmo quando
+        requisitado por mais de um subscriber do mesmo evento.
         """
+        if (
+            version_index == -1
+            and not version_at
+            and assets_getter is assets_from_remote_xml
+        ):
+            return self._data_memo.get(
+                self._manifest,
+                lambda: self._data(version_index, None, assets_getter, timeout),
+            )
+        return self._data(version_index, version_at, assets_getter, timeout)
+
+    def _data(self, version_index, version_at, assets_getter, timeout) -> bytes:
         version = (
             self.version_at(version_at) if version_at else self.version(version_index)
         )
@@ -465,6 +811,27 @@ class Document:
 
     data_bytes = data
 
+    def data_key(self, version_index=-1, version_at=None) -> str:
+        """Retorna a chave que identifica o conteúdo produzido por `data`
+        para a versão solicitada. Trata-se do hash SHA-256 da URL do XML e das
+        URLs dos ativos digitais resolvidas para a versão, de maneira que
+        versões que resultam no mesmo XML compartilham a mesma chave.
+
+        Os argumentos `version_index` e `version_at` têm o mesmo significado
+        daqueles aceitos por `data`.
+        """
+        version = (
+            self.version_at(version_at) if version_at else self.version(version_index)
+        )
+
+        if version.get("deleted"):
+            raise exceptions.DeletedVersion("cannot get data: the document was deleted")
+
+        render_inputs = json.dumps(
+            [version["data"], version["assets"]], sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha256(render_inputs.encode("utf-8")).hexdigest()
+
     def _latest_or_default(self):
         try:
             return self.version()
@@ -546,6 +913,10 @@ class Document:
 
 class BundleManifest:
     """Namespace para funções que manipulam maços.
+
+    Assim como em `DocumentManifest`, as funções que produzem modificações
+    retornam um novo maço que compartilha as estruturas inalteradas com o
+    original.
     """
 
     @staticmethod
@@ -566,12 +937,13 @@ class BundleManifest:
         value: Union[dict, str],
         now: Callable[[], str] = utcnow,
     ) -> dict:
-        _bundle = deepcopy(bundle)
         _now = now()
-        metadata = _bundle["metadata"].setdefault(name, [])
-        metadata.append((_now, value))
-        _bundle["updated"] = _now
-        return _bundle
+        metadata = [*bundle["metadata"].get(name, []), (_now, value)]
+        return {
+            **bundle,
+            "metadata": {**bundle["metadata"], name: metadata},
+            "updated": _now,
+        }
 
     @staticmethod
     def get_metadata(bundle: dict, name: str, default="") -> Any:
@@ -612,10 +984,7 @@ class BundleManifest:
                 'cannot add item "%s" in bundle: ' "the item id already exists" % _id
             )
 
-        _bundle = deepcopy(bundle)
-        _bundle["items"].append(_item)
-        _bundle["updated"] = now()
-        return _bundle
+        return {**bundle, "items": [*bundle["items"], _item], "updated": now()}
 
     @staticmethod
     def insert_item(
@@ -639,10 +1008,9 @@ class BundleManifest:
                 'cannot insert item id "%s" in bundle: '
                 "the item id already exists" % _id
             )
-        _bundle = deepcopy(bundle)
-        _bundle["items"].insert(index, _item)
-        _bundle["updated"] = now()
-        return _bundle
+        items = list(bundle["items"])
+        items.insert(index, _item)
+        return {**bundle, "items": items, "updated": now()}
 
     @staticmethod
     def remove_item(
@@ -656,19 +1024,14 @@ class BundleManifest:
                 "cannot remove item from bundle: "
                 'the item id "%s" does not exist' % item_id
             )
-        _bundle = deepcopy(bundle)
-        _bundle["items"].remove(item)
-        _bundle["updated"] = now()
-        return _bundle
+        items = [_item for _item in bundle["items"] if _item is not item]
+        return {**bundle, "items": items, "updated": now()}
 
     @staticmethod
     def set_component(
         components_bundle: dict, name: str, value: Any, now: Callable[[], str] = utcnow
     ) -> None:
-        _components_bundle = deepcopy(components_bundle)
-        _components_bundle[name] = value
-        _components_bundle["updated"] = now()
-        return _components_bundle
+        return {**components_bundle, name: value, "updated": now()}
 
     @staticmethod
     def get_component(components_bundle: dict, name: str, default: str = "") -> Any:
@@ -676,7 +1039,7 @@ class BundleManifest:
 
     @staticmethod
     def remove_component(components_bundle: dict, name: str) -> dict:
-        _components_bundle = deepcopy(components_bundle)
+        _components_bundle = dict(components_bundle)
         try:
             del _components_bundle[name]
         except KeyError:
@@ -697,36 +1060,57 @@ class DocumentsBundle:
 
     data_type = "application/json"
 
-    def __init__(self, id: str = None, manifest: dict = None):
+    def __init__(
+        self, id: str = None, manifest: dict = None, data_memo: DataMemo = None
+    ):
         assert any([id, manifest])
         self.manifest = manifest or BundleManifest.new(id)
+        self._data_memo = data_memo or DataMemo()
 
     def id(self):
-        return self.manifest.get("id", "")
+        return self._manifest.get("id", "")
 
     def data(self):
-        _manifest = self.manifest
-        _manifest["metadata"] = {
-            attr: value[-1][-1] for attr, value in _manifest["metadata"].items()
+        return self._data_memo.get(self._manifest, self._data)
+
+    def _data(self):
+        metadata = {
+            attr: value[-1][-1] for attr, value in self._manifest["metadata"].items()
         }
-        return _manifest
+        return {**self._manifest, "metadata": metadata}
 
     def data_bytes(self) -> bytes:
         """Retorna `self.data()` codificado em utf-8.
         """
-        return json.dumps(self.data()).encode("utf-8")
+        return self._data_memo.get(
+            self._manifest,
+            lambda: json.dumps(self.data()).encode("utf-8"),
+            "data_bytes",
+        )
 
     @property
     def manifest(self):
+        """Cópia profunda do manifesto, que pode ser modificada livremente.
+        Para apenas consultar os dados prefira `manifest_view`.
+        """
         return deepcopy(self._manifest)
 
     @manifest.setter
     def manifest(self, value: dict):
         self._manifest = value
 
+    @property
+    def manifest_view(self) -> Mapping:
+        """Visão somente-leitura do manifesto, obtida sem cópia.
+
+        Os valores aninhados são compartilhados com a instância e não devem ser
+        modificados.
+        """
+        return MappingProxyType(self._manifest)
+
     @property
     def publication_year(self):
-        return BundleManifest.get_metadata(self.manifest, "publication_year")
+        return BundleManifest.get_metadata(self._manifest, "publication_year")
 
     @publication_year.setter
     def publication_year(self, value: Union[str, int]):
@@ -742,7 +1126,9 @@ class DocumentsBundle:
 
     @property
     def publication_months(self):
-        return BundleManifest.get_metadata(self.manifest, "publication_months", {})
+        return deepcopy(
+            BundleManifest.get_metadata(self._manifest, "publication_months", {})
+        )
 
     @publication_months.setter
     def publication_months(self, value: Dict):
@@ -760,7 +1146,7 @@ class DocumentsBundle:
 
     @property
     def volume(self):
-        return BundleManifest.get_metadata(self.manifest, "volume")
+        return BundleManifest.get_metadata(self._manifest, "volume")
 
     @volume.setter
     def volume(self, value: Union[str, int]):
@@ -769,7 +1155,7 @@ class DocumentsBundle:
 
     @property
     def number(self):
-        return BundleManifest.get_metadata(self.manifest, "number")
+        return BundleManifest.get_metadata(self._manifest, "number")
 
     @number.setter
     def number(self, value: Union[str, int]):
@@ -778,7 +1164,7 @@ class DocumentsBundle:
 
     @property
     def supplement(self):
-        return BundleManifest.get_metadata(self.manifest, "supplement")
+        return BundleManifest.get_metadata(self._manifest, "supplement")
 
     @supplement.setter
     def supplement(self, value: Union[str, int]):
@@ -789,7 +1175,7 @@ class DocumentsBundle:
 
     @property
     def titles(self):
-        return BundleManifest.get_metadata(self.manifest, "titles", [])
+        return deepcopy(BundleManifest.get_metadata(self._manifest, "titles", []))
 
     @titles.setter
     def titles(self, value: dict):
@@ -813,7 +1199,7 @@ class DocumentsBundle:
 
     @property
     def documents(self):
-        return self.manifest["items"]
+        return [dict(item) for item in self._manifest["items"]]
 
 
 class Journal:
@@ -824,45 +1210,65 @@ class Journal:
 
     data_type = "application/json"
 
-    def __init__(self, id: str = None, manifest: dict = None):
+    def __init__(
+        self, id: str = None, manifest: dict = None, data_memo: DataMemo = None
+    ):
         assert any([id, manifest])
         self.manifest = manifest or BundleManifest.new(id)
+        self._data_memo = data_memo or DataMemo()
 
     def id(self):
-        return self.manifest.get("id", "")
+        return self._manifest.get("id", "")
 
     def created(self):
-        return self.manifest.get("created", "")
+        return self._manifest.get("created", "")
 
     def updated(self):
-        return self.manifest.get("updated", "")
+        return self._manifest.get("updated", "")
 
     @property
     def manifest(self):
+        """Cópia profunda do manifesto, que pode ser modificada livremente.
+        Para apenas consultar os dados prefira `manifest_view`.
+        """
         return deepcopy(self._manifest)
 
     @manifest.setter
     def manifest(self, value: dict):
         self._manifest = value
 
+    @property
+    def manifest_view(self) -> Mapping:
+        """Visão somente-leitura do manifesto, obtida sem cópia.
+
+        Os valores aninhados são compartilhados com a instância e não devem ser
+        modificados.
+        """
+        return MappingProxyType(self._manifest)
+
     def data(self):
         """Retorna o manifesto completo de um Journal com os
         metadados em sua última versão"""
-        _manifest = self.manifest
+        return self._data_memo.get(self._manifest, self._data)
 
-        for key, value in _manifest["metadata"].items():
-            _manifest["metadata"][key] = value[-1][-1]
-
-        return _manifest
+    def _data(self):
+        metadata = {
+            key: value[-1][-1] for key, value in self._manifest["metadata"].items()
+        }
+        return {**self._manifest, "metadata": metadata}
 
     def data_bytes(self) -> bytes:
         """Retorna `self.data()` codificado em utf-8.
         """
-        return json.dumps(self.data()).encode("utf-8")
+        return self._data_memo.get(
+            self._manifest,
+            lambda: json.dumps(self.data()).encode("utf-8"),
+            "data_bytes",
+        )
 
     @property
     def mission(self):
-        return BundleManifest.get_metadata(self.manifest, "mission", [])
+        return deepcopy(BundleManifest.get_metadata(self._manifest, "mission", []))
 
     @mission.setter
     def mission(self, value: List[dict]):
@@ -877,7 +1283,7 @@ class Journal:
 
     @property
     def title(self):
-        return BundleManifest.get_metadata(self.manifest, "title")
+        return BundleManifest.get_metadata(self._manifest, "title")
 
     @title.setter
     def title(self, value: str):
@@ -886,7 +1292,7 @@ class Journal:
 
     @property
     def title_iso(self):
-        return BundleManifest.get_metadata(self.manifest, "title_iso")
+        return BundleManifest.get_metadata(self._manifest, "title_iso")
 
     @title_iso.setter
     def title_iso(self, value: str):
@@ -895,7 +1301,7 @@ class Journal:
 
     @property
     def short_title(self):
-        return BundleManifest.get_metadata(self.manifest, "short_title")
+        return BundleManifest.get_metadata(self._manifest, "short_title")
 
     @short_title.setter
     def short_title(self, value: str):
@@ -906,7 +1312,7 @@ class Journal:
 
     @property
     def acronym(self):
-        return BundleManifest.get_metadata(self.manifest, "acronym")
+        return BundleManifest.get_metadata(self._manifest, "acronym")
 
     @acronym.setter
     def acronym(self, value: str):
@@ -915,7 +1321,7 @@ class Journal:
 
     @property
     def scielo_issn(self):
-        return BundleManifest.get_metadata(self.manifest, "scielo_issn")
+        return BundleManifest.get_metadata(self._manifest, "scielo_issn")
 
     @scielo_issn.setter
     def scielo_issn(self, value: str):
@@ -926,7 +1332,7 @@ class Journal:
 
     @property
     def print_issn(self):
-        return BundleManifest.get_metadata(self.manifest, "print_issn")
+        return BundleManifest.get_metadata(self._manifest, "print_issn")
 
     @print_issn.setter
     def print_issn(self, value: str):
@@ -937,7 +1343,7 @@ class Journal:
 
     @property
     def electronic_issn(self):
-        return BundleManifest.get_metadata(self.manifest, "electronic_issn")
+        return BundleManifest.get_metadata(self._manifest, "electronic_issn")
 
     @electronic_issn.setter
     def electronic_issn(self, value: str):
@@ -948,7 +1354,7 @@ class Journal:
 
     @property
     def status(self):
-        return BundleManifest.get_metadata(self.manifest, "status", {})
+        return deepcopy(BundleManifest.get_metadata(self._manifest, "status", {}))
 
     @status.setter
     def status(self, value: dict):
@@ -962,7 +1368,9 @@ class Journal:
 
     @property
     def subject_areas(self):
-        return BundleManifest.get_metadata(self.manifest, "subject_areas", [])
+        return deepcopy(
+            BundleManifest.get_metadata(self._manifest, "subject_areas", [])
+        )
 
     @subject_areas.setter
     def subject_areas(self, value: tuple):
@@ -985,7 +1393,7 @@ class Journal:
 
     @property
     def sponsors(self) -> Tuple[dict]:
-        return BundleManifest.get_metadata(self.manifest, "sponsors", [])
+        return deepcopy(BundleManifest.get_metadata(self._manifest, "sponsors", []))
 
     @sponsors.setter
     def sponsors(self, value: Tuple[dict]) -> None:
@@ -998,7 +1406,7 @@ class Journal:
 
     @property
     def metrics(self):
-        return BundleManifest.get_metadata(self.manifest, "metrics", {})
+        return deepcopy(BundleManifest.get_metadata(self._manifest, "metrics", {}))
 
     @metrics.setter
     def metrics(self, value: dict):
@@ -1012,7 +1420,9 @@ class Journal:
 
     @property
     def subject_categories(self):
-        return BundleManifest.get_metadata(self.manifest, "subject_categories", [])
+        return deepcopy(
+            BundleManifest.get_metadata(self._manifest, "subject_categories", [])
+        )
 
     @subject_categories.setter
     def subject_categories(self, value: Union[list, tuple]):
@@ -1030,8 +1440,10 @@ class Journal:
 
     @property
     def institution_responsible_for(self):
-        return BundleManifest.get_metadata(
-            self.manifest, "institution_responsible_for", ()
+        return deepcopy(
+            BundleManifest.get_metadata(
+                self._manifest, "institution_responsible_for", ()
+            )
         )
 
     @institution_responsible_for.setter
@@ -1045,12 +1457,12 @@ class Journal:
             ) from None
 
         self.manifest = BundleManifest.set_metadata(
-            self.manifest, "institution_responsible_for", value
+            self._manifest, "institution_responsible_for", value
         )
 
     @property
     def online_submission_url(self):
-        return BundleManifest.get_metadata(self.manifest, "online_submission_url")
+        return BundleManifest.get_metadata(self._manifest, "online_submission_url")
 
     @online_submission_url.setter
     def online_submission_url(self, value: str):
@@ -1061,7 +1473,7 @@ class Journal:
 
     @property
     def next_journal(self):
-        return BundleManifest.get_metadata(self.manifest, "next_journal", {})
+        return deepcopy(BundleManifest.get_metadata(self._manifest, "next_journal", {}))
 
     @next_journal.setter
     def next_journal(self, value: dict):
@@ -1078,7 +1490,9 @@ class Journal:
 
     @property
     def previous_journal(self):
-        return BundleManifest.get_metadata(self.manifest, "previous_journal", {})
+        return deepcopy(
+            BundleManifest.get_metadata(self._manifest, "previous_journal", {})
+        )
 
     @previous_journal.setter
     def previous_journal(self, value: dict):
@@ -1095,11 +1509,11 @@ class Journal:
 
     @property
     def status_history(self):
-        return BundleManifest.get_metadata_all(self.manifest, "status")
+        return deepcopy(BundleManifest.get_metadata_all(self._manifest, "status"))
 
     @property
     def contact(self) -> dict:
-        return BundleManifest.get_metadata(self.manifest, "contact", {})
+        return deepcopy(BundleManifest.get_metadata(self._manifest, "contact", {}))
 
     @contact.setter
     def contact(self, value: dict) -> None:
@@ -1125,11 +1539,11 @@ class Journal:
 
     @property
     def issues(self) -> List[str]:
-        return self.manifest["items"]
+        return [dict(item) for item in self._manifest["items"]]
 
     @property
     def provisional(self):
-        return BundleManifest.get_component(self.manifest, "provisional")
+        return BundleManifest.get_component(self._manifest, "provisional")
 
     @provisional.setter
     def provisional(self, provisional: str) -> None:
@@ -1139,7 +1553,7 @@ class Journal:
 
     @property
     def ahead_of_print_bundle(self) -> str:
-        return BundleManifest.get_component(self.manifest, "aop", "")
+        return BundleManifest.get_component(self._manifest, "aop", "")
 
     @ahead_of_print_bundle.setter
     def ahead_of_print_bundle(self, value: str) -> None:
@@ -33,3 +33,9 @@ class DeletedVersion(NonRetryableError):
     """Erro que representa a tentativa de recuperar o XML de um documento
     em uma versão que foi excluída.
     """
+
+
+class UpdateConflict(RetryableError):
+    """Erro que representa a tentativa de atualizar uma entidade que foi
+    modificada por outro processo desde a sua leitura.
+    """
@@ -2,6 +2,8 @@ import abc
 import functools
 import logging
 
+from . import exceptions
+
 
 LOGGER = logging.getLogger(__name__)
 
@@ -22,6 +24,49 @@ class DataStore(abc.ABC):
     def fetch(self, id: str):
         pass
 
+    @abc.abstractmethod
+    def scan(self):
+        """Produz, sob demanda e em ordem de identificador, todas as entidades
+        armazenadas.
+        """
+        pass
+
+    def fetch_many(self, ids: list) -> list:
+        """Recupera as entidades identificadas por `ids`. Retorna uma lista,
+        na mesma ordem de `ids`, contendo as entidades recuperadas ou `None`
+        para os identificadores que não estão associados a nenhuma delas.
+
+        Implementações devem sobrescrever este método caso o banco de dados
+        suporte a leitura em lote.
+        """
+        results = []
+        for id in ids:
+            try:
+                results.append(self.fetch(id))
+            except exceptions.DoesNotExist:
+                results.append(None)
+        return results
+
+    def add_many(self, data: list) -> list:
+        """Registra as entidades de `data`. Retorna uma lista, na mesma ordem
+        de `data`, contendo `None` para as entidades registradas ou a exceção
+        correspondente à falha do registro das demais, e.g.,
+        `exceptions.AlreadyExists` para aquelas cujo identificador já está em
+        uso.
+
+        Implementações devem sobrescrever este método caso o banco de dados
+        suporte a escrita em lote.
+        """
+        results = []
+        for item in data:
+            try:
+                self.add(item)
+            except exceptions.AlreadyExists as exc:
+                results.append(exc)
+            else:
+                results.append(None)
+        return results
+
 
 class ChangesDataStore(abc.ABC):
     """Interface manipulação de dados de mudanças.
@@ -31,8 +76,56 @@ class ChangesDataStore(abc.ABC):
     def add(self, data: dict) -> None:
         pass
 
+    def add_many(self, data: list) -> None:
+        """Registra as mudanças de `data`, na ordem em que são apresentadas.
+
+        Implementações devem sobrescrever este método caso o banco de dados
+        suporte a escrita em lote.
+        """
+        for change in data:
+            self.add(change)
+
+    @abc.abstractmethod
+    def filter(
+        self,
+        since: str = "",
+        limit: int = 500,
+        since_id: str = None,
+        until: str = "",
+        entity: str = "",
+        id: str = "",
+        id_prefix: str = "",
+        compacted: bool = False,
+    ) -> list:
+        """Obtém, em ordem cronológica, até `limit` mudanças posteriores ao
+        timestamp `since`. Caso `since_id` seja informado, são incluídas
+        também as mudanças com timestamp igual a `since` e identificador
+        posterior a `since_id`. Caso `until` seja informado, são excluídas as
+        mudanças com timestamp posterior a `until`.
+
+        Os argumentos `entity`, `id` e `id_prefix` restringem a lista às
+        mudanças do tipo de entidade, da entidade ou das entidades cujos
+        identificadores iniciam com o prefixo informado, respectivamente.
+
+        Caso `compacted` seja verdadeiro, apenas a mudança mais recente de cada
+        entidade é considerada. Implementações que não suportam a consulta
+        compactada devem levantar `ValueError`.
+        """
+        pass
+
+    @abc.abstractmethod
+    def last(self) -> dict:
+        """Obtém a mudança mais recente, ou `None` caso não haja mudanças."""
+        pass
+
     @abc.abstractmethod
-    def filter(self, since: str = "", limit: int = 500) -> list:
+    def ranges(self, parts: int) -> list:
+        """Divide a lista de mudanças em até `parts` intervalos disjuntos e de
+        tamanhos aproximados, na forma ``[(since, until), ...]``, adequados aos
+        argumentos homônimos de `filter`. O primeiro intervalo inicia em ``""``
+        e o último termina em ``""``, i.e., não possui limite superior.
+        Levanta `ValueError` caso `parts` seja menor que 1.
+        """
         pass
 
     @abc.abstractmethod
@@ -40,6 +133,21 @@ class ChangesDataStore(abc.ABC):
         pass
 
 
+class RenderedDocumentsDataStore(abc.ABC):
+    """Interface manipulação dos XMLs de documentos já renderizados, i.e.,
+    com as referências aos ativos digitais resolvidas. O conteúdo é endereçado
+    pela chave obtida por meio de `domain.Document.data_key`.
+    """
+
+    @abc.abstractmethod
+    def add(self, key: str, data: bytes) -> None:
+        pass
+
+    @abc.abstractmethod
+    def fetch(self, key: str) -> bytes:
+        pass
+
+
 class Session(abc.ABC):
     """Concentra os pontos de acesso aos repositórios de dados.
 
@@ -72,21 +180,39 @@ class Session(abc.ABC):
         """
         pass
 
+    @property
+    def rendered_documents(self) -> RenderedDocumentsDataStore:
+        """Ponto de acesso à instância de ``RenderedDocumentsDataStore``, ou
+        ``None`` caso a materialização dos XMLs não esteja habilitada.
+        """
+        return None
+
     def observe(self, event, callback):
         """Registra `callback` para ser executado na ocorrência de `event`.
+
+        A tabela de observadores nunca é modificada, mas substituída por uma
+        cópia, de maneira que uma mesma tabela possa ser compartilhada por
+        várias sessões. Veja `bind_observers`.
         """
-        observers = getattr(self, "_observers", None)
-        if observers is None:
-            self._observers = {}
-            observers = self._observers
+        observers = getattr(self, "_observers", {})
+        callbacks = observers.get(event, frozenset())
+        if callback in callbacks:
+            return
 
-        observers.setdefault(event, set()).add(callback)
+        self._observers = {**observers, event: callbacks | {callback}}
+
+    def bind_observers(self, observers):
+        """Associa a sessão à tabela de observadores `observers`, na forma
+        ``{<evento>: frozenset(<callbacks>)}``. A tabela não será modificada e
+        pode ser compartilhada com outras sessões.
+        """
+        self._observers = observers
 
     def notify(self, event, data):
         """Notifica a ocorrência de `event`.
         """
         observers = getattr(self, "_observers", {})
-        for callback in observers.get(event, []):
+        for callback in observers.get(event, ()):
             try:
                 callback(data, self)
             except:
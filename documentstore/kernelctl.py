@@ -1,9 +1,13 @@
+import os
 import sys
+import gzip
+import datetime
+import json
 import argparse
 import logging
 import pkg_resources
 
-from documentstore import adapters
+from documentstore import adapters, services
 
 
 LOGGER = logging.getLogger(__name__)
@@ -18,12 +22,84 @@ VERSION = pkg_resources.get_distribution("scielo-kernel").version
 
 LOGGER_FMT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 
+# margem de segurança, além de `kernel.app.changes.keyframe_max_age`, do
+# período de retenção das mudanças sucedidas.
+RETENTION_MARGIN = datetime.timedelta(days=1)
+
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid int value: %r" % value) from None
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be greater than zero: %s" % value)
+    return number
+
 
 def _create_indexes(args):
     mongo = adapters.MongoDB(args.dsn)
     mongo.create_indexes()
 
 
+def _split_changes(args):
+    mongo = adapters.MongoDB(args.dsn)
+    changes = adapters.ChangesStore(mongo.changes)
+    for since, until in changes.ranges(args.parts):
+        print("since=%s&until=%s" % (since, until))
+
+
+def _export_snapshot(args):
+    mongo = adapters.MongoDB(args.dsn)
+    Session = adapters.Session.partial(
+        mongo, materialize_documents=args.materialize_documents
+    )
+    export_snapshot = services.get_handlers(Session, subscribers=[])[
+        "export_snapshot"
+    ]
+    if args.output == "-":
+        output = gzip.open(sys.stdout.buffer, "wt", encoding="utf-8")
+    else:
+        output = gzip.open(args.output, "wt", encoding="utf-8")
+    errors = 0
+    with output:
+        for i, record in enumerate(export_snapshot()):
+            output.write(json.dumps(record) + "\n")
+            errors += "error" in record
+            if i and i % 10000 == 0:
+                LOGGER.info("exported %d entities", i)
+    if errors:
+        print("%d entities could not be exported" % errors, file=sys.stderr)
+
+
+def _compact_changes(args):
+    retention = datetime.timedelta(days=args.retain_days)
+    min_retention = datetime.timedelta(seconds=args.keyframe_max_age) + (
+        RETENTION_MARGIN
+    )
+    if retention < min_retention:
+        sys.exit(
+            "--retain-days must be at least %g days (--keyframe-max-age plus "
+            "the safety margin)" % (min_retention / datetime.timedelta(days=1))
+        )
+
+    mongo = adapters.MongoDB(args.dsn)
+    changes = adapters.ChangesStore(
+        mongo.changes, blobs=mongo.changes_blobs, latest=mongo.changes_latest
+    )
+    if args.rebuild:
+        LOGGER.info("rebuilding the latest changes")
+        total = changes.rebuild_latest()
+        LOGGER.info("%d changes processed", total)
+
+    before = datetime.datetime.utcnow() - retention
+    before = before.isoformat(timespec="microseconds") + "Z"
+    pruned = changes.prune(before)
+    print("%d superseded changes pruned" % pruned)
+    pruned = changes.prune_blobs(before)
+    print("%d unreferenced contents pruned" % pruned)
+
+
 def cli(argv=None):
     if argv is None:
         argv = sys.argv
@@ -46,6 +122,77 @@ def cli(argv=None):
     )
     parser_create_indexes.set_defaults(func=_create_indexes)
 
+    parser_split_changes = subparsers.add_parser(
+        "split-changes",
+        help="Split the changes list into balanced ranges",
+        description="Print the query string arguments `since` and `until` of "
+        "each range, one per line, so that the changes list can be read "
+        "concurrently by distinct consumers. The last range has no upper "
+        "bound and may be tailed.",
+    )
+    parser_split_changes.add_argument(
+        "dsn", help="DSN for MongoDB node where changes are stored."
+    )
+    parser_split_changes.add_argument(
+        "parts", type=_positive_int, help="Maximum number of ranges."
+    )
+    parser_split_changes.set_defaults(func=_split_changes)
+
+    parser_export_snapshot = subparsers.add_parser(
+        "export-snapshot",
+        help="Export the current state of all entities",
+        description="Write the current state of all journals, bundles and "
+        "documents as gzipped NDJSON. The first line holds the `cursor` from "
+        "which the changes list must be consumed after the snapshot is loaded.",
+    )
+    parser_export_snapshot.add_argument(
+        "dsn", help="DSN for MongoDB node where entities are stored."
+    )
+    parser_export_snapshot.add_argument(
+        "output", help="Path of the file to be written, or - for stdout."
+    )
+    parser_export_snapshot.add_argument(
+        "--materialize-documents",
+        action="store_true",
+        help="Read the documents' XML rendered at registration time, if any. "
+        "See kernel.app.documents.materialize.",
+    )
+    parser_export_snapshot.set_defaults(func=_export_snapshot)
+
+    parser_compact_changes = subparsers.add_parser(
+        "compact-changes",
+        help="Prune superseded changes",
+        description="Delete the changes older than the retention period that "
+        "were superseded by newer changes of the same entity, and then the "
+        "deduplicated contents no longer referenced by any change. Changes "
+        "needed to rebuild delta-encoded contents are kept. Only entities "
+        "tracked in the `changes_latest` collection are pruned; use --rebuild "
+        "on the first run or after enabling kernel.app.changes.compacted.",
+    )
+    parser_compact_changes.add_argument(
+        "dsn", help="DSN for MongoDB node where changes are stored."
+    )
+    parser_compact_changes.add_argument(
+        "--retain-days",
+        type=float,
+        default=30,
+        help="Superseded changes newer than this are kept (default: 30). Must be "
+        "at least --keyframe-max-age plus one day.",
+    )
+    parser_compact_changes.add_argument(
+        "--keyframe-max-age",
+        type=float,
+        default=float(os.environ.get("KERNEL_APP_CHANGES_KEYFRAME_MAX_AGE", 86400)),
+        help="The kernel.app.changes.keyframe_max_age setting of the application, "
+        "in seconds (default: $KERNEL_APP_CHANGES_KEYFRAME_MAX_AGE or 86400).",
+    )
+    parser_compact_changes.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild the `changes_latest` collection from all changes first.",
+    )
+    parser_compact_changes.set_defaults(func=_compact_changes)
+
     args = parser.parse_args()
     # todas as mensagens serão omitidas se level > 50
     logging.basicConfig(
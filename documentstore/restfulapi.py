@@ -1,6 +1,11 @@
 import logging
 import os
 import base64
+import atexit
+import functools
+import json
+import signal
+import time
 
 from pyramid.settings import asbool
 from pyramid.config import Configurator
@@ -11,7 +16,11 @@ from pyramid.httpexceptions import (
     HTTPBadRequest,
     HTTPGone,
     HTTPUnprocessableEntity,
+    HTTPConflict,
 )
+from pyramid.view import exception_view_config
+from pyramid.response import Response
+from pyramid.traversal import PATH_SAFE, quote_path_segment
 from cornice import Service
 from cornice.validators import colander_body_validator
 from cornice.service import get_services
@@ -22,6 +31,7 @@ from cornice_swagger import CorniceSwagger
 from . import services
 from . import adapters
 from . import exceptions
+from . import domain
 
 LOGGER = logging.getLogger(__name__)
 
@@ -29,6 +39,32 @@ swagger = Service(
     name="Kernel API", path="/__api__", description="Kernel API documentation"
 )
 
+# as rotas dos serviços em lote são registradas em `main`, antes das demais,
+# para que, e.g., `/documents/_bulk` não seja interpretado como
+# `/documents/{document_id}`.
+documents_bulk = Service(
+    name="documents_bulk",
+    path="/documents/_bulk",
+    pyramid_route="documents_bulk",
+    description="Register or get many documents at once.",
+)
+
+bundles_bulk = Service(
+    name="bundles_bulk",
+    path="/bundles/_bulk",
+    pyramid_route="bundles_bulk",
+    description="Get many documents bundles at once.",
+)
+
+journals_bulk = Service(
+    name="journals_bulk",
+    path="/journals/_bulk",
+    pyramid_route="journals_bulk",
+    description="Get many journals at once.",
+)
+
+BULK_SERVICES = (documents_bulk, bundles_bulk, journals_bulk)
+
 documents = Service(
     name="documents",
     path="/documents/{document_id}",
@@ -85,6 +121,12 @@ change_details = Service(
     name="change_details", path="/changes/{change_id}", description="Get one change."
 )
 
+change_content = Service(
+    name="change_content",
+    path="/changes/{change_id}/content",
+    description="Get the gzipped content of one change.",
+)
+
 journals = Service(
     name="journals",
     path="/journals/{journal_id}",
@@ -131,6 +173,56 @@ class RegisterDocumentSchema(colander.MappingSchema):
     assets = Assets()
 
 
+class BulkDocument(RegisterDocumentSchema):
+    id = colander.SchemaNode(colander.String())
+
+
+class BulkDocuments(colander.SequenceSchema):
+    document = BulkDocument()
+
+
+class RegisterDocumentsSchema(colander.MappingSchema):
+    """Representa o schema de dados para registro de documentos em lote.
+    """
+
+    documents = BulkDocuments(validator=colander.Length(min=1))
+
+
+class BulkDocumentResult(colander.MappingSchema):
+    id = colander.SchemaNode(colander.String())
+    status = colander.SchemaNode(
+        colander.String(),
+        validator=colander.OneOf(["created", "updated", "unchanged", "error"]),
+    )
+    error = colander.SchemaNode(colander.String(), missing=colander.drop)
+
+
+class BulkDocumentResults(colander.SequenceSchema):
+    result = BulkDocumentResult()
+
+
+class RegisterDocumentsResultSchema(colander.MappingSchema):
+    """Representa o schema de dados do resultado do registro de documentos em
+    lote.
+    """
+
+    results = BulkDocumentResults()
+
+
+class QueryBulkSchema(colander.MappingSchema):
+    """Representa os parâmetros de querystring das leituras em lote.
+    """
+
+    ids = colander.SchemaNode(colander.String())
+
+
+class BulkSchema(colander.MappingSchema):
+    """Representa o schema de dados das leituras em lote.
+    """
+
+    querystring = QueryBulkSchema()
+
+
 class QueryDiffDocumentSchema(colander.MappingSchema):
     """Representa os parâmetros de querystring do schema DiffDocument.
     """
@@ -267,6 +359,13 @@ class QueryChangeSchema(colander.MappingSchema):
 
     limit = colander.SchemaNode(colander.String(), missing=colander.drop)
     since = colander.SchemaNode(colander.String(), missing=colander.drop)
+    until = colander.SchemaNode(colander.String(), missing=colander.drop)
+    entity = colander.SchemaNode(colander.String(), missing=colander.drop)
+    id = colander.SchemaNode(colander.String(), missing=colander.drop)
+    id_prefix = colander.SchemaNode(colander.String(), missing=colander.drop)
+    compacted = colander.SchemaNode(colander.String(), missing=colander.drop)
+    cursor = colander.SchemaNode(colander.String(), missing=colander.drop)
+    wait = colander.SchemaNode(colander.String(), missing=colander.drop)
 
 
 class ChangeSchema(colander.MappingSchema):
@@ -286,6 +385,19 @@ class ChangeDetailsSchema(colander.MappingSchema):
     data = colander.SchemaNode(colander.String(), missing=colander.drop)
 
 
+class ChangeContentSchema(colander.MappingSchema):
+    """Representa o conteúdo de um registro de mudança, transmitido como bytes
+    comprimidos em gzip, seja com o cabeçalho ``Content-Encoding: gzip`` ou
+    com o media type ``application/gzip``.
+    """
+
+    body = colander.SchemaNode(
+        colander.String(),
+        missing=colander.drop,
+        description="Conteúdo binário comprimido em gzip",
+    )
+
+
 class ManifestSchema(colander.MappingSchema):
     """Representa o schema de dados do registro de Manifest
     """
@@ -433,23 +545,117 @@ def put_document(request):
         for asset in request.validated.get("assets", [])
     }
     try:
-        request.services["register_document"](
+        created = request.services["register_document_or_version"](
             id=request.matchdict["document_id"], data_url=data_url, assets=assets
         )
-    except exceptions.AlreadyExists:
-        try:
-            request.services["register_document_version"](
-                id=request.matchdict["document_id"], data_url=data_url, assets=assets
-            )
-        except exceptions.VersionAlreadySet as exc:
-            LOGGER.info(
-                'skipping request to add version to "%s": %s',
-                request.matchdict["document_id"],
-                exc,
-            )
-        return HTTPNoContent("document updated successfully")
-    else:
+    except exceptions.VersionAlreadySet as exc:
+        LOGGER.info(
+            'skipping request to add version to "%s": %s',
+            request.matchdict["document_id"],
+            exc,
+        )
+        created = False
+
+    if created:
         return HTTPCreated("document created successfully")
+    else:
+        return HTTPNoContent("document updated successfully")
+
+
+def _bulk_ids(request) -> list:
+    """Obtém a lista de identificadores do parâmetro `ids` da querystring, que
+    pode ser repetido ou conter identificadores separados por vírgula.
+    """
+    ids = [
+        id.strip()
+        for value in request.GET.getall("ids")
+        for id in value.split(",")
+        if id.strip()
+    ]
+    if not ids:
+        raise HTTPBadRequest("ids is mandatory")
+    return ids
+
+
+@documents_bulk.get(
+    schema=BulkSchema(),
+    response_schemas={
+        "200": BulkSchema(description="Obtém os manifestos dos documentos"),
+        "400": BulkSchema(description="Parâmetro `ids` ausente"),
+    },
+    accept="application/json",
+    renderer="json",
+)
+def get_documents_bulk(request):
+    """Obtém os manifestos dos documentos informados no parâmetro `ids`. A
+    resposta contém a lista `items`, na mesma ordem dos identificadores, e a
+    lista `missing` com os identificadores desconhecidos.
+    """
+    return request.services["fetch_documents_manifests"](ids=_bulk_ids(request))
+
+
+@bundles_bulk.get(
+    schema=BulkSchema(),
+    response_schemas={
+        "200": BulkSchema(description="Obtém os dados dos bundles"),
+        "400": BulkSchema(description="Parâmetro `ids` ausente"),
+    },
+    accept="application/json",
+    renderer="json",
+)
+def get_documents_bundles_bulk(request):
+    """Obtém os dados dos bundles informados no parâmetro `ids`. Veja
+    `get_documents_bulk`.
+    """
+    return request.services["fetch_documents_bundles"](ids=_bulk_ids(request))
+
+
+@journals_bulk.get(
+    schema=BulkSchema(),
+    response_schemas={
+        "200": BulkSchema(description="Obtém os dados dos periódicos"),
+        "400": BulkSchema(description="Parâmetro `ids` ausente"),
+    },
+    accept="application/json",
+    renderer="json",
+)
+def get_journals_bulk(request):
+    """Obtém os dados dos periódicos informados no parâmetro `ids`. Veja
+    `get_documents_bulk`.
+    """
+    return request.services["fetch_journals"](ids=_bulk_ids(request))
+
+
+@documents_bulk.post(
+    schema=RegisterDocumentsSchema(),
+    validators=(colander_body_validator,),
+    response_schemas={
+        "200": RegisterDocumentsResultSchema(
+            description="Resultado do registro de cada um dos documentos"
+        ),
+    },
+    renderer="json",
+)
+def post_documents_bulk(request):
+    """Adiciona ou atualiza o registro de vários documentos. Cada item da lista
+    `documents` é tratado conforme ``PUT /documents/:doc_id``.
+
+    A resposta contém o resultado de cada item, na mesma ordem em que foram
+    informados, na forma ``{"id": <id>, "status": <status>}``, onde
+    ``<status>`` pode ser ``created``, ``updated``, ``unchanged`` ou ``error``.
+    """
+    documents = [
+        {
+            "id": document["id"],
+            "data_url": document["data"],
+            "assets": {
+                asset["asset_id"]: asset["asset_url"]
+                for asset in document.get("assets", [])
+            },
+        }
+        for document in request.validated["documents"]
+    ]
+    return {"results": request.services["register_documents"](documents=documents)}
 
 
 @documents.delete(
@@ -727,56 +933,254 @@ entity_route_map = {
 }
 
 
-def _format_change(c, request):
+_PATH_PLACEHOLDER = "__id__"
+
+
+class _EntityPaths:
+    """Produz os caminhos das entidades de `entity_route_map` a partir de
+    prefixos e sufixos computados uma única vez por rota, evitando a geração
+    completa do caminho para cada registro de mudança.
+    """
+
+    def __init__(self, request):
+        self._request = request
+        self._templates = {}
+
+    def __call__(self, entity: str, id: str) -> str:
+        try:
+            prefix, suffix = self._templates[entity]
+        except KeyError:
+            route = entity_route_map[entity]
+            path = self._request.route_path(
+                route["route"], **{route["marker"]: _PATH_PLACEHOLDER}
+            )
+            prefix, suffix = self._templates[entity] = tuple(
+                path.split(_PATH_PLACEHOLDER, 1)
+            )
+        return prefix + quote_path_segment(id, safe=PATH_SAFE) + suffix
+
+
+def _format_change(c, request, paths=None, content=True):
     """Transforma um registro de mudança em algo mais *palatável* para ser
-    retornado por uma interface restful.
+    retornado por uma interface restful. Caso `content` seja falso, o conteúdo
+    da mudança é omitido.
     """
-    entity = entity_route_map[c["entity"]]
+    if paths is None:
+        paths = _EntityPaths(request)
     result = {
-        "id": request.route_path(entity["route"], **{entity["marker"]: c["id"]}),
+        "id": paths(c["entity"], c["id"]),
         "timestamp": c["timestamp"],
     }
     if "_id" in c:
         result["change_id"] = str(c["_id"])
     if "deleted" in c:
         result["deleted"] = c["deleted"]
-    if "content_gz" in c:
+    if content and "content_gz" in c:
         result["content_gz_b64"] = base64.b64encode(c["content_gz"]).decode("ascii")
     if "content_type" in c:
         result["content_type"] = c["content_type"]
+    if "content_hash" in c:
+        result["content_hash"] = c["content_hash"]
 
     return result
 
 
+NDJSON_CHUNK_SIZE = 500
+"""Total de registros de mudança agrupados em cada bloco da resposta em
+NDJSON."""
+
+
+def _ndjson_changes(changes, paths):
+    """Produz, sob demanda, os registros de mudança em NDJSON, agrupados em
+    blocos de até `NDJSON_CHUNK_SIZE` linhas. Cada linha contém o cursor que
+    permite retomar a leitura a partir do registro."""
+    lines = []
+    for change in changes:
+        result = _format_change(change, None, paths)
+        result["cursor"] = services.encode_changes_cursor(change)
+        lines.append(json.dumps(result))
+        if len(lines) >= NDJSON_CHUNK_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _sse_changes(
+    fetch, changes, since, cursor, limit, paths, duration, heartbeat, recheck_interval
+):
+    """Produz, sob demanda, os registros de mudança como *Server-Sent Events*
+    durante até `duration` segundos, aguardando pelo registro de novas mudanças
+    quando não houver resultados. O argumento `changes` recebe o resultado da
+    primeira consulta, realizada antes do início da transmissão para que seus
+    erros produzam uma resposta com o código HTTP 400.
+
+    O campo ``id`` de cada evento contém o cursor do registro, de maneira que o
+    cliente retoma a leitura ao se reconectar por meio do cabeçalho
+    ``Last-Event-ID``. Um comentário é enviado a cada `heartbeat` segundos sem
+    mudanças, para que a conexão não seja encerrada por intermediários.
+    """
+    deadline = time.monotonic() + duration
+    yield b"retry: 1000\n\n"
+    while True:
+        if changes:
+            events = []
+            for change in changes:
+                cursor = services.encode_changes_cursor(change)
+                events.append(
+                    "id: %s\nevent: change\ndata: %s\n\n"
+                    % (cursor, json.dumps(_format_change(change, None, paths)))
+                )
+            yield "".join(events).encode("utf-8")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        changes = list(
+            fetch(
+                since=since,
+                cursor=cursor,
+                limit=limit,
+                wait=min(heartbeat, remaining),
+                recheck_interval=recheck_interval,
+            )
+        )
+        if not changes:
+            yield b": heartbeat\n\n"
+
+
+def _get_setting(request, name):
+    """Obtém o valor da configuração `name` da app ou, caso ausente, seu valor
+    padrão conforme `DEFAULT_SETTINGS`.
+    """
+    try:
+        return request.registry.settings[name]
+    except (KeyError, TypeError):
+        return next(
+            default for directive, _, _, default in DEFAULT_SETTINGS if directive == name
+        )
+
+
 @changes.get(
     schema=ChangeSchema(),
     response_schemas={
         "200": AssetSchema(description="Retorna a lista de mudanças"),
         "400": AssetSchema(
-            description="Erro ao processar a requisição, verifique o parâmetro `limit`"
+            description="Erro ao processar a requisição, verifique os parâmetros "
+            "`limit`, `cursor`, `wait` e `entity`"
         ),
     },
-    accept="application/json",
+    accept=["application/json", "application/x-ndjson", "text/event-stream"],
     renderer="json",
 )
 def fetch_changes(request):
-    """Obtém a lista de mudanças, recebe os argumentos `since` e `limit`.
+    """Obtém a lista de mudanças, recebe os argumentos `since`, `until`,
+    `entity`, `id`, `id_prefix`, `compacted`, `cursor`, `limit` e `wait`.
+
+    O argumento `until` encerra a lista na mudança com o timestamp informado,
+    o que permite que diversos consumidores obtenham concorrentemente
+    intervalos disjuntos da lista, e.g., os produzidos por
+    ``kernelctl split-changes``. Os argumentos `entity`, `id` e `id_prefix`
+    restringem a lista às mudanças do tipo de entidade, e.g., ``Journal``, da
+    entidade ou das entidades cujos identificadores iniciam com o prefixo
+    informado, respectivamente. Com ``compacted=true``, a lista contém apenas a
+    mudança mais recente de cada entidade, caso `kernel.app.changes.compacted`
+    esteja habilitada.
+
+    O argumento `cursor` deve receber o valor de `next` de uma resposta
+    anterior, presente caso a lista não seja vazia. Com o cabeçalho
+    ``Accept: application/x-ndjson`` as mudanças são transmitidas à medida em
+    que são lidas do banco de dados, uma por linha, cada qual com seu `cursor`.
+
+    O argumento `wait` define o total de segundos que a requisição aguarda pelo
+    registro de novas mudanças caso não haja resultados (*long polling*),
+    limitado a `kernel.app.changes.max_wait`. Com o cabeçalho
+    ``Accept: text/event-stream`` as mudanças são transmitidas como
+    *Server-Sent Events* à medida em que são registradas, durante até
+    `kernel.app.changes.stream_duration` segundos.
     """
     since = request.GET.get("since", "")
+    filters = {
+        name: request.GET.get(name, "")
+        for name in ["until", "entity", "id", "id_prefix"]
+    }
+    if filters["entity"] and filters["entity"] not in entity_route_map:
+        raise HTTPBadRequest(
+            "entity must be one of: %s" % ", ".join(sorted(entity_route_map))
+        )
+    filters["compacted"] = asbool(request.GET.get("compacted", False))
+    cursor = request.GET.get("cursor") or request.headers.get("Last-Event-ID")
+    recheck_interval = _get_setting(request, "kernel.app.changes.recheck_interval")
 
     try:
         limit = int(request.GET.get("limit", 500))
     except ValueError:
         raise HTTPBadRequest("limit must be integer")
 
-    return {
+    try:
+        wait = float(request.GET.get("wait", 0))
+    except ValueError:
+        raise HTTPBadRequest("wait must be a number")
+    wait = max(0, min(wait, _get_setting(request, "kernel.app.changes.max_wait")))
+
+    paths = _EntityPaths(request)
+    offers = request.accept.acceptable_offers(
+        ["application/json", "application/x-ndjson", "text/event-stream"]
+    )
+    media_type = offers[0][0] if offers else "application/json"
+
+    if media_type == "text/event-stream":
+        fetch = functools.partial(request.services["fetch_changes"], **filters)
+        try:
+            changes = list(fetch(since=since, cursor=cursor, limit=limit))
+        except ValueError as exc:
+            raise HTTPBadRequest(str(exc))
+        response = Response(
+            app_iter=_sse_changes(
+                fetch,
+                changes,
+                since,
+                cursor,
+                limit,
+                paths,
+                _get_setting(request, "kernel.app.changes.stream_duration"),
+                _get_setting(request, "kernel.app.changes.heartbeat_interval"),
+                recheck_interval,
+            ),
+            content_type="text/event-stream",
+            charset="utf-8",
+        )
+        response.cache_control = "no-cache"
+        return response
+
+    try:
+        changes = request.services["fetch_changes"](
+            since=since,
+            limit=limit,
+            cursor=cursor,
+            wait=wait,
+            recheck_interval=recheck_interval,
+            **filters,
+        )
+    except ValueError as exc:
+        raise HTTPBadRequest(str(exc))
+
+    if media_type == "application/x-ndjson":
+        return Response(
+            app_iter=_ndjson_changes(changes, paths),
+            content_type="application/x-ndjson",
+            charset="utf-8",
+        )
+
+    changes = list(changes)
+    result = {
         "since": since,
         "limit": limit,
-        "results": [
-            _format_change(c, request)
-            for c in request.services["fetch_changes"](since=since, limit=limit)
-        ],
+        "results": [_format_change(c, request, paths) for c in changes],
     }
+    result.update({name: value for name, value in filters.items() if value})
+    if changes:
+        result["next"] = services.encode_changes_cursor(changes[-1])
+    return result
 
 
 @change_details.get(
@@ -792,16 +1196,63 @@ def fetch_change(request):
     """Obtém um único registro de mudança.
 
     Este endpoint é capaz de retornar o `snapshot` dos dados no momento
-    imediatamente após sua mudança.
+    imediatamente após sua mudança, codificado em base64. O argumento
+    ``content=false`` omite o `snapshot`, que pode ser obtido sem codificação
+    por meio de ``GET /changes/{change_id}/content``.
     """
+    content = asbool(request.GET.get("content", True))
     try:
         return _format_change(
-            request.services["fetch_change"](id=request.matchdict["change_id"]), request
+            request.services["fetch_change"](
+                id=request.matchdict["change_id"], content=content
+            ),
+            request,
+            content=content,
         )
     except exceptions.DoesNotExist as exc:
         return HTTPNotFound(exc)
 
 
+@change_content.get(
+    response_schemas={
+        "200": ChangeContentSchema(description="Retorna o conteúdo da mudança"),
+        "404": ResponseSchema(description="Registro não encontrado ou sem conteúdo"),
+    },
+)
+def fetch_change_content(request):
+    """Obtém o `snapshot` dos dados no momento imediatamente após a mudança,
+    tal como armazenado, i.e., comprimido em gzip.
+
+    Aos clientes que aceitam a codificação gzip, por meio do cabeçalho
+    ``Accept-Encoding``, o conteúdo é transmitido com o cabeçalho
+    ``Content-Encoding: gzip`` e o media type do `snapshot`. Aos demais, é
+    transmitido como ``application/gzip``. Como as duas representações são
+    distintas, a ETag desta última recebe o sufixo ``-gzip``. Produzirá uma
+    resposta com o código HTTP 404 caso a mudança não seja conhecida ou não
+    possua conteúdo, e.g., a exclusão de uma entidade.
+    """
+    try:
+        change = request.services["fetch_change"](id=request.matchdict["change_id"])
+    except exceptions.DoesNotExist as exc:
+        raise HTTPNotFound(exc)
+    if "content_gz" not in change:
+        raise HTTPNotFound("change has no content")
+
+    response = Response(body=change["content_gz"], conditional_response=True)
+    etag = change.get("content_hash")
+    if request.accept_encoding.acceptable_offers(["gzip"]):
+        response.content_type = change.get("content_type", "application/octet-stream")
+        response.content_encoding = "gzip"
+    else:
+        response.content_type = "application/gzip"
+        if etag:
+            etag += "-gzip"
+    response.vary = ("Accept-Encoding",)
+    if etag:
+        response.etag = etag
+    return response
+
+
 @journals.put(
     schema=JournalSchema(),
     validators=(colander_body_validator,),
@@ -1125,6 +1576,28 @@ class PlainTextRenderer:
         return value
 
 
+@exception_view_config(exceptions.UpdateConflict)
+def update_conflict(exc, request):
+    """Produz uma resposta com o código HTTP 409 quando não for possível
+    concluir uma atualização por conta de escritas concorrentes, mesmo após as
+    novas tentativas.
+    """
+    return HTTPConflict(str(exc))
+
+
+def session_scope_tween_factory(handler, registry):
+    """Produz tween que executa cada requisição num `services.session_scope`,
+    de maneira que os comandos executados durante a requisição compartilhem a
+    mesma sessão.
+    """
+
+    def tween(request):
+        with services.session_scope():
+            return handler(request)
+
+    return tween
+
+
 def split_dsn(dsns):
     """Produz uma lista de DSNs a partir de uma string separada de DSNs separados
     por espaços ou quebras de linha. A escolha dos separadores se baseia nas 
@@ -1149,6 +1622,86 @@ DEFAULT_SETTINGS = [
     ),
     ("kernel.app.prometheus.enabled", "KERNEL_APP_PROMETHEUS_ENABLED", asbool, True),
     ("kernel.app.prometheus.port", "KERNEL_APP_PROMETHEUS_PORT", int, 8087),
+    (
+        "kernel.app.objectstore.pool_connections",
+        "KERNEL_APP_OBJECTSTORE_POOL_CONNECTIONS",
+        int,
+        10,
+    ),
+    (
+        "kernel.app.objectstore.pool_maxsize",
+        "KERNEL_APP_OBJECTSTORE_POOL_MAXSIZE",
+        int,
+        10,
+    ),
+    (
+        "kernel.app.objectstore.keepalive",
+        "KERNEL_APP_OBJECTSTORE_KEEPALIVE",
+        asbool,
+        True,
+    ),
+    ("kernel.app.objectstore.timeout", "KERNEL_APP_OBJECTSTORE_TIMEOUT", float, 2),
+    (
+        "kernel.app.documents.materialize",
+        "KERNEL_APP_DOCUMENTS_MATERIALIZE",
+        asbool,
+        False,
+    ),
+    ("kernel.app.cache.enabled", "KERNEL_APP_CACHE_ENABLED", asbool, False),
+    ("kernel.app.cache.max_entries", "KERNEL_APP_CACHE_MAX_ENTRIES", int, 10000),
+    ("kernel.app.cache.poll_interval", "KERNEL_APP_CACHE_POLL_INTERVAL", float, 1),
+    ("kernel.app.cache.lookbehind", "KERNEL_APP_CACHE_LOOKBEHIND", float, 10),
+    ("kernel.app.cache.max_age", "KERNEL_APP_CACHE_MAX_AGE", float, 60),
+    ("kernel.app.changes.async", "KERNEL_APP_CHANGES_ASYNC", asbool, False),
+    ("kernel.app.changes.queue_size", "KERNEL_APP_CHANGES_QUEUE_SIZE", int, 10000),
+    ("kernel.app.changes.workers", "KERNEL_APP_CHANGES_WORKERS", int, 1),
+    ("kernel.app.changes.batch_size", "KERNEL_APP_CHANGES_BATCH_SIZE", int, 100),
+    (
+        "kernel.app.changes.ack_timeout",
+        "KERNEL_APP_CHANGES_ACK_TIMEOUT",
+        float,
+        0,
+    ),
+    ("kernel.app.changes.delta", "KERNEL_APP_CHANGES_DELTA", asbool, False),
+    (
+        "kernel.app.changes.keyframe_interval",
+        "KERNEL_APP_CHANGES_KEYFRAME_INTERVAL",
+        int,
+        50,
+    ),
+    (
+        "kernel.app.changes.keyframe_max_age",
+        "KERNEL_APP_CHANGES_KEYFRAME_MAX_AGE",
+        float,
+        86400,
+    ),
+    (
+        "kernel.app.changes.delta_max_bytes",
+        "KERNEL_APP_CHANGES_DELTA_MAX_BYTES",
+        int,
+        268435456,
+    ),
+    ("kernel.app.changes.dedup", "KERNEL_APP_CHANGES_DEDUP", asbool, False),
+    ("kernel.app.changes.compacted", "KERNEL_APP_CHANGES_COMPACTED", asbool, False),
+    ("kernel.app.changes.max_wait", "KERNEL_APP_CHANGES_MAX_WAIT", float, 30),
+    (
+        "kernel.app.changes.recheck_interval",
+        "KERNEL_APP_CHANGES_RECHECK_INTERVAL",
+        float,
+        1,
+    ),
+    (
+        "kernel.app.changes.stream_duration",
+        "KERNEL_APP_CHANGES_STREAM_DURATION",
+        float,
+        300,
+    ),
+    (
+        "kernel.app.changes.heartbeat_interval",
+        "KERNEL_APP_CHANGES_HEARTBEAT_INTERVAL",
+        float,
+        15,
+    ),
 ]
 
 
@@ -1176,12 +1729,36 @@ def parse_settings(settings, defaults=DEFAULT_SETTINGS):
     return parsed
 
 
+def _exit_on_sigterm() -> None:
+    """Converte o sinal SIGTERM em `SystemExit`, de maneira que as funções
+    registradas por meio de `atexit`, e.g., a escrita das mudanças pendentes,
+    sejam executadas no encerramento do processo, e.g., por meio de
+    ``docker stop``. Servidores como o pserve/waitress não tratam o sinal, que
+    por padrão encerra o processo imediatamente. Tratadores previamente
+    instalados, e.g., pelo gunicorn, são mantidos.
+    """
+    if signal.getsignal(signal.SIGTERM) not in (signal.SIG_DFL, None):
+        return
+
+    def _handler(signum, frame):
+        raise SystemExit(128 + signum)
+
+    try:
+        signal.signal(signal.SIGTERM, _handler)
+    except ValueError:
+        # sinais podem ser tratados apenas na thread principal
+        LOGGER.warning("cannot handle SIGTERM: pending changes may be lost")
+
+
 def main(global_config, **settings):
     settings.update(parse_settings(settings))
     config = Configurator(settings=settings)
     config.include("cornice")
     config.include("cornice_swagger")
     config.include("documentstore.pyramid_prometheus")
+    for service in BULK_SERVICES:
+        config.add_route(service.pyramid_route, service.path)
+    config.add_tween("documentstore.restfulapi.session_scope_tween_factory")
     config.scan()
     config.add_renderer("xml", XMLRenderer)
     config.add_renderer("text", PlainTextRenderer)
@@ -1193,10 +1770,55 @@ def main(global_config, **settings):
             "readPreference": settings["kernel.app.mongodb.readpreference"],
         },
     )
-    Session = adapters.Session.partial(mongo)
+    if settings["kernel.app.cache.enabled"]:
+        manifest_cache = adapters.ManifestCache(
+            max_entries=settings["kernel.app.cache.max_entries"],
+            changes=lambda: mongo.changes,
+            poll_interval=settings["kernel.app.cache.poll_interval"],
+            lookbehind=settings["kernel.app.cache.lookbehind"],
+            max_age=settings["kernel.app.cache.max_age"],
+        )
+    else:
+        manifest_cache = None
+    Session = adapters.Session.partial(
+        mongo,
+        materialize_documents=settings["kernel.app.documents.materialize"],
+        manifest_cache=manifest_cache,
+        dedup_changes=settings["kernel.app.changes.dedup"],
+        compact_changes=settings["kernel.app.changes.compacted"],
+    )
 
-    config.add_request_method(
-        lambda request: services.get_handlers(Session), "services", reify=True
+    domain.set_objectstore_client(
+        domain.ObjectStoreClient(
+            pool_connections=settings["kernel.app.objectstore.pool_connections"],
+            pool_maxsize=settings["kernel.app.objectstore.pool_maxsize"],
+            keepalive=settings["kernel.app.objectstore.keepalive"],
+            timeout=settings["kernel.app.objectstore.timeout"],
+        )
     )
 
+    if settings["kernel.app.changes.async"]:
+        changes_writer = services.ChangesWriter(
+            Session,
+            queue_size=settings["kernel.app.changes.queue_size"],
+            workers=settings["kernel.app.changes.workers"],
+            batch_size=settings["kernel.app.changes.batch_size"],
+            ack_timeout=settings["kernel.app.changes.ack_timeout"],
+        )
+        atexit.register(changes_writer.close)
+        _exit_on_sigterm()
+        services.set_changes_writer(changes_writer)
+
+    if settings["kernel.app.changes.delta"]:
+        services.set_changes_delta_encoder(
+            services.DeltaEncoder(
+                keyframe_interval=settings["kernel.app.changes.keyframe_interval"],
+                keyframe_max_age=settings["kernel.app.changes.keyframe_max_age"],
+                max_bytes=settings["kernel.app.changes.delta_max_bytes"],
+            )
+        )
+
+    handlers = services.get_handlers(Session)
+    config.add_request_method(lambda request: handlers, "services", reify=True)
+
     return config.make_wsgi_app()
@@ -1,18 +1,97 @@
 from typing import Callable, Dict, Any, List
+import os
+import base64
+import binascii
+import contextlib
+import contextvars
 import difflib
 import functools
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import timedelta
 from io import BytesIO
 from enum import Enum, auto
 import gzip
+import hashlib
+import json
 
+from bson.objectid import ObjectId
 from clea import join as clea_join, core as clea_core
+from prometheus_client import Counter, Gauge, Summary
 
 from .interfaces import Session
-from .domain import Document, DocumentsBundle, Journal, utcnow
-from .exceptions import DoesNotExist, AlreadyExists
+from .domain import (
+    Document,
+    DocumentsBundle,
+    Journal,
+    utcnow,
+    shift_timestamp,
+    retry_gracefully,
+)
+from .exceptions import (
+    DoesNotExist,
+    AlreadyExists,
+    UpdateConflict,
+    VersionAlreadySet,
+    DeletedVersion,
+    RetryableError,
+    NonRetryableError,
+)
 
 __all__ = ["get_handlers"]
 
+LOGGER = logging.getLogger(__name__)
+
+CONFLICT_MAX_RETRIES = int(os.environ.get("KERNEL_LIB_CONFLICT_MAX_RETRIES", "5"))
+BULK_MAX_WORKERS = int(os.environ.get("KERNEL_LIB_BULK_MAX_WORKERS", "8"))
+
+CHANGES_QUEUE_DEPTH = Gauge(
+    "kernel_changes_queue_depth",
+    "Total number of changes waiting to be written by the changes writer",
+)
+CHANGES_WRITE_LATENCY_SECONDS = Summary(
+    "kernel_changes_write_latency_seconds",
+    "Time elapsed between the submission of a change and its acknowledgement",
+)
+CHANGES_WRITE_FAILURES_TOTAL = Counter(
+    "kernel_changes_write_failures_total",
+    "Total number of changes the changes writer could not write",
+)
+
+_SESSION_SCOPE = contextvars.ContextVar("session_scope", default=None)
+
+
+@contextlib.contextmanager
+def session_scope():
+    """Delimita um escopo, e.g., uma requisição HTTP, no qual os comandos
+    obtidos por meio de `get_handlers` compartilham a mesma instância de
+    `Session` e, consequentemente, seu mapa de identidade.
+
+    Fora de um escopo, cada execução de comando utiliza uma nova sessão.
+    """
+    token = _SESSION_SCOPE.set({})
+    try:
+        yield
+    finally:
+        _SESSION_SCOPE.reset(token)
+
+
+retry_on_conflict = retry_gracefully(
+    max_retries=CONFLICT_MAX_RETRIES,
+    backoff_factor=2,
+    backoff_base=0.05,
+    exc_list=(UpdateConflict,),
+)
+"""Decorador para os comandos que leem, modificam e atualizam entidades. Caso
+a entidade seja modificada por outro processo entre a leitura e a escrita, o
+comando é executado novamente a partir de uma nova leitura.
+"""
+
 
 class Events(Enum):
     """Eventos emitidos por instâncias de `CommandHandler`.
@@ -36,6 +115,7 @@ class Events(Enum):
     AHEAD_OF_PRINT_BUNDLE_REMOVED_FROM_JOURNAL = auto()
     RENDITION_VERSION_REGISTERED = auto()
     DOCUMENT_DELETED = auto()
+    DOCUMENTS_REGISTERED = auto()
 
 
 class CommandHandler:
@@ -43,6 +123,17 @@ class CommandHandler:
         self.Session = Session
 
 
+def _fetch_many(store, ids: List[str], serialize: Callable) -> dict:
+    items = []
+    missing = []
+    for id, instance in zip(ids, store.fetch_many(ids)):
+        if instance is None:
+            missing.append(id)
+        else:
+            items.append(serialize(instance))
+    return {"items": items, "missing": missing}
+
+
 class BaseRegisterDocument(CommandHandler):
     """Implementação abstrata de comando para registrar um novo documento.
 
@@ -60,6 +151,7 @@ class BaseRegisterDocument(CommandHandler):
     def _notify(self, session: Session, data) -> None:
         raise NotImplementedError()
 
+    @retry_on_conflict
     def __call__(self, id: str, data_url: str, assets: Dict[str, str] = None) -> None:
         try:
             assets = dict(assets)
@@ -113,6 +205,158 @@ class RegisterDocumentVersion(BaseRegisterDocument):
         session.notify(Events.DOCUMENT_VERSION_REGISTERED, data)
 
 
+class RegisterDocumentOrVersion(CommandHandler):
+    """Registra um documento ou, caso já esteja registrado, uma nova versão
+    do documento, por meio de uma única leitura e uma única escrita
+    condicional no banco de dados.
+
+    A existência do documento é verificada antes da obtenção do XML no
+    object-store, de maneira que a tentativa de registrar uma versão igual à
+    atual levanta `exceptions.VersionAlreadySet` sem qualquer acesso externo.
+
+    Retorna `True` caso o documento tenha sido criado e `False` caso tenha
+    recebido uma nova versão.
+
+    :param id: Identificador alfanumérico para o documento.
+    :param data_url: URL válida e publicamente acessível para o documento em XML
+    SciELO PS.
+    """
+
+    @retry_on_conflict
+    def __call__(
+        self, id: str, data_url: str, assets: Dict[str, str] = None
+    ) -> bool:
+        try:
+            assets = dict(assets)
+        except TypeError:
+            assets = {}
+        session = self.Session()
+        try:
+            document = session.documents.fetch(id)
+        except DoesNotExist:
+            document = Document(id=id)
+            created = True
+        else:
+            created = False
+
+        document.new_version(data_url)
+        for asset_id, asset_url in assets.items():
+            document.new_asset_version(asset_id, asset_url)
+
+        if created:
+            try:
+                session.documents.add(document)
+            except AlreadyExists:
+                # registrado concorrentemente: a nova tentativa o trata como
+                # um documento existente.
+                raise UpdateConflict(
+                    'cannot add document "%s": it was added by another writer' % id
+                ) from None
+            event = Events.DOCUMENT_REGISTERED
+        else:
+            session.documents.update(document)
+            event = Events.DOCUMENT_VERSION_REGISTERED
+
+        session.notify(
+            event,
+            {"instance": document, "id": id, "data_url": data_url, "assets": assets},
+        )
+        return created
+
+
+class RegisterDocuments(CommandHandler):
+    """Registra documentos em lote.
+
+    Os XMLs dos documentos são obtidos concorrentemente e os documentos
+    inéditos são registrados por meio de uma única operação de escrita em
+    lote. Os documentos já registrados recebem uma nova versão, assim como
+    ocorre em `PUT /documents/:id`.
+
+    Retorna uma lista, na mesma ordem de `documents`, com o resultado de cada
+    item na forma ``{"id": <id>, "status": <status>}``, onde ``<status>`` pode
+    ser ``created``, ``updated``, ``unchanged`` ou ``error``. Neste último
+    caso, o item também terá a chave ``error`` com a descrição do erro.
+
+    :param documents: lista de dicionários com as chaves ``id``, ``data_url``
+    e, opcionalmente, ``assets``, conforme os argumentos de `RegisterDocument`.
+    """
+
+    max_workers = BULK_MAX_WORKERS
+
+    def _new_document(self, item: dict) -> Document:
+        document = Document(id=item["id"])
+        document.new_version(item["data_url"])
+        for asset_id, asset_url in item["assets"].items():
+            document.new_asset_version(asset_id, asset_url)
+        return document
+
+    def _register_version(self, item: dict) -> str:
+        try:
+            RegisterDocumentVersion(self.Session)(
+                id=item["id"], data_url=item["data_url"], assets=item["assets"]
+            )
+        except VersionAlreadySet:
+            return "unchanged"
+        else:
+            return "updated"
+
+    def __call__(self, documents: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        items = []
+        for document in documents:
+            try:
+                assets = dict(document.get("assets"))
+            except TypeError:
+                assets = {}
+            items.append(
+                {"id": document["id"], "data_url": document["data_url"], "assets": assets}
+            )
+
+        results = [{"id": item["id"]} for item in items]
+
+        def _build(item):
+            try:
+                return self._new_document(item)
+            except Exception as exc:
+                return exc
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            built = list(executor.map(_build, items))
+
+        new_documents = []
+        for index, document in enumerate(built):
+            if isinstance(document, Exception):
+                results[index].update({"status": "error", "error": str(document)})
+            else:
+                new_documents.append((index, document))
+
+        session = self.Session()
+        added = session.documents.add_many([document for _, document in new_documents])
+
+        registered = []
+        for (index, document), error in zip(new_documents, added):
+            if error is None:
+                results[index]["status"] = "created"
+                registered.append(document)
+                continue
+            if not isinstance(error, AlreadyExists):
+                results[index].update({"status": "error", "error": str(error)})
+                continue
+            try:
+                results[index]["status"] = self._register_version(items[index])
+            except Exception as exc:
+                results[index].update({"status": "error", "error": str(exc)})
+
+        if registered:
+            session.notify(
+                Events.DOCUMENTS_REGISTERED,
+                {
+                    "instances": registered,
+                    "ids": [document.id() for document in registered],
+                },
+            )
+        return results
+
+
 class FetchDocumentData(CommandHandler):
     """Recupera o documento em XML à partir de seu identificador.
 
@@ -132,7 +376,17 @@ class FetchDocumentData(CommandHandler):
     ) -> bytes:
         session = self.Session()
         document = session.documents.fetch(id)
-        return document.data(version_index=version_index, version_at=version_at)
+        rendered_documents = session.rendered_documents
+        if rendered_documents is None:
+            return document.data(version_index=version_index, version_at=version_at)
+
+        key = document.data_key(version_index=version_index, version_at=version_at)
+        try:
+            return rendered_documents.fetch(key)
+        except DoesNotExist:
+            data = document.data(version_index=version_index, version_at=version_at)
+            rendered_documents.add(key, data)
+            return data
 
 
 class FetchDocumentManifest(CommandHandler):
@@ -147,6 +401,22 @@ class FetchDocumentManifest(CommandHandler):
         return document.manifest
 
 
+class FetchDocumentsManifests(CommandHandler):
+    """Recupera os manifestos de vários documentos à partir de seus
+    identificadores, numa única leitura.
+
+    Retorna um dicionário com as chaves ``items``, com os manifestos na mesma
+    ordem de `ids`, e ``missing``, com os identificadores que não estão
+    associados a nenhum documento.
+
+    :param ids: Lista de identificadores únicos dos documentos.
+    """
+
+    def __call__(self, ids: List[str]) -> dict:
+        session = self.Session()
+        return _fetch_many(session.documents, ids, lambda d: d.manifest)
+
+
 class FetchAssetsList(CommandHandler):
     """Recupera a lista de ativos do documento à partir de seu identificador.
 
@@ -172,6 +442,7 @@ class RegisterAssetVersion(CommandHandler):
     :param asset_url: URL válida e publicamente acessível para o ativo digital.
     """
 
+    @retry_on_conflict
     def __call__(self, id: str, asset_id: str, asset_url: str) -> None:
         session = self.Session()
         document = session.documents.fetch(id)
@@ -256,12 +527,33 @@ class CreateDocumentsBundle(CommandHandler):
 
 
 class FetchDocumentsBundle(CommandHandler):
+    """Recupera os dados do maço a partir do seu identificador. O retorno é uma
+    cópia, que pode ser modificada sem afetar os dados memorizados pelo maço.
+
+    :param id: Identificador único do maço.
+    """
+
     def __call__(self, id: str) -> dict:
         session = self.Session()
-        return session.documents_bundles.fetch(id).data()
+        return deepcopy(session.documents_bundles.fetch(id).data())
+
+
+class FetchDocumentsBundles(CommandHandler):
+    """Recupera os dados de vários maços à partir de seus identificadores,
+    numa única leitura. O retorno segue a forma de `FetchDocumentsManifests`.
+
+    :param ids: Lista de identificadores únicos dos maços.
+    """
+
+    def __call__(self, ids: List[str]) -> dict:
+        session = self.Session()
+        return _fetch_many(
+            session.documents_bundles, ids, lambda b: deepcopy(b.data())
+        )
 
 
 class UpdateDocumentsBundleMetadata(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, metadata: dict) -> None:
         session = self.Session()
         _bundle = session.documents_bundles.fetch(id)
@@ -275,6 +567,7 @@ class UpdateDocumentsBundleMetadata(CommandHandler):
 
 
 class AddDocumentToDocumentsBundle(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, doc: str) -> None:
         session = self.Session()
         _bundle = session.documents_bundles.fetch(id)
@@ -287,6 +580,7 @@ class AddDocumentToDocumentsBundle(CommandHandler):
 
 
 class InsertDocumentToDocumentsBundle(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, index: int, doc: str) -> None:
         session = self.Session()
         _bundle = session.documents_bundles.fetch(id)
@@ -302,6 +596,7 @@ class UpdateDocumentInDocumentsBundle(CommandHandler):
     """Atualiza a lista de documentos de uma Issue removendo todos os itens
     anteriormente associados"""
 
+    @retry_on_conflict
     def __call__(self, id: str, docs: List[Dict]) -> None:
         session = self.Session()
         _bundle = session.documents_bundles.fetch(id)
@@ -334,16 +629,31 @@ class CreateJournal(CommandHandler):
 
 
 class FetchJournal(CommandHandler):
-    """Recupera o Journal a partir do seu identificador.
+    """Recupera o Journal a partir do seu identificador. O retorno é uma
+    cópia, que pode ser modificada sem afetar os dados memorizados pelo Journal.
 
     :param id: Identificador único do documento."""
 
     def __call__(self, id: str) -> Journal:
         session = self.Session()
-        return session.journals.fetch(id).data()
+        return deepcopy(session.journals.fetch(id).data())
+
+
+class FetchJournals(CommandHandler):
+    """Recupera os dados de vários periódicos à partir de seus
+    identificadores, numa única leitura. O retorno segue a forma de
+    `FetchDocumentsManifests`.
+
+    :param ids: Lista de identificadores únicos dos periódicos.
+    """
+
+    def __call__(self, ids: List[str]) -> dict:
+        session = self.Session()
+        return _fetch_many(session.journals, ids, lambda j: deepcopy(j.data()))
 
 
 class UpdateJournalMetadata(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, metadata: Dict[str, Any] = None) -> None:
         session = self.Session()
         _journal = session.journals.fetch(id)
@@ -357,6 +667,7 @@ class UpdateJournalMetadata(CommandHandler):
 
 
 class AddIssueToJournal(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, issue: dict) -> None:
         session = self.Session()
         _journal = session.journals.fetch(id)
@@ -369,6 +680,7 @@ class AddIssueToJournal(CommandHandler):
 
 
 class InsertIssueToJournal(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, index: int, issue: dict) -> None:
         session = self.Session()
         _journal = session.journals.fetch(id)
@@ -384,6 +696,7 @@ class UpdateIssuesInJournal(CommandHandler):
     """Atualiza a lista de issues de um Journal removendo todos os itens
     anteriormente associados"""
 
+    @retry_on_conflict
     def __call__(self, id: str, issues: List[Dict]) -> None:
         session = self.Session()
         _journal = session.journals.fetch(id)
@@ -402,6 +715,7 @@ class UpdateIssuesInJournal(CommandHandler):
 
 
 class RemoveIssueFromJournal(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, issue: str) -> None:
         session = self.Session()
         _journal = session.journals.fetch(id)
@@ -414,6 +728,7 @@ class RemoveIssueFromJournal(CommandHandler):
 
 
 class SetAheadOfPrintBundleToJournal(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str, aop: str) -> None:
         session = self.Session()
         _journal = session.journals.fetch(id)
@@ -426,6 +741,7 @@ class SetAheadOfPrintBundleToJournal(CommandHandler):
 
 
 class RemoveAheadOfPrintBundleFromJournal(CommandHandler):
+    @retry_on_conflict
     def __call__(self, id: str) -> None:
         session = self.Session()
         _journal = session.journals.fetch(id)
@@ -437,28 +753,186 @@ class RemoveAheadOfPrintBundleFromJournal(CommandHandler):
         )
 
 
+def encode_changes_cursor(change: dict) -> str:
+    """Produz o cursor opaco que identifica a posição de `change` na lista de
+    mudanças, a partir de seu timestamp e identificador."""
+    position = json.dumps([change["timestamp"], str(change["_id"])])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+
+def decode_changes_cursor(cursor: str) -> tuple:
+    """Obtém o par ``(timestamp, id)`` a partir do cursor produzido por
+    `encode_changes_cursor`. Levanta `ValueError` caso o cursor seja inválido.
+    """
+    try:
+        timestamp, id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise ValueError('invalid cursor: "%s"' % cursor) from None
+    if not isinstance(timestamp, str) or not isinstance(id, str):
+        raise ValueError('invalid cursor: "%s"' % cursor)
+    if not ObjectId.is_valid(id):
+        raise ValueError('invalid cursor: "%s"' % cursor)
+    return timestamp, id
+
+
 class FetchChanges(CommandHandler):
     """Recupera lista de mudanças das entidades.
 
+    O resultado é produzido sob demanda, à medida em que é iterado.
+
     :param since: (Opcional) timestamp UTC, inicia a lista de resultados na mudança
     imediatamente posterior ao timestamp informado.
     :param limit: (Opcional) Limita o total de resultados obtidos. O valor padrão é 500.
+    :param cursor: (Opcional) cursor obtido por meio de `encode_changes_cursor`,
+    inicia a lista de resultados na mudança imediatamente posterior à que o
+    originou. Tem precedência sobre `since`.
+    :param until: (Opcional) timestamp UTC, encerra a lista de resultados na
+    mudança com o timestamp informado. Permite que diversos consumidores obtenham
+    concorrentemente intervalos disjuntos da lista de mudanças.
+    :param entity: (Opcional) Restringe a lista às mudanças do tipo de entidade
+    informado, e.g., ``Journal``.
+    :param id: (Opcional) Restringe a lista às mudanças da entidade informada.
+    :param id_prefix: (Opcional) Restringe a lista às mudanças das entidades
+    cujos identificadores iniciam com o prefixo informado.
+    :param compacted: (Opcional) Restringe a lista à mudança mais recente de
+    cada entidade. Levanta `ValueError` caso a consulta compactada não seja
+    suportada.
+    :param wait: (Opcional) Total de segundos a aguardar pelo registro de novas
+    mudanças caso não haja resultados. Neste caso o resultado é uma lista.
+    :param recheck_interval: (Opcional) Intervalo máximo, em segundos, entre as
+    consultas feitas durante o aguardo. O valor padrão é 1.
     """
 
-    def __call__(self, since: str = "", limit: int = 500):
+    def __call__(
+        self,
+        since: str = "",
+        limit: int = 500,
+        cursor: str = None,
+        until: str = "",
+        entity: str = "",
+        id: str = "",
+        id_prefix: str = "",
+        compacted: bool = False,
+        wait: float = 0,
+        recheck_interval: float = 1.0,
+    ):
+        filters = {
+            name: value
+            for name, value in [
+                ("until", until),
+                ("entity", entity),
+                ("id", id),
+                ("id_prefix", id_prefix),
+                ("compacted", compacted),
+            ]
+            if value
+        }
+        if cursor:
+            since, filters["since_id"] = decode_changes_cursor(cursor)
+
+        def fetch():
+            session = self.Session()
+            return session.changes.filter(since=since, limit=limit, **filters)
+
+        if wait > 0:
+            return wait_for_changes(fetch, wait, recheck_interval)
+        return fetch()
+
+
+class ExportSnapshot(CommandHandler):
+    """Produz, sob demanda, o estado corrente de todos os periódicos, pacotes
+    de documentos e documentos, a partir do qual novas réplicas podem ser
+    criadas sem que seja necessário consumir toda a lista de mudanças.
+
+    O primeiro registro produzido contém o `cursor` da mudança mais recente,
+    obtido antes da leitura das entidades, ou `None` caso não haja mudanças.
+    Como as mudanças são registradas após a escrita das entidades, o snapshot
+    contempla todas as mudanças até o cursor; as posteriores, ainda que já
+    refletidas no snapshot, são obtidas novamente pela réplica ao consumir a
+    lista de mudanças a partir do cursor.
+
+    Os demais registros têm a forma ``{"entity", "id", "content_type",
+    "content"}``, em que `content` corresponde ao conteúdo textual que seria
+    registrado numa mudança da entidade, ou ``{"entity", "id", "deleted"}``
+    para os documentos excluídos. Cada documento com manifestações é seguido
+    de um registro da entidade ``DocumentRendition`` cujo `content` é a lista
+    JSON das manifestações de sua versão mais recente, tal qual obtida por
+    meio de `FetchDocumentRenditions`.
+
+    As entidades cujos conteúdos não puderem ser obtidos, e.g., pela
+    indisponibilidade do object-store, são representadas por registros
+    ``{"entity", "id", "error"}``, sem que a exportação seja interrompida. A
+    réplica deve obtê-las individualmente após a carga do snapshot.
+    """
+
+    def __call__(self):
         session = self.Session()
-        return session.changes.filter(since=since, limit=limit)
+        last = session.changes.last()
+        yield {
+            "cursor": encode_changes_cursor(last) if last else None,
+            "timestamp": last["timestamp"] if last else "",
+        }
+
+        rendered_documents = session.rendered_documents
+        for entity, store in [
+            ("Journal", session.journals),
+            ("DocumentsBundle", session.documents_bundles),
+            ("Document", session.documents),
+        ]:
+            for instance in store.scan():
+                record = {"entity": entity, "id": instance.id()}
+                try:
+                    if rendered_documents is not None and entity == "Document":
+                        content = _fetch_rendered_data(rendered_documents, instance)
+                    else:
+                        content = instance.data_bytes()
+                except DeletedVersion:
+                    record["deleted"] = True
+                except (RetryableError, NonRetryableError) as exc:
+                    LOGGER.warning(
+                        'cannot export %s "%s": %s', entity, instance.id(), exc
+                    )
+                    record["error"] = str(exc)
+                else:
+                    record["content_type"] = instance.data_type
+                    record["content"] = content.decode("utf-8")
+                yield record
+
+                if entity == "Document" and "content" in record:
+                    renditions = instance.version().get("renditions")
+                    if renditions:
+                        yield {
+                            "entity": "DocumentRendition",
+                            "id": instance.id(),
+                            "content_type": "application/json",
+                            "content": json.dumps(renditions),
+                        }
+
+
+def _fetch_rendered_data(rendered_documents, document) -> bytes:
+    """Obtém o XML já renderizado da versão mais recente de `document`,
+    renderizando-o caso ainda não tenha sido materializado."""
+    try:
+        return rendered_documents.fetch(document.data_key())
+    except DoesNotExist:
+        return document.data()
 
 
 class FetchChange(CommandHandler):
-    """Recupera registro de mudança de entidade.
+    """Recupera registro de mudança de entidade. Caso a mudança tenha sido
+    armazenada como delta, seu conteúdo completo é reconstruído.
 
     :param id: Identificador da mudança a ser recuperada.
+    :param content: (Opcional) Se o conteúdo completo da mudança deve ser
+    reconstruído. O valor padrão é `True`.
     """
 
-    def __call__(self, id: str) -> dict:
+    def __call__(self, id: str, content: bool = True) -> dict:
         session = self.Session()
-        return session.changes.fetch(id=id)
+        change = session.changes.fetch(id=id)
+        if not content:
+            return change
+        return reconstruct_change(session, change)
 
 
 class RegisterRenditionVersion(CommandHandler):
@@ -477,6 +951,7 @@ class RegisterRenditionVersion(CommandHandler):
     :param size_bytes: Tamanho do arquivo em bytes.
     """
 
+    @retry_on_conflict
     def __call__(
         self,
         id: str,
@@ -538,6 +1013,7 @@ class DeleteDocument(CommandHandler):
     :param id: Identificador único do documento.
     """
 
+    @retry_on_conflict
     def __call__(self, id: str) -> None:
         session = self.Session()
         document = session.documents.fetch(id)
@@ -547,6 +1023,615 @@ class DeleteDocument(CommandHandler):
         return result
 
 
+def _pointer(path: str, key) -> str:
+    return "%s/%s" % (path, str(key).replace("~", "~0").replace("/", "~1"))
+
+
+def _json_equal(old, new) -> bool:
+    """Compara `old` e `new` considerando os tipos JSON de seus valores, de
+    maneira que, e.g., ``1``, ``1.0`` e ``True`` sejam distintos.
+    """
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, dict):
+        return old.keys() == new.keys() and all(
+            _json_equal(value, new[key]) for key, value in old.items()
+        )
+    if isinstance(old, list):
+        return len(old) == len(new) and all(map(_json_equal, old, new))
+    return old == new
+
+
+def json_diff(old, new, path: str = "") -> list:
+    """Produz a lista de operações, no formato JSON Patch (RFC 6902), que
+    transforma `old` em `new`. São utilizadas apenas as operações ``add``,
+    ``remove`` e ``replace``. Nas listas, apenas o trecho entre o maior prefixo
+    e o maior sufixo comuns é modificado.
+    """
+    if _json_equal(old, new):
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        operations = []
+        for key in old.keys() - new.keys():
+            operations.append({"op": "remove", "path": _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                operations.append(
+                    {"op": "add", "path": _pointer(path, key), "value": value}
+                )
+            else:
+                operations.extend(json_diff(old[key], value, _pointer(path, key)))
+        return operations
+
+    if isinstance(old, list) and isinstance(new, list):
+        shortest = min(len(old), len(new))
+        prefix = 0
+        while prefix < shortest and _json_equal(old[prefix], new[prefix]):
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < shortest - prefix
+            and _json_equal(old[-suffix - 1], new[-suffix - 1])
+        ):
+            suffix += 1
+        if len(old) == len(new) and len(old) - prefix - suffix == 1:
+            return json_diff(old[prefix], new[prefix], _pointer(path, prefix))
+
+        operations = [
+            {"op": "remove", "path": _pointer(path, index)}
+            for index in reversed(range(prefix, len(old) - suffix))
+        ]
+        operations.extend(
+            {"op": "add", "path": _pointer(path, index), "value": new[index]}
+            for index in range(prefix, len(new) - suffix)
+        )
+        return operations
+
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def json_patch(document, operations: list):
+    """Aplica a `document` as operações produzidas por `json_diff`. O
+    documento é modificado.
+    """
+    for operation in operations:
+        keys = [
+            key.replace("~1", "/").replace("~0", "~")
+            for key in operation["path"].split("/")[1:]
+        ]
+        if not keys:
+            document = operation["value"]
+            continue
+
+        parent = document
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+
+        key = keys[-1]
+        if isinstance(parent, list):
+            key = len(parent) if key == "-" else int(key)
+            if operation["op"] == "add":
+                parent.insert(key, operation["value"])
+            elif operation["op"] == "remove":
+                del parent[key]
+            else:
+                parent[key] = operation["value"]
+        elif operation["op"] == "remove":
+            del parent[key]
+        else:
+            parent[key] = operation["value"]
+    return document
+
+
+def _content_field(change: dict) -> str:
+    return "delta_gz" if "delta_base" in change else "content_gz"
+
+
+class DeltaEncoder:
+    """Codifica os conteúdos JSON dos registros de mudança como deltas, no
+    formato JSON Patch, em relação à mudança anterior da mesma entidade.
+
+    O delta é armazenado em `delta_gz` e a mudança de referência é
+    identificada em `delta_base`. A cada `keyframe_interval` deltas
+    consecutivos, ou quando o delta não for menor que o conteúdo, o conteúdo
+    completo é armazenado, limitando o custo da reconstrução, realizada por
+    `FetchChange`.
+
+    As mudanças de referência são mantidas em memória, para até `max_entries`
+    entidades e `max_bytes` bytes de conteúdo. Como cada delta identifica sua
+    referência, mudanças da mesma entidade registradas por outros processos não
+    comprometem a reconstrução.
+
+    Cada delta identifica também, em `delta_keyframe`, o timestamp da mudança
+    com o conteúdo completo que inicia sua cadeia. O conteúdo completo é
+    armazenado sempre que esse timestamp for anterior a `keyframe_max_age`
+    segundos, de maneira que as cadeias não dependam de mudanças mais antigas
+    que isso e estas possam ser descartadas por `ChangesStore.prune`.
+    """
+
+    def __init__(
+        self,
+        keyframe_interval: int = 50,
+        max_entries: int = 10000,
+        keyframe_max_age: float = 86400,
+        max_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.keyframe_interval = int(keyframe_interval)
+        self.max_entries = int(max_entries)
+        self.keyframe_max_age = float(keyframe_max_age)
+        self.max_bytes = int(max_bytes)
+        # (entity, id) -> (_id, snapshot, depth, keyframe, size)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def encode(self, change: dict, content: bytes):
+        """Retorna o par ``(payload, snapshot)``, em que ``payload`` é o
+        conteúdo a ser armazenado comprimido -- o delta ou o próprio
+        `content` -- e ``snapshot`` o valor a ser informado a `remember` após
+        a confirmação da escrita da mudança.
+        """
+        key = (change["entity"], change["id"])
+        change.setdefault("_id", ObjectId())
+        if content is None or change.get("content_type") != "application/json":
+            with self._lock:
+                self._discard(key)
+            return content, None
+
+        snapshot, size = json.loads(content), len(content)
+        with self._lock:
+            previous = self._entries.get(key)
+
+        depth, keyframe = 0, change["timestamp"]
+        if (
+            previous is not None
+            and previous[2] < self.keyframe_interval
+            and previous[3] >= self._oldest_keyframe(change["timestamp"])
+        ):
+            base_id, base_snapshot, base_depth, base_keyframe, _ = previous
+            delta = json.dumps(json_diff(base_snapshot, snapshot)).encode("utf-8")
+            if len(delta) < len(content):
+                change["delta_base"] = base_id
+                change["delta_keyframe"] = base_keyframe
+                content, depth, keyframe = delta, base_depth + 1, base_keyframe
+        return content, (snapshot, depth, keyframe, size)
+
+    def _oldest_keyframe(self, timestamp: str) -> str:
+        """Produz o timestamp da mudança mais antiga que pode iniciar a cadeia
+        de deltas de uma mudança registrada em `timestamp`."""
+        return shift_timestamp(timestamp, -timedelta(seconds=self.keyframe_max_age))
+
+    def remember(self, change: dict, snapshot) -> None:
+        """Registra `change` como referência para a próxima mudança da mesma
+        entidade. Deve ser executado apenas após a confirmação da escrita de
+        `change`, pois os deltas subsequentes dependem dela para serem
+        reconstruídos."""
+        if snapshot is None:
+            return
+        key = (change["entity"], change["id"])
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (change["_id"], *snapshot)
+            self._bytes += snapshot[-1]
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, entry = self._entries.popitem(last=False)
+                self._bytes -= entry[-1]
+
+    def _discard(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[-1]
+
+
+def _gzip_compress(data: bytes) -> bytes:
+    """Comprime `data` em gzip de maneira determinística, i.e., sem registrar o
+    momento da compressão no cabeçalho, para que o resultado seja sempre o
+    mesmo e possa ser identificado por uma ETag forte.
+    """
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as compressed:
+        compressed.write(data)
+    return buffer.getvalue()
+
+
+def reconstruct_change(session, change: dict) -> dict:
+    """Produz a versão de `change` com o conteúdo completo em `content_gz`
+    caso tenha sido armazenada como delta. O conteúdo é comprimido de maneira
+    determinística por meio de `_gzip_compress`."""
+    if "delta_gz" not in change:
+        return change
+
+    deltas = []
+    base = change
+    while "delta_gz" in base:
+        deltas.append(json.loads(gzip.decompress(base["delta_gz"])))
+        base = session.changes.fetch(str(base["delta_base"]))
+    snapshot = json.loads(gzip.decompress(base["content_gz"]))
+    for delta in reversed(deltas):
+        snapshot = json_patch(snapshot, delta)
+
+    change = {
+        key: value
+        for key, value in change.items()
+        if key not in ("delta_gz", "delta_base", "delta_keyframe")
+    }
+    change["content_gz"] = _gzip_compress(json.dumps(snapshot).encode("utf-8"))
+    return change
+
+
+_STOP = object()
+
+
+class ChangesWriter:
+    """Escreve os registros de mudança em segundo plano, retirando da
+    requisição o custo da compressão e da escrita no banco de dados.
+
+    As mudanças submetidas são enfileiradas, numa fila limitada a
+    `queue_size` itens, e consumidas por `workers` threads que comprimem seus
+    conteúdos e as escrevem em lotes de até `batch_size` itens. Quando a fila
+    está cheia a submissão é bloqueada até que haja espaço.
+
+    Apenas a compressão é realizada concorrentemente: os lotes são escritos um
+    de cada vez, na ordem em que foram retirados da fila, de modo que as
+    mudanças de um processo são escritas na ordem em que foram submetidas e
+    os consumidores que acompanham a lista por meio de `since` ou de cursores
+    não deixam de obtê-las.
+
+    O timestamp de cada mudança é definido no momento da submissão. Caso
+    `ack_timeout` seja maior que zero, a submissão aguarda, por até
+    `ack_timeout` segundos, a confirmação da escrita. As mudanças pendentes
+    são escritas por meio de `close`, que deve ser executado no encerramento
+    do processo.
+
+    :param Session: factory de instâncias de `interfaces.Session`, utilizada
+    pelas threads na escrita das mudanças.
+    """
+
+    def __init__(
+        self,
+        Session: Callable[[], Session],
+        queue_size: int = 10000,
+        workers: int = 1,
+        batch_size: int = 100,
+        ack_timeout: float = 0,
+        compress: Callable[[bytes], bytes] = gzip.compress,
+    ):
+        self.Session = Session
+        self.queue_size = int(queue_size)
+        self.workers = int(workers)
+        self.batch_size = int(batch_size)
+        self.ack_timeout = float(ack_timeout)
+        self._compress = compress
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._threads = []
+        self._dequeue_lock = threading.Lock()
+        self._turn = threading.Condition()
+        self._next_ticket = 0
+        self._next_write = 0
+
+    def _start(self) -> None:
+        """Inicia as threads no processo atual, o que é verificado a cada
+        submissão pois o processo pode ter sido bifurcado após a criação da
+        instância.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._next_ticket = self._next_write = 0
+            self._threads = [
+                threading.Thread(
+                    target=self._work, name="changes-writer-%d" % i, daemon=True
+                )
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = pid
+
+    def submit(self, change: dict, content: bytes = None) -> Future:
+        """Enfileira `change` para ser escrita. O conteúdo `content`, caso
+        presente, é comprimido e armazenado em `change["content_gz"]`, ou em
+        `change["delta_gz"]` caso `change` seja um delta. Retorna
+        uma instância de `concurrent.futures.Future` que é resolvida após a
+        escrita.
+        """
+        return self.submit_many([(change, content)])[0]
+
+    def submit_many(self, changes: list) -> List[Future]:
+        """Versão de `submit` para uma lista de pares ``(change, content)``,
+        em que a confirmação das escritas é aguardada uma única vez.
+        """
+        self._start()
+        futures = []
+        for change, content in changes:
+            future = Future()
+            self._queue.put((change, content, future, time.monotonic()))
+            futures.append(future)
+        CHANGES_QUEUE_DEPTH.set(self._queue.qsize())
+
+        if self.ack_timeout > 0 and futures:
+            _, not_done = wait(futures, timeout=self.ack_timeout)
+            if not_done:
+                LOGGER.warning(
+                    "%d changes not acknowledged in %s seconds",
+                    len(not_done),
+                    self.ack_timeout,
+                )
+        return futures
+
+    def close(self, timeout: float = 30) -> None:
+        """Escreve as mudanças pendentes e encerra as threads, aguardando por
+        até `timeout` segundos.
+        """
+        if self._pid != os.getpid():
+            return
+        threads = self._threads
+        for _ in threads:
+            self._queue.put(_STOP)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._pid = None
+
+    def _next_batch(self) -> tuple:
+        """Retira da fila o próximo lote, acompanhado de sua posição na ordem
+        de escrita e da indicação de que a thread deve ser encerrada."""
+        with self._dequeue_lock:
+            item = self._queue.get()
+            if item is _STOP:
+                return [], None, True
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            ticket = self._next_ticket
+            self._next_ticket += 1
+        return batch, ticket, stop
+
+    @contextlib.contextmanager
+    def _write_turn(self, ticket: int):
+        """Aguarda a escrita dos lotes retirados da fila antes do lote
+        identificado por `ticket`."""
+        with self._turn:
+            self._turn.wait_for(lambda: self._next_write == ticket)
+        try:
+            yield
+        finally:
+            with self._turn:
+                self._next_write += 1
+                self._turn.notify_all()
+
+    def _work(self) -> None:
+        while True:
+            batch, ticket, stop = self._next_batch()
+            if not batch:
+                return
+            CHANGES_QUEUE_DEPTH.set(self._queue.qsize())
+            compress_error = None
+            try:
+                self._compress_batch(batch)
+            except Exception as exc:
+                compress_error = exc
+            with self._write_turn(ticket):
+                try:
+                    if compress_error is not None:
+                        raise compress_error
+                    self._write(batch)
+                except Exception as exc:
+                    LOGGER.exception("cannot write %d changes", len(batch))
+                    for _, _, future, _ in batch:
+                        if not future.done():
+                            CHANGES_WRITE_FAILURES_TOTAL.inc()
+                            future.set_exception(exc)
+            if stop:
+                return
+
+    def _compress_batch(self, batch: list) -> None:
+        for change, content, _, _ in batch:
+            if content is not None:
+                change[_content_field(change)] = self._compress(content)
+
+    def _write(self, batch: list) -> None:
+        changes = [change for change, _, _, _ in batch]
+        session = self.Session()
+        try:
+            session.changes.add_many(changes)
+        except AlreadyExists:
+            # o lote pode ter sido escrito parcialmente: as mudanças são
+            # escritas individualmente para que apenas as conflitantes falhem.
+            for change, _, future, submitted in batch:
+                try:
+                    session.changes.add(change)
+                except AlreadyExists as exc:
+                    if not self._is_written(session, change):
+                        LOGGER.error(
+                            'cannot write change of "%s": %s', change["id"], exc
+                        )
+                        CHANGES_WRITE_FAILURES_TOTAL.inc()
+                        future.set_exception(exc)
+                        continue
+                self._acknowledge(future, submitted)
+        else:
+            for _, _, future, submitted in batch:
+                self._acknowledge(future, submitted)
+
+    @staticmethod
+    def _is_written(session, change: dict) -> bool:
+        if "_id" not in change:
+            return False
+        try:
+            return session.changes.fetch(str(change["_id"]))["timestamp"] == (
+                change["timestamp"]
+            )
+        except DoesNotExist:
+            return False
+
+    @staticmethod
+    def _acknowledge(future: Future, submitted: float) -> None:
+        CHANGES_WRITE_LATENCY_SECONDS.observe(time.monotonic() - submitted)
+        future.set_result(None)
+
+
+class ChangesNotifier:
+    """Notifica, no escopo do processo, o registro de novas mudanças a quem
+    aguarda por elas.
+
+    O aguardo é orientado a versões: obtém-se a versão corrente por meio de
+    `version` *antes* de consultar as mudanças e, caso a consulta não produza
+    resultados, aguarda-se com `wait` até que a versão seja outra. Dessa forma
+    as mudanças registradas entre a consulta e o aguardo não são perdidas.
+    As mudanças registradas por outros processos não são notificadas, de
+    maneira que quem aguarda deve consultá-las novamente de tempos em tempos.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+
+    def version(self) -> int:
+        with self._condition:
+            return self._version
+
+    def notify(self) -> None:
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> bool:
+        """Aguarda até `timeout` segundos por uma versão diferente de
+        `version`. Retorna `True` caso tenha sido notificado.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._version != version, timeout=timeout
+            )
+
+
+CHANGES_NOTIFIER = ChangesNotifier()
+"""Instância de `ChangesNotifier` notificada por `log_change` e `log_changes`
+após a escrita das mudanças.
+"""
+
+
+def wait_for_changes(
+    fetch, timeout: float, recheck_interval: float = 1.0, notifier=None
+) -> list:
+    """Obtém a lista de mudanças produzida por `fetch`, aguardando até
+    `timeout` segundos caso esteja vazia.
+
+    A consulta é refeita sempre que `notifier` for notificado ou, no máximo,
+    a cada `recheck_interval` segundos, o que garante que as mudanças escritas
+    por outros processos também sejam percebidas.
+    """
+    notifier = notifier or CHANGES_NOTIFIER
+    deadline = time.monotonic() + timeout
+    while True:
+        version = notifier.version()
+        changes = list(fetch())
+        remaining = deadline - time.monotonic()
+        if changes or remaining <= 0:
+            return changes
+        notifier.wait(version, min(remaining, recheck_interval))
+
+
+CHANGES_WRITER = None
+"""Instância de `ChangesWriter` utilizada por `log_change` e `log_changes`.
+Caso seja `None`, as mudanças são escritas durante a execução do comando.
+"""
+
+
+def set_changes_writer(writer: ChangesWriter) -> None:
+    """Define a instância de `ChangesWriter` utilizada no registro das
+    mudanças, ou `None` para que sejam escritas de maneira síncrona.
+    """
+    global CHANGES_WRITER
+    CHANGES_WRITER = writer
+
+
+CHANGES_DELTA_ENCODER = None
+"""Instância de `DeltaEncoder` utilizada por `log_change` e `log_changes`.
+Caso seja `None`, as mudanças armazenam sempre o conteúdo completo.
+"""
+
+
+def set_changes_delta_encoder(encoder: DeltaEncoder) -> None:
+    """Define a instância de `DeltaEncoder` utilizada no registro das
+    mudanças, ou `None` para que armazenem sempre o conteúdo completo.
+    """
+    global CHANGES_DELTA_ENCODER
+    CHANGES_DELTA_ENCODER = encoder
+
+
+def _change_written(encoder, change: dict, snapshot, future: Future) -> None:
+    """Notifica os consumidores da lista de mudanças e registra `change` como
+    referência dos deltas subsequentes, caso sua escrita em segundo plano
+    tenha sido confirmada."""
+    if future.exception() is not None:
+        return
+    CHANGES_NOTIFIER.notify()
+    if encoder is not None:
+        encoder.remember(change, snapshot)
+
+
+def _write_changes(session, changes: list, compress=gzip.compress) -> None:
+    """Escreve os pares ``(change, content)`` de `changes`, por meio de
+    `CHANGES_WRITER` caso definido, codificando os conteúdos por meio de
+    `CHANGES_DELTA_ENCODER` caso definido.
+
+    As mudanças recebem o hash SHA-256 do conteúdo completo em `content_hash`,
+    o que permite aos consumidores identificar conteúdos inalterados e aos
+    `ChangesDataStore` armazená-los uma única vez.
+    """
+    encoder = CHANGES_DELTA_ENCODER
+    encoded = []
+    for change, content in changes:
+        if content is not None:
+            change["content_hash"] = hashlib.sha256(content).hexdigest()
+        snapshot = None
+        if encoder is not None:
+            content, snapshot = encoder.encode(change, content)
+        encoded.append((change, content, snapshot))
+
+    if CHANGES_WRITER is not None:
+        futures = CHANGES_WRITER.submit_many(
+            [(change, content) for change, content, _ in encoded]
+        )
+        for (change, _, snapshot), future in zip(encoded, futures):
+            future.add_done_callback(
+                functools.partial(_change_written, encoder, change, snapshot)
+            )
+        return
+
+    for change, content, _ in encoded:
+        if content is not None:
+            change[_content_field(change)] = compress(content)
+    if len(encoded) == 1:
+        session.changes.add(encoded[0][0])
+    else:
+        session.changes.add_many([change for change, _, _ in encoded])
+    CHANGES_NOTIFIER.notify()
+
+    if encoder is not None:
+        for change, _, snapshot in encoded:
+            encoder.remember(change, snapshot)
+
+
 def log_change(
     data, session, now=utcnow, entity="", deleted=False, compress=gzip.compress
 ):
@@ -554,11 +1639,62 @@ def log_change(
 
     if deleted:
         change["deleted"] = True
+        content = None
     else:
-        change["content_gz"] = compress(data["instance"].data_bytes())
+        content = data["instance"].data_bytes()
         change["content_type"] = data["instance"].data_type
 
-    session.changes.add(change)
+    _write_changes(session, [(change, content)], compress)
+
+
+def _next_timestamp(timestamp: str) -> str:
+    """Produz o timestamp UTC, em formato textual, imediatamente posterior a
+    `timestamp`."""
+    return shift_timestamp(timestamp, timedelta(microseconds=1))
+
+
+def log_changes(data, session, now=utcnow, entity="", compress=gzip.compress):
+    """Registra, numa única operação de escrita em lote, as mudanças
+    correspondentes a cada uma das entidades em `data["instances"]`. Os
+    timestamps das mudanças são únicos e crescentes, na ordem das entidades.
+    """
+    changes = []
+    last_timestamp = ""
+    for instance in data["instances"]:
+        timestamp = now()
+        if timestamp <= last_timestamp:
+            timestamp = _next_timestamp(last_timestamp)
+        last_timestamp = timestamp
+        change = {
+            "timestamp": timestamp,
+            "entity": entity,
+            "id": instance.id(),
+            "content_type": instance.data_type,
+        }
+        changes.append((change, instance.data_bytes()))
+
+    if changes:
+        _write_changes(session, changes, compress)
+
+
+def materialize_document_data(data, session):
+    """Armazena o XML da versão mais recente do documento já renderizado,
+    caso a sessão possua um `RenderedDocumentsDataStore`.
+    """
+    rendered_documents = session.rendered_documents
+    if rendered_documents is None:
+        return
+
+    document = data["instance"]
+    rendered_documents.add(document.data_key(), document.data())
+
+
+def materialize_documents_data(data, session):
+    """Versão de `materialize_document_data` para os eventos que envolvem
+    vários documentos, em `data["instances"]`.
+    """
+    for document in data["instances"]:
+        materialize_document_data({"instance": document}, session)
 
 
 DEFAULT_SUBSCRIBERS = [
@@ -568,6 +1704,11 @@ DEFAULT_SUBSCRIBERS = [
         functools.partial(log_change, entity="Document"),
     ),
     (Events.ASSET_VERSION_REGISTERED, functools.partial(log_change, entity="Document")),
+    (Events.DOCUMENT_REGISTERED, materialize_document_data),
+    (Events.DOCUMENT_VERSION_REGISTERED, materialize_document_data),
+    (Events.ASSET_VERSION_REGISTERED, materialize_document_data),
+    (Events.DOCUMENTS_REGISTERED, functools.partial(log_changes, entity="Document")),
+    (Events.DOCUMENTS_REGISTERED, materialize_documents_data),
     (
         Events.DOCUMENTSBUNDLE_CREATED,
         functools.partial(log_change, entity="DocumentsBundle"),
@@ -621,30 +1762,49 @@ def get_handlers(
 ) -> dict:
     """Ponto de acesso aos serviços do Kernel.
 
+    Os objetos produzidos não mantêm estado entre as execuções e devem ser
+    criados uma única vez, na inicialização da aplicação. A tabela de
+    observadores é produzida aqui e compartilhada por todas as sessões.
+
     :param Session: factory de instâncias de interfaces.Session.
     :param subscribers (opcional): mapeamento entre eventos e callbacks, na
     forma de lista associativa.
     """
 
+    observers = {}
+    for event, callback in subscribers:
+        observers.setdefault(event, set()).add(callback)
+    observers = {event: frozenset(callbacks) for event, callbacks in observers.items()}
+
     def SessionWrapper():
         """Produz instância de `Session` inicializada com seus observadores.
+        Em um `session_scope`, a mesma instância é reaproveitada.
         """
+        scope = _SESSION_SCOPE.get()
+        if scope is not None and SessionWrapper in scope:
+            return scope[SessionWrapper]
+
         session = Session()
-        for event, callback in subscribers:
-            session.observe(event, callback)
+        session.bind_observers(observers)
+        if scope is not None:
+            scope[SessionWrapper] = session
         return session
 
     return {
         "register_document": RegisterDocument(SessionWrapper),
         "register_document_version": RegisterDocumentVersion(SessionWrapper),
+        "register_document_or_version": RegisterDocumentOrVersion(SessionWrapper),
+        "register_documents": RegisterDocuments(SessionWrapper),
         "fetch_document_data": FetchDocumentData(SessionWrapper),
         "fetch_document_manifest": FetchDocumentManifest(SessionWrapper),
+        "fetch_documents_manifests": FetchDocumentsManifests(SessionWrapper),
         "fetch_assets_list": FetchAssetsList(SessionWrapper),
         "register_asset_version": RegisterAssetVersion(SessionWrapper),
         "diff_document_versions": DiffDocumentVersions(SessionWrapper),
         "sanitize_document_front": SanitizeDocumentFront(SessionWrapper),
         "create_documents_bundle": CreateDocumentsBundle(SessionWrapper),
         "fetch_documents_bundle": FetchDocumentsBundle(SessionWrapper),
+        "fetch_documents_bundles": FetchDocumentsBundles(SessionWrapper),
         "update_documents_bundle_metadata": UpdateDocumentsBundleMetadata(
             SessionWrapper
         ),
@@ -659,6 +1819,7 @@ def get_handlers(
         ),
         "create_journal": CreateJournal(SessionWrapper),
         "fetch_journal": FetchJournal(SessionWrapper),
+        "fetch_journals": FetchJournals(SessionWrapper),
         "update_journal_metadata": UpdateJournalMetadata(SessionWrapper),
         "add_issue_to_journal": AddIssueToJournal(SessionWrapper),
         "insert_issue_to_journal": InsertIssueToJournal(SessionWrapper),
@@ -666,6 +1827,7 @@ def get_handlers(
         "update_issues_in_journal": UpdateIssuesInJournal(SessionWrapper),
         "fetch_changes": FetchChanges(SessionWrapper),
         "fetch_change": FetchChange(SessionWrapper),
+        "export_snapshot": ExportSnapshot(SessionWrapper),
         "set_ahead_of_print_bundle_to_journal": SetAheadOfPrintBundleToJournal(
             SessionWrapper
         ),
@@ -12,6 +12,7 @@ class Session(interfaces.Session):
         self._documents_bundles = InMemoryDocumentsBundleStore()
         self._journals = InMemoryJournalStore()
         self._changes = InMemoryChangesDataStore()
+        self._rendered_documents = InMemoryRenderedDocumentsDataStore()
 
     @property
     def documents(self):
@@ -29,6 +30,10 @@ class Session(interfaces.Session):
     def changes(self):
         return self._changes
 
+    @property
+    def rendered_documents(self):
+        return self._rendered_documents
+
 
 class InMemoryDataStore(interfaces.DataStore):
     def __init__(self):
@@ -53,6 +58,10 @@ class InMemoryDataStore(interfaces.DataStore):
         else:
             raise exceptions.DoesNotExist()
 
+    def scan(self):
+        for id in sorted(self._data_store):
+            yield self.DomainClass(manifest=self._data_store[id])
+
 
 class InMemoryDocumentStore(InMemoryDataStore):
     DomainClass = domain.Document
@@ -183,6 +192,7 @@ class InMemoryChangesDataStore(interfaces.ChangesDataStore):
     def __init__(self):
         self._timestamps = OrderedDict()  # timestamps -> mudanças
         self._ids = {}  # ids -> mudanças
+        self._latest = {}  # (entity, id) -> mudança mais recente
 
     def add(self, change: dict):
         change["_id"] = str(change.get("_id") or ObjectId())
@@ -191,15 +201,59 @@ class InMemoryChangesDataStore(interfaces.ChangesDataStore):
         else:
             self._timestamps[change["timestamp"]] = change
             self._ids[change["_id"]] = change
-
-    def filter(self, since: str = "", limit: int = 500):
+            key = (change.get("entity"), change.get("id"))
+            if (
+                key not in self._latest
+                or self._latest[key]["timestamp"] < change["timestamp"]
+            ):
+                self._latest[key] = change
+
+    def filter(
+        self,
+        since: str = "",
+        limit: int = 500,
+        since_id: str = None,
+        until: str = "",
+        entity: str = "",
+        id: str = "",
+        id_prefix: str = "",
+        compacted: bool = False,
+    ):
 
         return [
             change
             for timestamp, change in self._timestamps.items()
-            if timestamp > since
+            if (
+                not compacted
+                or self._latest[(change.get("entity"), change.get("id"))] is change
+            )
+            and (
+                timestamp > since
+                or (
+                    since_id is not None
+                    and timestamp == since
+                    and change["_id"] > since_id
+                )
+            )
+            and (not until or timestamp <= until)
+            and (not entity or change["entity"] == entity)
+            and (not id or change["id"] == id)
+            and change["id"].startswith(id_prefix)
         ][:limit]
 
+    def last(self):
+        if not self._timestamps:
+            return None
+        return next(reversed(self._timestamps.values()))
+
+    def ranges(self, parts: int) -> list:
+        if parts < 1:
+            raise ValueError("parts must be greater than zero: %s" % parts)
+        timestamps = list(self._timestamps)
+        step = -(-len(timestamps) // parts) if timestamps else 1
+        bounds = [""] + timestamps[step - 1 : -1 : step] + [""]
+        return list(zip(bounds, bounds[1:]))
+
     def fetch(self, id: str) -> dict:
         try:
             return self._ids[id]
@@ -207,6 +261,20 @@ class InMemoryChangesDataStore(interfaces.ChangesDataStore):
             raise exceptions.DoesNotExist()
 
 
+class InMemoryRenderedDocumentsDataStore(interfaces.RenderedDocumentsDataStore):
+    def __init__(self):
+        self._data_store = {}
+
+    def add(self, key: str, data: bytes):
+        self._data_store.setdefault(key, data)
+
+    def fetch(self, key: str) -> bytes:
+        try:
+            return self._data_store[key]
+        except KeyError:
+            raise exceptions.DoesNotExist()
+
+
 class MongoDBCollectionStub:
     def __init__(self):
         self._mongo_store = OrderedDict()
@@ -222,6 +290,10 @@ class MongoDBCollectionStub:
             self._mongo_store[data["_id"]] = data
             self._timestamps.add(data["timestamp"])
 
+    def insert_many(self, data, ordered=True):
+        for item in data:
+            self.insert_one(item)
+
     def find(self, query, sort=None, projection=None):
         since = query["timestamp"]["$gt"]
 
@@ -20,6 +20,7 @@ class StoreTestMixin:
         store.add(data)
         expected = data.manifest
         expected["_id"] = "0034-8910-rsp-48-2"
+        expected["_rev"] = 1
         self.DBCollectionMock.insert_one.assert_called_once_with(
             self.set_expected(expected)
         )
@@ -28,7 +29,7 @@ class StoreTestMixin:
         store = self.Adapter(self.DBCollectionMock)
         data = self.DomainClass(manifest={"_id": "1", "id": "0034-8910-rsp-48-2"})
         store.add(data)
-        expected = data.manifest
+        expected = {**data.manifest, "_rev": 1}
         self.DBCollectionMock.insert_one.assert_called_once_with(
             self.set_expected(expected)
         )
@@ -105,7 +106,17 @@ class DocumentsStoreTest(StoreTestMixin, unittest.TestCase):
         Mais infos sobre a restrição do MongoDB para nomes de campos:
         https://docs.mongodb.com/manual/reference/limits/#Restrictions-on-Field-Names
         """
-        return {"_id": value.get("_id"), "document": json.dumps(value)}
+        value = dict(value)
+        versions = value.pop("versions", [])
+        expected = {
+            "_id": value.get("_id"),
+            "document": json.dumps(value),
+            "versions": [json.dumps(version) for version in versions],
+        }
+        if "_rev" in value:
+            expected["_rev"] = value.pop("_rev")
+            expected["document"] = json.dumps(value)
+        return expected
 
 
 class DocumentsBundleStoreTest(StoreTestMixin, unittest.TestCase):
@@ -126,6 +137,297 @@ class JournalStoreTest(StoreTestMixin, unittest.TestCase):
         return value
 
 
+class PartialUpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.collection.update_one.return_value = Mock(matched_count=1)
+
+    def fetch_document(self):
+        manifest = apptesting.manifest_data_fixture()
+        self.collection.find_one.return_value = {
+            **DocumentsStoreTest.set_expected(None, {"_id": manifest["id"], **manifest}),
+            "_rev": 3,
+        }
+        store = adapters.DocumentStore(self.collection)
+        return store, store.fetch(manifest["id"])
+
+    def fetch_bundle(self, items=(), metadata=None):
+        manifest = {
+            "_id": "0034-8910-rsp-48-2",
+            "id": "0034-8910-rsp-48-2",
+            "created": "2018-08-05T23:03:44.971230Z",
+            "updated": "2018-08-05T23:03:44.971230Z",
+            "items": list(items),
+            "metadata": metadata or {},
+            "_rev": 3,
+        }
+        self.collection.find_one.return_value = manifest
+        store = adapters.DocumentsBundleStore(self.collection)
+        return store, store.fetch(manifest["id"])
+
+    def test_new_document_version_is_pushed(self):
+        store, document = self.fetch_document()
+        document.new_version(
+            "/rawfiles/ab12/0034-8910-rsp-48-2-0347.xml",
+            assets_getter=lambda data_url, timeout: (None, []),
+        )
+        store.update(document)
+        self.collection.replace_one.assert_not_called()
+        self.collection.update_one.assert_called_once_with(
+            {"_id": "0034-8910-rsp-48-2", "_rev": 3},
+            {
+                "$push": {
+                    "versions": {
+                        "$each": [json.dumps(document.manifest["versions"][-1])]
+                    }
+                },
+                "$inc": {"_rev": 1},
+            },
+        )
+
+    def test_new_asset_version_sets_only_the_latest_version(self):
+        store, document = self.fetch_document()
+        document.new_asset_version(
+            "0034-8910-rsp-48-2-0347-gf02.tiff", "/rawfiles/ab12/gf02.tiff"
+        )
+        store.update(document)
+        self.collection.update_one.assert_called_once_with(
+            {"_id": "0034-8910-rsp-48-2", "_rev": 3},
+            {
+                "$set": {"versions.1": json.dumps(document.manifest["versions"][1])},
+                "$inc": {"_rev": 1},
+            },
+        )
+
+    def test_documents_in_legacy_layout_are_replaced(self):
+        manifest = apptesting.manifest_data_fixture()
+        self.collection.find_one.return_value = {
+            "_id": manifest["id"],
+            "document": json.dumps(manifest),
+        }
+        self.collection.replace_one.return_value = Mock(matched_count=1)
+        store = adapters.DocumentStore(self.collection)
+        document = store.fetch(manifest["id"])
+        document.new_deleted_version()
+        store.update(document)
+        self.collection.update_one.assert_not_called()
+        _, replacement = self.collection.replace_one.call_args[0]
+        self.assertEqual(len(replacement["versions"]), 3)
+
+    def test_unchanged_data_is_not_written(self):
+        store, document = self.fetch_document()
+        store.update(document)
+        self.collection.update_one.assert_not_called()
+        self.collection.replace_one.assert_not_called()
+
+    def test_consecutive_updates_are_relative_to_the_last_write(self):
+        store, bundle = self.fetch_bundle()
+        bundle.add_document({"id": "doc-1"})
+        store.update(bundle)
+        bundle.add_document({"id": "doc-2"})
+        store.update(bundle)
+        operations = self.collection.update_one.call_args[0][1]
+        self.assertEqual(operations["$push"], {"items": {"$each": [{"id": "doc-2"}]}})
+
+    def test_added_item_is_pushed(self):
+        store, bundle = self.fetch_bundle(items=[{"id": "doc-1"}])
+        bundle.add_document({"id": "doc-2"})
+        store.update(bundle)
+        self.collection.update_one.assert_called_once_with(
+            {"_id": "0034-8910-rsp-48-2", "_rev": 3},
+            {
+                "$set": {"updated": bundle.manifest["updated"]},
+                "$push": {"items": {"$each": [{"id": "doc-2"}]}},
+                "$inc": {"_rev": 1},
+            },
+        )
+
+    def test_inserted_item_is_pushed_at_position(self):
+        store, bundle = self.fetch_bundle(items=[{"id": "doc-1"}, {"id": "doc-2"}])
+        bundle.insert_document(1, {"id": "doc-3"})
+        store.update(bundle)
+        operations = self.collection.update_one.call_args[0][1]
+        self.assertEqual(
+            operations["$push"],
+            {"items": {"$each": [{"id": "doc-3"}], "$position": 1}},
+        )
+
+    def test_removed_item_sets_the_list(self):
+        store, bundle = self.fetch_bundle(items=[{"id": "doc-1"}, {"id": "doc-2"}])
+        bundle.remove_document("doc-1")
+        store.update(bundle)
+        operations = self.collection.update_one.call_args[0][1]
+        self.assertEqual(operations["$set"]["items"], [{"id": "doc-2"}])
+        self.assertNotIn("$push", operations)
+
+    def test_metadata_entry_is_pushed(self):
+        store, bundle = self.fetch_bundle(
+            metadata={"volume": [["2018-08-05T23:03:44.971230Z", "25"]]}
+        )
+        bundle.volume = "26"
+        store.update(bundle)
+        operations = self.collection.update_one.call_args[0][1]
+        self.assertEqual(
+            operations["$push"],
+            {"metadata.volume": {"$each": [(bundle.manifest["updated"], "26")]}},
+        )
+
+    def test_new_metadata_is_set(self):
+        store, bundle = self.fetch_bundle()
+        bundle.volume = "26"
+        store.update(bundle)
+        operations = self.collection.update_one.call_args[0][1]
+        self.assertEqual(
+            operations["$set"]["metadata.volume"],
+            [(bundle.manifest["updated"], "26")],
+        )
+
+    def test_removed_component_is_unset(self):
+        store, journal = self.fetch_bundle()
+        store = adapters.JournalStore(self.collection)
+        self.collection.find_one.return_value = {
+            **self.collection.find_one.return_value,
+            "aop": "0034-8910-aop",
+        }
+        journal = store.fetch("0034-8910-rsp-48-2")
+        journal.remove_ahead_of_print_bundle()
+        store.update(journal)
+        operations = self.collection.update_one.call_args[0][1]
+        self.assertEqual(operations["$unset"], {"aop": ""})
+
+    def test_update_raises_exception_if_does_not_exist(self):
+        store, bundle = self.fetch_bundle()
+        bundle.add_document({"id": "doc-1"})
+        self.collection.update_one.return_value = Mock(matched_count=0)
+        self.collection.count_documents.return_value = 0
+        self.assertRaises(exceptions.DoesNotExist, store.update, bundle)
+
+
+class AddManyTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.store = adapters.DocumentsBundleStore(self.collection)
+
+    def test_data_is_inserted_at_once(self):
+        bundles = [domain.DocumentsBundle(id="b1"), domain.DocumentsBundle(id="b2")]
+        self.assertEqual(self.store.add_many(bundles), [None, None])
+        manifests, = self.collection.insert_many.call_args[0]
+        self.assertEqual([m["_id"] for m in manifests], ["b1", "b2"])
+        self.assertEqual(self.collection.insert_many.call_args[1], {"ordered": False})
+
+    def test_duplicated_ids_are_reported_per_item(self):
+        import pymongo
+
+        self.collection.insert_many.side_effect = pymongo.errors.BulkWriteError(
+            {"writeErrors": [{"index": 1, "code": 11000, "errmsg": "dup"}]}
+        )
+        bundles = [domain.DocumentsBundle(id="b1"), domain.DocumentsBundle(id="b2")]
+        results = self.store.add_many(bundles)
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], exceptions.AlreadyExists)
+
+    def test_other_errors_are_reported_per_item(self):
+        import pymongo
+
+        self.collection.insert_many.side_effect = pymongo.errors.BulkWriteError(
+            {"writeErrors": [{"index": 0, "code": 2, "errmsg": "bad value"}]}
+        )
+        bundles = [domain.DocumentsBundle(id="b1"), domain.DocumentsBundle(id="b2")]
+        results = self.store.add_many(bundles)
+        self.assertIsInstance(results[0], exceptions.NonRetryableError)
+        self.assertNotIsInstance(results[0], exceptions.AlreadyExists)
+        self.assertIsNone(results[1])
+
+
+class FetchManyTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.collection.find.return_value = [
+            {"_id": "b2", "id": "b2", "items": [], "metadata": {}, "_rev": 1},
+            {"_id": "b1", "id": "b1", "items": [], "metadata": {}, "_rev": 1},
+        ]
+        self.store = adapters.DocumentsBundleStore(self.collection)
+
+    def test_data_is_fetched_with_a_single_query(self):
+        self.store.fetch_many(["b1", "b2", "b1"])
+        self.collection.find.assert_called_once()
+        query, = self.collection.find.call_args[0]
+        self.assertEqual(sorted(query["_id"]["$in"]), ["b1", "b2"])
+
+    def test_order_is_preserved_and_missing_ids_are_none(self):
+        results = self.store.fetch_many(["b1", "missing", "b2"])
+        self.assertEqual(results[0].id(), "b1")
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2].id(), "b2")
+
+    def test_empty_ids(self):
+        self.assertEqual(self.store.fetch_many([]), [])
+        self.collection.find.assert_not_called()
+
+
+class OptimisticConcurrencyTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.collection.update_one.return_value = Mock(matched_count=1)
+        self.collection.replace_one.return_value = Mock(matched_count=1)
+        self.collection.find_one.return_value = {
+            "_id": "0034-8910-rsp-48-2",
+            "id": "0034-8910-rsp-48-2",
+            "created": "2018-08-05T23:03:44.971230Z",
+            "updated": "2018-08-05T23:03:44.971230Z",
+            "items": [],
+            "metadata": {},
+            "_rev": 3,
+        }
+        self.store = adapters.DocumentsBundleStore(self.collection)
+
+    def test_revision_is_not_part_of_the_manifest(self):
+        bundle = self.store.fetch("0034-8910-rsp-48-2")
+        self.assertNotIn("_rev", bundle.manifest)
+
+    def test_conflict_is_raised_when_revision_has_changed(self):
+        bundle = self.store.fetch("0034-8910-rsp-48-2")
+        bundle.add_document({"id": "doc-1"})
+        self.collection.update_one.return_value = Mock(matched_count=0)
+        self.collection.count_documents.return_value = 1
+        self.assertRaises(exceptions.UpdateConflict, self.store.update, bundle)
+
+    def test_revision_is_incremented_after_each_write(self):
+        bundle = self.store.fetch("0034-8910-rsp-48-2")
+        bundle.add_document({"id": "doc-1"})
+        self.store.update(bundle)
+        bundle.add_document({"id": "doc-2"})
+        self.store.update(bundle)
+        self.assertEqual(
+            self.collection.update_one.call_args[0][0],
+            {"_id": "0034-8910-rsp-48-2", "_rev": 4},
+        )
+
+    def test_data_without_revision_is_matched_by_missing_field(self):
+        del self.collection.find_one.return_value["_rev"]
+        bundle = self.store.fetch("0034-8910-rsp-48-2")
+        bundle.add_document({"id": "doc-1"})
+        self.store.update(bundle)
+        self.assertEqual(
+            self.collection.update_one.call_args[0][0],
+            {"_id": "0034-8910-rsp-48-2", "_rev": None},
+        )
+
+    def test_replacement_is_conditional_when_data_was_fetched(self):
+        manifest = apptesting.manifest_data_fixture()
+        self.collection.find_one.return_value = {
+            "_id": manifest["id"],
+            "document": json.dumps(manifest),
+        }
+        store = adapters.DocumentStore(self.collection)
+        document = store.fetch(manifest["id"])
+        document.new_deleted_version()
+        store.update(document)
+        _filter, replacement = self.collection.replace_one.call_args[0]
+        self.assertEqual(_filter, {"_id": manifest["id"], "_rev": None})
+        self.assertEqual(replacement["_rev"], 1)
+
+
 class SessionTestMixin:
     """Testa a interface de `interfaces.Session`. Qualquer classe que implementar
     a interface mencionada deverá acompanhar um conjunto de testes que herdam
@@ -168,6 +470,22 @@ class SessionTestMixin:
         session.notify("test_event", "foo")
         callback.assert_called_once_with("foo", session)
 
+    def test_notify_runs_bound_observers(self):
+        callback = Mock()
+        session = self.Session()
+        session.bind_observers({"test_event": frozenset([callback])})
+        session.notify("test_event", "foo")
+        callback.assert_called_once_with("foo", session)
+
+    def test_observe_doesnt_modify_bound_observers(self):
+        observers = {"test_event": frozenset([Mock()])}
+        session = self.Session()
+        session.bind_observers(observers)
+        session.observe("test_event", Mock())
+        session.observe("other_event", Mock())
+        self.assertEqual(len(observers["test_event"]), 1)
+        self.assertNotIn("other_event", observers)
+
     def test_notify_doesnt_propagate_exceptions(self):
         import logging
 
@@ -207,7 +525,8 @@ class AppTestingSessionTests(SessionTestMixin, unittest.TestCase):
 
 
 class MongoClientStub:
-    documents = documents_bundles = journals = changes = None
+    documents = documents_bundles = journals = changes = rendered_documents = None
+    changes_blobs = None
 
 
 class SessionTests(SessionTestMixin, unittest.TestCase):
@@ -215,6 +534,242 @@ class SessionTests(SessionTestMixin, unittest.TestCase):
         return adapters.Session(MongoClientStub())
 
 
+class SessionIdentityMapTest(unittest.TestCase):
+    def setUp(self):
+        self.mongo = Mock()
+        self.mongo.documents_bundles.find_one.return_value = {
+            "_id": "b1",
+            "id": "b1",
+            "created": "2018-08-05T23:03:44.971230Z",
+            "updated": "2018-08-05T23:03:44.971230Z",
+            "items": [],
+            "metadata": {},
+            "_rev": 1,
+        }
+        self.mongo.documents_bundles.update_one.return_value = Mock(matched_count=1)
+        self.session = adapters.Session(self.mongo)
+
+    def test_stores_are_created_once(self):
+        self.assertIs(self.session.documents, self.session.documents)
+        self.assertIs(self.session.journals, self.session.journals)
+
+    def test_repeated_fetches_read_the_database_once(self):
+        first = self.session.documents_bundles.fetch("b1")
+        second = self.session.documents_bundles.fetch("b1")
+        self.mongo.documents_bundles.find_one.assert_called_once()
+        self.assertIsNot(first, second)
+        self.assertEqual(first.manifest, second.manifest)
+
+    def test_fetch_returns_the_last_written_state(self):
+        bundle = self.session.documents_bundles.fetch("b1")
+        bundle.add_document({"id": "doc-1"})
+        self.session.documents_bundles.update(bundle)
+        fetched = self.session.documents_bundles.fetch("b1")
+        self.assertEqual(fetched.documents, [{"id": "doc-1"}])
+        fetched.add_document({"id": "doc-2"})
+        self.session.documents_bundles.update(fetched)
+        self.assertEqual(
+            self.mongo.documents_bundles.update_one.call_args[0][0],
+            {"_id": "b1", "_rev": 2},
+        )
+
+    def test_unsaved_changes_are_not_visible(self):
+        bundle = self.session.documents_bundles.fetch("b1")
+        bundle.add_document({"id": "doc-1"})
+        self.assertEqual(self.session.documents_bundles.fetch("b1").documents, [])
+
+    def test_conflicts_evict_the_entity(self):
+        bundle = self.session.documents_bundles.fetch("b1")
+        bundle.add_document({"id": "doc-1"})
+        self.mongo.documents_bundles.update_one.return_value = Mock(matched_count=0)
+        self.mongo.documents_bundles.count_documents.return_value = 1
+        self.assertRaises(
+            exceptions.UpdateConflict, self.session.documents_bundles.update, bundle
+        )
+        self.session.documents_bundles.fetch("b1")
+        self.assertEqual(self.mongo.documents_bundles.find_one.call_count, 2)
+
+    def test_sessions_dont_share_identity_maps(self):
+        adapters.Session(self.mongo).documents_bundles.fetch("b1")
+        self.session.documents_bundles.fetch("b1")
+        self.assertEqual(self.mongo.documents_bundles.find_one.call_count, 2)
+
+
+class ManifestCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = adapters.ManifestCache(max_entries=2)
+
+    def test_get_returns_what_was_set(self):
+        self.cache.set("Journal", "j1", "entry", self.cache.generation())
+        self.assertEqual(self.cache.get("Journal", "j1"), "entry")
+        self.assertIsNone(self.cache.get("DocumentsBundle", "j1"))
+
+    def test_least_recently_used_entries_are_discarded(self):
+        generation = self.cache.generation()
+        self.cache.set("Journal", "j1", "entry-1", generation)
+        self.cache.set("Journal", "j2", "entry-2", generation)
+        self.cache.get("Journal", "j1")
+        self.cache.set("Journal", "j3", "entry-3", generation)
+        self.assertIsNone(self.cache.get("Journal", "j2"))
+        self.assertEqual(self.cache.get("Journal", "j1"), "entry-1")
+
+    def test_invalidate(self):
+        self.cache.set("Journal", "j1", "entry", self.cache.generation())
+        self.cache.invalidate("Journal", "j1")
+        self.assertIsNone(self.cache.get("Journal", "j1"))
+
+    def test_entries_read_before_invalidation_are_discarded(self):
+        generation = self.cache.generation()
+        self.cache.invalidate("Journal", "j1")
+        self.cache.set("Journal", "j1", "stale", generation)
+        self.assertIsNone(self.cache.get("Journal", "j1"))
+
+    def test_entries_read_before_forgotten_invalidations_are_discarded(self):
+        generation = self.cache.generation()
+        for id in ["j1", "j2", "j3"]:
+            self.cache.invalidate("Journal", id)
+        self.cache.set("Journal", "j1", "stale", generation)
+        self.assertIsNone(self.cache.get("Journal", "j1"))
+
+
+    def test_entries_expire(self):
+        with patch.object(adapters.time, "monotonic", return_value=100.0):
+            self.cache.set("Journal", "j1", "entry", self.cache.generation())
+        with patch.object(adapters.time, "monotonic", return_value=159.0):
+            self.assertEqual(self.cache.get("Journal", "j1"), "entry")
+        with patch.object(adapters.time, "monotonic", return_value=160.0):
+            self.assertIsNone(self.cache.get("Journal", "j1"))
+
+    def test_entries_do_not_expire_without_max_age(self):
+        cache = adapters.ManifestCache(max_age=0)
+        with patch.object(adapters.time, "monotonic", return_value=100.0):
+            cache.set("Journal", "j1", "entry", cache.generation())
+        with patch.object(adapters.time, "monotonic", return_value=1e9):
+            self.assertEqual(cache.get("Journal", "j1"), "entry")
+
+
+class ManifestCachePollTest(unittest.TestCase):
+    def setUp(self):
+        self.changes = Mock()
+        self.collection = self.changes.with_options.return_value
+        self.collection.find.return_value.limit.return_value = [
+            {"_id": 1, "timestamp": "2019-01-01T00:00:00.000000Z"}
+        ]
+        patcher = patch("documentstore.adapters.threading.Thread")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = adapters.ManifestCache(changes=lambda: self.changes)
+        self.cache.get("Journal", "j1")
+        self.cache.poll()
+        self.generation = self.cache.generation()
+        self.cache.set("Journal", "j1", "entry", self.generation)
+        self.cache.set("DocumentsBundle", "b1", "entry", self.generation)
+
+    def test_first_poll_starts_after_the_latest_change(self):
+        self.collection.find.return_value = []
+        self.cache.poll()
+        self.assertEqual(
+            self.collection.find.call_args[0][0],
+            {"timestamp": {"$gt": "2018-12-31T23:59:50.000000Z"}},
+        )
+
+    def test_changed_entities_are_invalidated(self):
+        self.collection.find.return_value = [
+            {
+                "_id": 2,
+                "entity": "Journal",
+                "id": "j1",
+                "timestamp": "2019-01-01T00:00:01.000000Z",
+            }
+        ]
+        self.cache.poll()
+        self.assertIsNone(self.cache.get("Journal", "j1"))
+        self.assertEqual(self.cache.get("DocumentsBundle", "b1"), "entry")
+
+    def test_changes_are_processed_once(self):
+        change = {
+            "_id": 2,
+            "entity": "Journal",
+            "id": "j1",
+            "timestamp": "2019-01-01T00:00:01.000000Z",
+        }
+        self.collection.find.return_value = [change]
+        self.cache.poll()
+        self.cache.set("Journal", "j1", "fresh", self.cache.generation())
+        self.cache.poll()
+        self.assertEqual(self.cache.get("Journal", "j1"), "fresh")
+
+    def test_nothing_is_cached_before_the_first_poll(self):
+        cache = adapters.ManifestCache(changes=lambda: self.changes)
+        cache.set("Journal", "j1", "entry", cache.generation())
+        self.assertIsNone(cache.get("Journal", "j1"))
+        cache.poll()
+        self.assertIsNone(cache.get("Journal", "j1"))
+
+    def test_follower_is_started_once(self):
+        self.cache.get("Journal", "j1")
+        adapters.threading.Thread.return_value.start.assert_called_once_with()
+
+
+class SharedManifestCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.mongo = Mock()
+        self.collection = self.mongo.journals.with_options.return_value
+        self.collection.find_one.side_effect = lambda query: {
+            "_id": "j1",
+            "id": "j1",
+            "created": "2018-08-05T23:03:44.971230Z",
+            "updated": "2018-08-05T23:03:44.971230Z",
+            "items": [],
+            "metadata": {},
+            "_rev": 1,
+        }
+        self.collection.update_one.return_value = Mock(matched_count=1)
+        self.cache = adapters.ManifestCache()
+        self.Session = adapters.Session.partial(self.mongo, manifest_cache=self.cache)
+
+    def test_journals_are_read_from_the_primary(self):
+        self.Session().journals.fetch("j1")
+        self.mongo.journals.with_options.assert_called_once_with(
+            read_preference=adapters.pymongo.ReadPreference.PRIMARY
+        )
+
+    def test_sessions_share_the_cache(self):
+        self.Session().journals.fetch("j1")
+        first = self.Session().journals.fetch("j1")
+        second = self.Session().journals.fetch("j1")
+        self.collection.find_one.assert_called_once()
+        self.assertIs(first.data(), second.data())
+
+    def test_writes_update_the_cache(self):
+        journal = self.Session().journals.fetch("j1")
+        journal.add_issue({"id": "issue-1"})
+        self.Session().journals.update(journal)
+        fetched = self.Session().journals.fetch("j1")
+        self.assertEqual(fetched.issues, [{"id": "issue-1"}])
+        fetched.add_issue({"id": "issue-2"})
+        self.Session().journals.update(fetched)
+        self.assertEqual(
+            self.collection.update_one.call_args[0][0], {"_id": "j1", "_rev": 2}
+        )
+        self.collection.find_one.assert_called_once()
+
+    def test_conflicts_invalidate_the_cache(self):
+        journal = self.Session().journals.fetch("j1")
+        journal.add_issue({"id": "issue-1"})
+        self.collection.update_one.return_value = Mock(matched_count=0)
+        self.collection.count_documents.return_value = 1
+        self.assertRaises(
+            exceptions.UpdateConflict, self.Session().journals.update, journal
+        )
+        self.Session().journals.fetch("j1")
+        self.assertEqual(self.collection.find_one.call_count, 2)
+
+    def test_documents_are_not_cached(self):
+        self.Session().documents
+        self.mongo.documents.with_options.assert_not_called()
+
+
 class ChangesStoreTestMixin:
     def test_add_returns_none(self):
         store = self.Store()
@@ -385,6 +940,457 @@ class ChangesStoreTest(ChangesStoreTestMixin, unittest.TestCase):
         return adapters.ChangesStore(apptesting.MongoDBCollectionStub())
 
 
+class ChangesStoreBlobsTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.blobs = Mock()
+        self.store = adapters.ChangesStore(self.collection, blobs=self.blobs)
+
+    def make_change(self, timestamp="2018-08-05T23:03:44.971230Z"):
+        return {
+            "timestamp": timestamp,
+            "entity": "Journal",
+            "id": "journal-1",
+            "content_gz": b"gzipped",
+            "content_type": "application/json",
+            "content_hash": "abc123",
+        }
+
+    def test_content_is_stored_in_blobs(self):
+        self.store.add(self.make_change())
+        operations = self.blobs.bulk_write.call_args[0][0]
+        self.assertEqual(
+            [(op._filter, op._doc) for op in operations],
+            [
+                (
+                    {"_id": "abc123"},
+                    {
+                        "$setOnInsert": {
+                            "content_gz": b"gzipped",
+                            "content_type": "application/json",
+                        },
+                        "$max": {"used": "2018-08-05T23:03:44.971230Z"},
+                    },
+                )
+            ],
+        )
+        self.assertNotIn("content_gz", self.collection.insert_one.call_args[0][0])
+
+    def test_identical_contents_are_stored_once(self):
+        self.store.add_many(
+            [self.make_change(), self.make_change("2018-08-05T23:03:44.971231Z")]
+        )
+        self.assertEqual(len(self.blobs.bulk_write.call_args[0][0]), 1)
+        self.assertEqual(len(self.collection.insert_many.call_args[0][0]), 2)
+
+    def test_changes_without_hash_are_stored_as_is(self):
+        change = {"timestamp": "2018-08-05T23:03:44.971230Z", "deleted": True}
+        self.store.add(change)
+        self.blobs.bulk_write.assert_not_called()
+        self.collection.insert_one.assert_called_once_with(change)
+
+    def test_fetch_resolves_the_content(self):
+        change = self.make_change()
+        del change["content_gz"]
+        self.collection.find_one.return_value = change
+        self.blobs.find_one.return_value = {"_id": "abc123", "content_gz": b"gzipped"}
+        fetched = self.store.fetch("5c6d8a5a0e4b9a0001c1f4a1")
+        self.assertEqual(fetched["content_gz"], b"gzipped")
+        self.blobs.find_one.assert_called_once_with({"_id": "abc123"})
+
+    def test_prune_blobs_deletes_unreferenced_contents(self):
+        self.blobs.find.return_value = [{"_id": "abc123"}, {"_id": "def456"}]
+        self.collection.find_one.side_effect = [None, {"_id": "change-1"}]
+        self.blobs.delete_many.return_value.deleted_count = 1
+        self.assertEqual(self.store.prune_blobs("2018-08-01T00:00:00.000000Z"), 1)
+        unused = {
+            "$or": [
+                {"used": {"$lt": "2018-08-01T00:00:00.000000Z"}},
+                {"used": {"$exists": False}},
+            ]
+        }
+        self.assertEqual(self.blobs.find.call_args[0][0], unused)
+        self.blobs.delete_many.assert_called_once_with(
+            {"_id": {"$in": ["abc123"]}, **unused}
+        )
+
+    def test_prune_blobs_requires_the_blobs_collection(self):
+        store = adapters.ChangesStore(self.collection)
+        self.assertRaises(ValueError, store.prune_blobs, "2018-08-01T00:00:00.000000Z")
+
+
+class ChangesStoreFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.store = adapters.ChangesStore(self.collection)
+
+    def test_since_id_resumes_after_the_change_with_same_timestamp(self):
+        since_id = "5c6d8a5a0e4b9a0001c1f4a1"
+        self.store.filter(since="2018-08-05T23:03:44.971230Z", since_id=since_id)
+        query = self.collection.find.call_args[0][0]
+        self.assertEqual(
+            query,
+            {
+                "$or": [
+                    {"timestamp": {"$gt": "2018-08-05T23:03:44.971230Z"}},
+                    {
+                        "timestamp": "2018-08-05T23:03:44.971230Z",
+                        "_id": {"$gt": adapters.ObjectId(since_id)},
+                    },
+                ]
+            },
+        )
+
+    def test_until_limits_the_timestamps(self):
+        self.store.filter(since="2018-08-05", until="2018-08-06")
+        self.assertEqual(
+            self.collection.find.call_args[0][0],
+            {"timestamp": {"$gt": "2018-08-05", "$lte": "2018-08-06"}},
+        )
+
+    def test_until_limits_the_timestamps_after_since_id(self):
+        since_id = "5c6d8a5a0e4b9a0001c1f4a1"
+        self.store.filter(since="2018-08-05", since_id=since_id, until="2018-08-06")
+        query = self.collection.find.call_args[0][0]
+        self.assertEqual(query["timestamp"], {"$lte": "2018-08-06"})
+        self.assertEqual(len(query["$or"]), 2)
+
+    def test_ranges_are_bounded_by_sampled_timestamps(self):
+        self.collection.estimated_document_count.return_value = 10
+        self.collection.find.return_value.skip.return_value.limit.side_effect = [
+            [{"timestamp": "t03"}],
+            [{"timestamp": "t07"}],
+        ]
+        self.assertEqual(
+            self.store.ranges(3), [("", "t03"), ("t03", "t07"), ("t07", "")]
+        )
+        self.collection.find.return_value.skip.assert_called_with(3)
+        self.assertEqual(
+            self.collection.find.call_args[0][0], {"timestamp": {"$gt": "t03"}}
+        )
+
+    def test_last_is_the_latest_change(self):
+        self.store.last()
+        self.assertEqual(
+            self.collection.find_one.call_args[1]["sort"], [("timestamp", -1)]
+        )
+
+    def test_ranges_require_at_least_one_part(self):
+        for parts in [0, -1]:
+            with self.subTest(parts=parts):
+                self.assertRaises(ValueError, self.store.ranges, parts)
+
+    def test_ranges_of_empty_collection(self):
+        self.collection.estimated_document_count.return_value = 0
+        self.assertEqual(self.store.ranges(3), [("", "")])
+
+    def test_ranges_stop_at_the_end_of_the_collection(self):
+        self.collection.estimated_document_count.return_value = 10
+        self.collection.find.return_value.skip.return_value.limit.side_effect = [
+            [{"timestamp": "t03"}],
+            [],
+        ]
+        self.assertEqual(self.store.ranges(3), [("", "t03"), ("t03", "")])
+
+    def test_entity_and_id_filters(self):
+        self.store.filter(entity="Journal", id="0034-8910")
+        query = self.collection.find.call_args[0][0]
+        self.assertEqual(query["entity"], "Journal")
+        self.assertEqual(query["id"], "0034-8910")
+
+    def test_id_prefix_is_an_anchored_and_escaped_regex(self):
+        self.store.filter(id_prefix="0034-8910.rsp")
+        self.assertEqual(
+            self.collection.find.call_args[0][0]["id"],
+            {"$regex": r"^0034\-8910\.rsp"},
+        )
+
+    def test_results_are_sorted_by_timestamp(self):
+        self.store.filter()
+        self.assertEqual(self.collection.find.call_args[1]["sort"], [("timestamp", 1)])
+
+
+class ChangesStoreLatestTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.collection.find_one.return_value = None
+        self.latest = Mock()
+        self.store = adapters.ChangesStore(self.collection, latest=self.latest)
+
+    def make_change(self, timestamp="2018-08-05T23:03:44.971230Z", **kwargs):
+        return {
+            "_id": adapters.ObjectId(),
+            "timestamp": timestamp,
+            "entity": "Journal",
+            "id": "journal-1",
+            **kwargs,
+        }
+
+    def latest_operations(self, call=-1):
+        return self.latest.bulk_write.call_args_list[call][0][0]
+
+    def test_add_updates_the_latest_change(self):
+        change = self.make_change(content_hash="abc123")
+        self.store.add(change)
+        [operation] = self.latest_operations()
+        self.assertEqual(
+            operation._filter,
+            {
+                "entity": "Journal",
+                "id": "journal-1",
+                "timestamp": {"$lt": change["timestamp"]},
+            },
+        )
+        self.assertEqual(
+            operation._doc,
+            {
+                "$set": {
+                    "timestamp": change["timestamp"],
+                    "change_id": change["_id"],
+                    "retain_since": change["timestamp"],
+                    "content_hash": "abc123",
+                },
+                "$unset": {"deleted": ""},
+            },
+        )
+        self.assertTrue(operation._upsert)
+
+    def test_deltas_retain_their_chains(self):
+        self.store.add(
+            self.make_change(
+                delta_base=adapters.ObjectId(), delta_keyframe="2018-08-05T20:00:00Z"
+            )
+        )
+        [operation] = self.latest_operations()
+        self.assertEqual(
+            operation._doc["$set"]["retain_since"], "2018-08-05T20:00:00Z"
+        )
+
+    def test_add_many_updates_each_entity_once(self):
+        newest = self.make_change("2018-08-05T23:03:44.971231Z")
+        self.store.add_many([self.make_change(), newest])
+        [operation] = self.latest_operations()
+        self.assertEqual(operation._doc["$set"]["change_id"], newest["_id"])
+
+    def test_duplicate_keys_are_retried_once(self):
+        error = adapters.pymongo.errors.BulkWriteError(
+            {"writeErrors": [{"index": 0, "code": 11000}]}
+        )
+        self.latest.bulk_write.side_effect = [error, error]
+        self.store.add(self.make_change())
+        self.assertEqual(self.latest.bulk_write.call_count, 2)
+
+    def test_partially_written_batches_update_the_latest_changes(self):
+        written = self.make_change()
+        rejected = self.make_change(id="journal-2")
+        error = adapters.pymongo.errors.BulkWriteError(
+            {"nInserted": 1, "writeErrors": [{"index": 1, "code": 11000}]}
+        )
+        self.collection.insert_many.side_effect = error
+        with self.assertRaises(adapters.exceptions.AlreadyExists):
+            self.store.add_many([written, rejected])
+        [operation] = self.latest_operations()
+        self.assertEqual(operation._doc["$set"]["change_id"], written["_id"])
+
+    def test_rewritten_changes_update_the_latest_changes(self):
+        change = self.make_change()
+        error = adapters.pymongo.errors.DuplicateKeyError("")
+        self.collection.insert_one.side_effect = error
+        self.collection.find_one.return_value = dict(change)
+        with self.assertRaises(adapters.exceptions.AlreadyExists):
+            self.store.add(change)
+        [operation] = self.latest_operations()
+        self.assertEqual(operation._doc["$set"]["change_id"], change["_id"])
+
+    def test_conflicting_changes_do_not_update_the_latest_changes(self):
+        change = self.make_change()
+        error = adapters.pymongo.errors.DuplicateKeyError("")
+        self.collection.insert_one.side_effect = error
+        self.collection.find_one.return_value = {
+            **change,
+            "timestamp": "2018-08-05T23:03:44.971231Z",
+        }
+        with self.assertRaises(adapters.exceptions.AlreadyExists):
+            self.store.add(change)
+        self.latest.bulk_write.assert_not_called()
+
+    def test_failures_do_not_fail_the_change(self):
+        self.latest.bulk_write.side_effect = adapters.pymongo.errors.AutoReconnect()
+        with self.assertLogs("documentstore.adapters", level="ERROR"):
+            self.store.add(self.make_change())
+        self.collection.insert_one.assert_called_once()
+
+    def test_compacted_filter_reads_the_latest_changes(self):
+        change_id = adapters.ObjectId()
+        self.latest.find.return_value.limit.return_value = [
+            {
+                "entity": "Journal",
+                "id": "journal-1",
+                "timestamp": "2018-08-05T23:03:44.971230Z",
+                "change_id": change_id,
+            }
+        ]
+        self.assertEqual(
+            list(self.store.filter(compacted=True)),
+            [
+                {
+                    "_id": change_id,
+                    "entity": "Journal",
+                    "id": "journal-1",
+                    "timestamp": "2018-08-05T23:03:44.971230Z",
+                }
+            ],
+        )
+        self.assertEqual(
+            self.latest.find.call_args[1]["sort"], [("timestamp", 1), ("change_id", 1)]
+        )
+        self.collection.find.assert_not_called()
+
+    def test_compacted_filter_requires_the_latest_collection(self):
+        store = adapters.ChangesStore(self.collection)
+        self.assertRaises(ValueError, store.filter, compacted=True)
+
+    def test_prune_keeps_the_chains_of_retained_changes(self):
+        self.collection.aggregate.return_value = [
+            {
+                "_id": {"entity": "Journal", "id": "journal-2"},
+                "keyframe": "2018-07-01T00:00:00.000000Z",
+            }
+        ]
+        self.latest.find.return_value = [
+            {
+                "entity": "Journal",
+                "id": "journal-1",
+                "retain_since": "2018-06-01T00:00:00.000000Z",
+            },
+            {
+                "entity": "Journal",
+                "id": "journal-2",
+                "retain_since": "2018-09-01T00:00:00.000000Z",
+            },
+            {
+                "entity": "Journal",
+                "id": "journal-3",
+                "retain_since": "2018-09-01T00:00:00.000000Z",
+            },
+        ]
+        self.collection.bulk_write.return_value.deleted_count = 5
+        self.assertEqual(self.store.prune("2018-08-01T00:00:00.000000Z"), 5)
+        operations = self.collection.bulk_write.call_args[0][0]
+        self.assertEqual(
+            [operation._filter["timestamp"] for operation in operations],
+            [
+                {"$lt": "2018-06-01T00:00:00.000000Z"},
+                {"$lt": "2018-07-01T00:00:00.000000Z"},
+                {"$lt": "2018-08-01T00:00:00.000000Z"},
+            ],
+        )
+
+    def test_prune_keeps_the_chains_of_retained_deltas(self):
+        self.collection.aggregate.return_value = []
+        self.latest.find.return_value = [
+            {
+                "entity": "Journal",
+                "id": "journal-1",
+                "retain_since": "2018-06-01T00:00:00.000000Z",
+            }
+        ]
+        self.collection.find_one.side_effect = [
+            {"delta_keyframe": "2018-05-01T00:00:00.000000Z"},
+            {"delta_keyframe": "2018-04-01T00:00:00.000000Z"},
+            None,
+        ]
+        self.collection.bulk_write.return_value.deleted_count = 3
+        self.assertEqual(self.store.prune("2018-08-01T00:00:00.000000Z"), 3)
+        [operation] = self.collection.bulk_write.call_args[0][0]
+        self.assertEqual(
+            operation._filter["timestamp"], {"$lt": "2018-04-01T00:00:00.000000Z"}
+        )
+        query = self.collection.find_one.call_args_list[1][0][0]
+        self.assertEqual(query["timestamp"], {"$gte": "2018-05-01T00:00:00.000000Z"})
+        self.assertEqual(
+            query["$or"][0], {"delta_keyframe": {"$lt": "2018-05-01T00:00:00.000000Z"}}
+        )
+
+    def test_prune_keeps_changes_of_deltas_without_keyframe(self):
+        self.collection.aggregate.return_value = [
+            {"_id": {"entity": "Journal", "id": "journal-1"}, "keyframe": ""}
+        ]
+        self.latest.find.return_value = [
+            {
+                "entity": "Journal",
+                "id": "journal-1",
+                "retain_since": "2018-09-01T00:00:00.000000Z",
+            }
+        ]
+        self.assertEqual(self.store.prune("2018-08-01T00:00:00.000000Z"), 0)
+        self.collection.bulk_write.assert_not_called()
+        match, group = self.collection.aggregate.call_args[0][0]
+        self.assertEqual(match["$match"]["delta_base"], {"$exists": True})
+        self.assertEqual(
+            group["$group"]["keyframe"],
+            {"$min": {"$ifNull": ["$delta_keyframe", ""]}},
+        )
+
+    def test_rebuild_latest(self):
+        self.collection.find.return_value = [
+            self.make_change(),
+            self.make_change("2018-08-05T23:03:44.971231Z", id="journal-2"),
+        ]
+        self.assertEqual(self.store.rebuild_latest(), 2)
+        self.assertEqual(len(self.latest_operations()), 2)
+
+
+class StoreScanTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.identity_map = {}
+        self.store = adapters.JournalStore(self.collection, self.identity_map)
+
+    def test_scan_produces_entities_in_id_order(self):
+        self.collection.find.return_value = [
+            {"_id": "journal-1", "id": "journal-1", "_rev": 3},
+            {"_id": "journal-2", "id": "journal-2"},
+        ]
+        journals = list(self.store.scan())
+        self.assertEqual([j.id() for j in journals], ["journal-1", "journal-2"])
+        self.assertEqual(self.collection.find.call_args[1]["sort"], [("_id", 1)])
+
+    def test_scanned_entities_are_not_kept_in_the_identity_map(self):
+        self.collection.find.return_value = [{"_id": "journal-1", "id": "journal-1"}]
+        list(self.store.scan())
+        self.assertEqual(self.identity_map, {})
+
+
+class RenderedDocumentStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.collection = Mock()
+        self.store = adapters.RenderedDocumentStore(self.collection)
+
+    def test_add_is_an_idempotent_upsert(self):
+        self.store.add("ab12", b"<article/>")
+        self.collection.update_one.assert_called_once_with(
+            {"_id": "ab12"}, {"$setOnInsert": {"data": b"<article/>"}}, upsert=True
+        )
+
+    def test_fetch_returns_bytes(self):
+        self.collection.find_one.return_value = {"_id": "ab12", "data": b"<article/>"}
+        self.assertEqual(self.store.fetch("ab12"), b"<article/>")
+
+    def test_fetch_raises_exception_if_does_not_exist(self):
+        self.collection.find_one.return_value = None
+        self.assertRaises(exceptions.DoesNotExist, self.store.fetch, "ab12")
+
+    def test_session_without_materialization_has_no_store(self):
+        self.assertIsNone(adapters.Session(MongoClientStub()).rendered_documents)
+
+    def test_session_with_materialization(self):
+        session = adapters.Session(MongoClientStub(), materialize_documents=True)
+        self.assertIsInstance(
+            session.rendered_documents, interfaces.RenderedDocumentsDataStore
+        )
+
+
 class MongoDBTests(unittest.TestCase):
     def test_mongoclient_isnt_instantiated_during_init(self):
         """É importante que a instância de `pymongo.MongoClient` não seja
@@ -411,10 +1417,34 @@ class MongoDBTests(unittest.TestCase):
         mock_mongodb_collection.create_index = Mock()
         with patch(
             "documentstore.adapters.MongoDB.changes", new_callable=PropertyMock
-        ) as mock_changes:
+        ) as mock_changes, patch(
+            "documentstore.adapters.MongoDB.changes_latest", new_callable=PropertyMock
+        ):
             mock_changes.return_value = mock_mongodb_collection
             mongodb = adapters.MongoDB("mongodb://test_db:27017", dbname="store")
             mongodb.create_indexes()
             mock_mongodb_collection.create_index.assert_called_with(
                 [("timestamp", pymongo.ASCENDING)], unique=True, background=True
             )
+
+    def test_create_indexes_for_filtered_changes(self):
+        mock_mongodb_collection = Mock()
+        mock_latest_collection = Mock()
+        with patch(
+            "documentstore.adapters.MongoDB.changes", new_callable=PropertyMock
+        ) as mock_changes, patch(
+            "documentstore.adapters.MongoDB.changes_latest", new_callable=PropertyMock
+        ) as mock_latest:
+            mock_changes.return_value = mock_mongodb_collection
+            mock_latest.return_value = mock_latest_collection
+            mongodb = adapters.MongoDB("mongodb://test_db:27017", dbname="store")
+            mongodb.create_indexes()
+        indexes = [
+            [field for field, _ in c[0][0]]
+            for c in mock_mongodb_collection.create_index.call_args_list
+        ]
+        self.assertIn(["entity", "timestamp", "_id"], indexes)
+        self.assertIn(["id", "timestamp", "_id"], indexes)
+        mock_latest_collection.create_index.assert_any_call(
+            [("entity", 1), ("id", 1)], unique=True, background=True
+        )
@@ -235,8 +235,65 @@ class TestAddVersion(unittest.TestCase):
 
         self.assertEqual(new_version["_revision"], "a1eda318424")
 
+    def test_previous_versions_are_shared(self):
+        doc = add_version(
+            {"id": "0034-8910-rsp-48-2-0275", "versions": []},
+            "/rawfiles/7ca9f9b2687cb/0034-8910-rsp-48-2-0275.xml",
+            ["0034-8910-rsp-48-2-0275-gf01.gif"],
+        )
+        new_doc = add_version(
+            doc,
+            "/rawfiles/2d3ad9c6bc656/0034-8910-rsp-48-2-0275.xml",
+            ["0034-8910-rsp-48-2-0275-gf01.gif"],
+        )
+
+        self.assertIs(new_doc["versions"][0], doc["versions"][0])
+        self.assertEqual(len(doc["versions"]), 1)
+
+    def test_add_asset_version_copies_only_the_latest_version(self):
+        doc = {
+            "id": "0034-8910-rsp-48-2-0275",
+            "versions": [
+                {
+                    "data": "/rawfiles/7ca9f9b2687cb/0034-8910-rsp-48-2-0275.xml",
+                    "assets": {"0034-8910-rsp-48-2-0275-gf01.gif": []},
+                },
+                {
+                    "data": "/rawfiles/2d3ad9c6bc656/0034-8910-rsp-48-2-0275.xml",
+                    "assets": {"0034-8910-rsp-48-2-0275-gf01.gif": []},
+                },
+            ],
+        }
+        new_doc = add_asset_version(
+            doc,
+            "0034-8910-rsp-48-2-0275-gf01.gif",
+            "/rawfiles/7a664999a8fb3/0034-8910-rsp-48-2-0275-gf01.gif",
+        )
+
+        self.assertIs(new_doc["versions"][0], doc["versions"][0])
+        self.assertEqual(
+            doc["versions"][1]["assets"], {"0034-8910-rsp-48-2-0275-gf01.gif": []}
+        )
+
 
 class AddRenditionVersionTests(unittest.TestCase):
+    def test_previous_manifest_is_not_modified(self):
+        doc = {
+            "id": "0034-8910-rsp-48-2-0275",
+            "versions": [{"renditions": []}, {"renditions": []}],
+        }
+        new_doc = add_rendition_version(
+            doc,
+            "0034-8910-rsp-48-2-0275.pdf",
+            "/rawfiles/7ca9f9b2687cb/0034-8910-rsp-48-2-0275.pdf",
+            "application/pdf",
+            "pt-br",
+            243000,
+        )
+
+        self.assertEqual(doc["versions"][1], {"renditions": []})
+        self.assertIs(new_doc["versions"][0], doc["versions"][0])
+
     def test_first_version(self):
         doc = {"id": "0034-8910-rsp-48-2-0275", "versions": [{"renditions": []}]}
         expected = {
@@ -1,11 +1,16 @@
+import os
 import unittest
 from unittest import mock
 import functools
 from copy import deepcopy
 import datetime
 
+from lxml import etree
+
 from documentstore import domain, exceptions
 
+_CWD = os.path.dirname(os.path.abspath(__file__))
+
 SAMPLE_MANIFEST = {
     "id": "0034-8910-rsp-48-2-0275",
     "versions": [
@@ -184,6 +189,31 @@ class DocumentTests(unittest.TestCase):
         document = domain.Document(manifest=existing_manifest)
         self.assertEqual(document.id(), "")
 
+    def test_manifest_view_is_read_only(self):
+        document = self.make_one()
+        view = document.manifest_view
+        with self.assertRaises(TypeError):
+            view["id"] = "foo"
+
+    def test_manifest_view_doesnt_copy_data(self):
+        document = self.make_one()
+        self.assertIs(
+            document.manifest_view["versions"], document.manifest_view["versions"]
+        )
+
+    def test_manifest_returns_an_independent_copy(self):
+        document = self.make_one()
+        manifest = document.manifest
+        manifest["versions"].pop()
+        self.assertEqual(len(document.manifest_view["versions"]), 2)
+
+    def test_version_doesnt_change_the_manifest(self):
+        document = self.make_one()
+        expected = document.manifest
+        document.version()
+        document.version_at("2018-12-31")
+        self.assertEqual(document.manifest, expected)
+
     def test_id(self):
         document = domain.Document(id="0034-8910-rsp-48-2-0275")
         self.assertEqual(document.id(), "0034-8910-rsp-48-2-0275")
@@ -513,6 +543,27 @@ class BundleManifestTest(UnittestMixin, unittest.TestCase):
         documents_bundle = domain.BundleManifest.new("0034-8910-rsp-48-2")
         self.assertEqual(documents_bundle["created"], documents_bundle["updated"])
 
+    def test_set_metadata_shares_unchanged_data(self):
+        documents_bundle = new_bundle("0034-8910-rsp-48-2")
+        documents_bundle = domain.BundleManifest.add_item(
+            documents_bundle, {"id": "/documents/0034-8910-rsp-48-2-0275"}
+        )
+        _documents_bundle = domain.BundleManifest.set_metadata(
+            documents_bundle, "volume", "1"
+        )
+        self.assertIs(_documents_bundle["items"], documents_bundle["items"])
+        self.assertEqual(documents_bundle["metadata"], {})
+
+    def test_remove_item_doesnt_modify_the_original_bundle(self):
+        documents_bundle = new_bundle("0034-8910-rsp-48-2")
+        documents_bundle = domain.BundleManifest.add_item(
+            documents_bundle, {"id": "/documents/0034-8910-rsp-48-2-0275"}
+        )
+        domain.BundleManifest.remove_item(
+            documents_bundle, "/documents/0034-8910-rsp-48-2-0275"
+        )
+        self.assertEqual(len(documents_bundle["items"]), 1)
+
     def test_set_metadata(self):
         documents_bundle = new_bundle("0034-8910-rsp-48-2")
         documents_bundle = domain.BundleManifest.set_metadata(
@@ -888,6 +939,27 @@ class DocumentsBundleTest(UnittestMixin, unittest.TestCase):
         documents_bundle = domain.DocumentsBundle(id="0034-8910-rsp-48-2")
         self.assertEqual(documents_bundle.id(), "0034-8910-rsp-48-2")
 
+    def test_manifest_view_is_read_only(self):
+        documents_bundle = domain.DocumentsBundle(id="0034-8910-rsp-48-2")
+        with self.assertRaises(TypeError):
+            documents_bundle.manifest_view["id"] = "foo"
+
+    def test_getters_return_copies(self):
+        documents_bundle = domain.DocumentsBundle(id="0034-8910-rsp-48-2")
+        documents_bundle.titles = [{"language": "en", "title": "Title"}]
+        documents_bundle.add_document({"id": "doc-1"})
+        expected = documents_bundle.manifest
+        documents_bundle.titles[0]["title"] = "Changed"
+        documents_bundle.documents[0]["id"] = "doc-2"
+        self.assertEqual(documents_bundle.manifest, expected)
+
+    def test_data_doesnt_change_the_manifest(self):
+        documents_bundle = domain.DocumentsBundle(id="0034-8910-rsp-48-2")
+        documents_bundle.volume = "1"
+        expected = documents_bundle.manifest
+        documents_bundle.data()
+        self.assertEqual(documents_bundle.manifest, expected)
+
     def test_publication_year_is_empty_str(self):
         documents_bundle = domain.DocumentsBundle(id="0034-8910-rsp-48-2")
         self.assertEqual(documents_bundle.publication_year, "")
@@ -1198,6 +1270,28 @@ class JournalTest(UnittestMixin, unittest.TestCase):
         journal = domain.Journal(id="0034-8910-rsp-48-2")
         self.assertEqual(journal.id(), "0034-8910-rsp-48-2")
 
+    def test_manifest_view_is_read_only(self):
+        journal = domain.Journal(id="0034-8910-rsp-48-2")
+        with self.assertRaises(TypeError):
+            journal.manifest_view["id"] = "foo"
+
+    def test_getters_return_copies(self):
+        journal = domain.Journal(id="0034-8910-rsp-48-2")
+        journal.mission = [{"language": "pt", "value": "Missão"}]
+        journal.status = {"status": "current"}
+        expected = journal.manifest
+        journal.mission[0]["value"] = "Changed"
+        journal.status["status"] = "deceased"
+        journal.status_history[0][1]["status"] = "deceased"
+        self.assertEqual(journal.manifest, expected)
+
+    def test_data_doesnt_change_the_manifest(self):
+        journal = domain.Journal(id="0034-8910-rsp-48-2")
+        journal.title = "Ciência Rural"
+        expected = journal.manifest
+        journal.data()
+        self.assertEqual(journal.manifest, expected)
+
     def test_set_mission(self):
         documents_bundle = domain.Journal(id="0034-8910-rsp-48-2")
 
@@ -2045,3 +2139,243 @@ class RetryGracefullyDecoratorTests(unittest.TestCase):
 
         calls = [mock.call(1.2 ** i) for i in range(1, 3)]
         retry_gracefully._sleep.assert_has_calls(calls)
+
+    def test_sleep_is_multiplied_by_backoff_base(self):
+        retry_gracefully = domain.retry_gracefully(
+            max_retries=2, backoff_factor=2, backoff_base=0.05
+        )
+        retry_gracefully._sleep = mock.MagicMock(return_value=None)
+
+        failing_obj = mock.Mock(
+            side_effect=[exceptions.RetryableError(), exceptions.RetryableError(), True]
+        )
+        failing_obj.__qualname__ = "failing_function"
+        decorated_obj = retry_gracefully(failing_obj)
+        self.assertEqual(decorated_obj(), True)
+
+        retry_gracefully._sleep.assert_has_calls([mock.call(0.1), mock.call(0.2)])
+
+
+class DocumentDataKeyTests(unittest.TestCase):
+    def make_one(self):
+        return domain.Document(manifest=deepcopy(SAMPLE_MANIFEST))
+
+    def test_key_is_a_sha256_hexdigest(self):
+        self.assertRegex(self.make_one().data_key(), r"^[0-9a-f]{64}$")
+
+    def test_key_depends_on_the_resolved_assets(self):
+        document = self.make_one()
+        self.assertNotEqual(
+            document.data_key(version_at="2018-08-05T23:04:00Z"),
+            document.data_key(version_at="2018-08-05T23:10:00Z"),
+        )
+
+    def test_versions_with_same_render_inputs_share_the_key(self):
+        document = self.make_one()
+        self.assertEqual(
+            document.data_key(version_at="2018-12-31"), document.data_key()
+        )
+
+    def test_deleted_version_raises_exception(self):
+        document = self.make_one()
+        document.new_deleted_version()
+        self.assertRaises(exceptions.DeletedVersion, document.data_key)
+
+
+class DataMemoTests(unittest.TestCase):
+    def make_one(self, **kwargs):
+        bundle = domain.DocumentsBundle(id="0034-8910-rsp-48-2", **kwargs)
+        bundle.volume = "1"
+        return bundle
+
+    def test_data_is_computed_once_per_manifest(self):
+        bundle = self.make_one()
+        self.assertIs(bundle.data(), bundle.data())
+
+    def test_data_is_recomputed_after_changes(self):
+        bundle = self.make_one()
+        before = bundle.data()
+        bundle.volume = "2"
+        self.assertEqual(before["metadata"]["volume"], "1")
+        self.assertEqual(bundle.data()["metadata"]["volume"], "2")
+
+    def test_data_bytes_is_computed_once_per_manifest(self):
+        bundle = self.make_one()
+        self.assertIs(bundle.data_bytes(), bundle.data_bytes())
+
+    @mock.patch(
+        "documentstore.domain.fetch_data",
+        return_value=b'<article xmlns:xlink="http://www.w3.org/1999/xlink"/>',
+    )
+    def test_latest_document_data_is_rendered_once_per_manifest(self, _):
+        document = domain.Document(manifest=deepcopy(SAMPLE_MANIFEST))
+        self.assertIs(document.data(), document.data_bytes())
+        self.assertIsNot(
+            document.data(version_at="2018-08-05T23:04:00Z"),
+            document.data(version_at="2018-08-05T23:04:00Z"),
+        )
+
+    def test_memo_can_be_shared_by_instances_with_the_same_manifest(self):
+        memo = domain.DataMemo()
+        manifest = domain.BundleManifest.new("1678-4596-cr")
+        first = domain.Journal(manifest=manifest, data_memo=memo)
+        second = domain.Journal(manifest=manifest, data_memo=memo)
+        self.assertIs(first.data(), second.data())
+
+
+class DocumentTimelineTests(unittest.TestCase):
+    def make_one(self):
+        return domain.DocumentTimeline(deepcopy(SAMPLE_MANIFEST["versions"]))
+
+    def test_version_at_timestamp(self):
+        timeline = self.make_one()
+        self.assertEqual(timeline.version("2018-08-05T23:02:29.392990Z"), 0)
+        self.assertEqual(timeline.version("2018-12-31"), 1)
+
+    def test_version_prior_to_first_version(self):
+        timeline = self.make_one()
+        self.assertEqual(timeline.version("2018-08-04"), -1)
+
+    def test_first_of_versions_with_same_timestamp_is_selected(self):
+        timeline = domain.DocumentTimeline(
+            [
+                {"timestamp": "2018-08-05T23:02:29.392990Z"},
+                {"timestamp": "2018-08-05T23:02:29.392990Z"},
+                {"timestamp": "2018-08-05T23:30:29.392990Z"},
+            ]
+        )
+        self.assertEqual(timeline.version("2018-08-05T23:10:00.000000Z"), 0)
+
+    def test_versions_after_a_newer_timestamp_are_ignored(self):
+        timeline = domain.DocumentTimeline(
+            [
+                {"timestamp": "2018-08-05T23:02:29.392990Z"},
+                {"timestamp": "2018-08-05T23:30:29.392990Z"},
+                {"timestamp": "2018-08-05T23:10:29.392990Z"},
+            ]
+        )
+        self.assertEqual(timeline.version("2018-08-05T23:20:00.000000Z"), 0)
+
+    def test_asset_at_timestamp(self):
+        timeline = self.make_one()
+        asset_id = "0034-8910-rsp-48-2-0275-gf01.gif"
+        self.assertEqual(timeline.asset(0, asset_id, "2018-08-05T23:03:45Z"), 0)
+        self.assertEqual(timeline.asset(0, asset_id, "2018-08-05T23:02:30Z"), -1)
+
+    def test_timeline_is_rebuilt_when_manifest_changes(self):
+        document = domain.Document(manifest=deepcopy(SAMPLE_MANIFEST))
+        timeline = document.timeline()
+        self.assertIs(document.timeline(), timeline)
+
+        document.new_deleted_version()
+        self.assertIsNot(document.timeline(), timeline)
+
+
+class AssetsFromRemoteXMLTests(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(_CWD, "0034-8910-rsp-48-2-0347.xml"), "rb") as f:
+            self.xml_data = f.read()
+        fetch_data_patcher = mock.patch.object(
+            domain, "fetch_data", return_value=self.xml_data
+        )
+        self.mocked_fetch_data = fetch_data_patcher.start()
+        self.addCleanup(fetch_data_patcher.stop)
+
+    def test_cached_urls_are_not_fetched_again(self):
+        cache = domain.XMLCache()
+        domain.assets_from_remote_xml("/rawfiles/ab12/0347.xml", cache=cache)
+        domain.assets_from_remote_xml("/rawfiles/ab12/0347.xml", cache=cache)
+        self.mocked_fetch_data.assert_called_once_with("/rawfiles/ab12/0347.xml", None)
+
+    def test_cached_result_is_equal_to_the_fetched_one(self):
+        cache = domain.XMLCache()
+        xml, assets = domain.assets_from_remote_xml(
+            "/rawfiles/ab12/0347.xml", cache=cache
+        )
+        cached_xml, cached_assets = domain.assets_from_remote_xml(
+            "/rawfiles/ab12/0347.xml", cache=cache
+        )
+        self.assertEqual(etree.tostring(xml), etree.tostring(cached_xml))
+        self.assertEqual(
+            [(href, cached_xml.getpath(node)) for href, node in cached_assets],
+            [(href, xml.getpath(node)) for href, node in assets],
+        )
+
+    def test_cached_nodes_belong_to_a_new_tree(self):
+        cache = domain.XMLCache()
+        xml, _ = domain.assets_from_remote_xml("/rawfiles/ab12/0347.xml", cache=cache)
+        cached_xml, cached_assets = domain.assets_from_remote_xml(
+            "/rawfiles/ab12/0347.xml", cache=cache
+        )
+        self.assertIsNot(cached_xml, xml)
+        for _, node in cached_assets:
+            self.assertIs(node.getroottree().getroot(), cached_xml.getroot())
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = domain.XMLCache(max_bytes=len(self.xml_data) * 2)
+        cache.set("/rawfiles/1.xml", self.xml_data, [])
+        cache.set("/rawfiles/2.xml", self.xml_data, [])
+        cache.get("/rawfiles/1.xml")
+        cache.set("/rawfiles/3.xml", self.xml_data, [])
+        self.assertIsNotNone(cache.get("/rawfiles/1.xml"))
+        self.assertIsNone(cache.get("/rawfiles/2.xml"))
+        self.assertIsNotNone(cache.get("/rawfiles/3.xml"))
+
+    def test_entries_larger_than_max_bytes_are_not_cached(self):
+        cache = domain.XMLCache(max_bytes=10)
+        cache.set("/rawfiles/1.xml", self.xml_data, [])
+        self.assertIsNone(cache.get("/rawfiles/1.xml"))
+
+
+class ObjectStoreClientTests(unittest.TestCase):
+    def test_session_is_reused_between_requests(self):
+        client = domain.ObjectStoreClient()
+        self.assertIs(client._session, client._session)
+
+    def test_pool_sizes_are_applied_to_the_adapters(self):
+        client = domain.ObjectStoreClient(pool_connections=3, pool_maxsize=7)
+        adapter = client._session.get_adapter("https://objectstore/")
+        self.assertEqual(adapter._pool_connections, 3)
+        self.assertEqual(adapter._pool_maxsize, 7)
+
+    def test_default_timeout_is_used_when_omitted(self):
+        client = domain.ObjectStoreClient(timeout=5)
+        with mock.patch.object(client._session, "get") as mocked_get:
+            client.get("https://objectstore/0347.xml")
+        mocked_get.assert_called_once_with("https://objectstore/0347.xml", timeout=5.0)
+
+    def test_connection_close_header_when_keepalive_is_disabled(self):
+        client = domain.ObjectStoreClient(keepalive=False)
+        self.assertEqual(client._session.headers["Connection"], "close")
+
+    def test_close_discards_the_session(self):
+        client = domain.ObjectStoreClient()
+        session = client._session
+        client.close()
+        self.assertIsNot(client._session, session)
+
+    def test_fetch_data_uses_the_shared_client(self):
+        client = mock.Mock()
+        client.get.return_value.content = b"<article/>"
+        previous = domain.OBJECTSTORE_CLIENT
+        domain.OBJECTSTORE_CLIENT = client
+        try:
+            self.assertEqual(
+                domain.fetch_data("https://objectstore/0347.xml"), b"<article/>"
+            )
+        finally:
+            domain.OBJECTSTORE_CLIENT = previous
+        client.get.assert_called_once_with("https://objectstore/0347.xml", timeout=None)
+
+
+class ShiftTimestampTests(unittest.TestCase):
+    def test_shift_timestamp(self):
+        self.assertEqual(
+            domain.shift_timestamp(
+                "2018-08-05T23:03:44.971230Z", datetime.timedelta(days=-1)
+            ),
+            "2018-08-04T23:03:44.971230Z",
+        )
+
+    def test_empty_timestamp_is_kept(self):
+        self.assertEqual(domain.shift_timestamp("", datetime.timedelta(days=1)), "")
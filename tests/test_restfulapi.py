@@ -1,10 +1,15 @@
 import os
+import json
+import gzip
+import base64
 import unittest
 from copy import deepcopy
 from unittest.mock import patch, Mock
 
 import colander
 from pyramid import testing
+from webob.multidict import MultiDict
+from webob.acceptparse import create_accept_encoding_header
 from pyramid.httpexceptions import (
     HTTPOk,
     HTTPNotFound,
@@ -409,6 +414,11 @@ class FetchChangeUnitTest(unittest.TestCase):
         ]
         self.assertIn("/documents/0000-0000-23-24-2231", changes_ids)
 
+    def test_changes_expose_the_content_hash(self):
+        self.make_documents(1)
+        change = restfulapi.fetch_changes(self.request)["results"][0]
+        self.assertRegex(change["content_hash"], r"^[0-9a-f]{64}$")
+
     def test_since_filter_the_change_list(self):
         self.make_documents(10)
         since = restfulapi.fetch_changes(self.request)["results"][5]["timestamp"]
@@ -422,6 +432,132 @@ class FetchChangeUnitTest(unittest.TestCase):
 
         self.assertEqual(len(restfulapi.fetch_changes(self.request)["results"]), 0)
 
+    def test_next_cursor_continues_the_change_list(self):
+        self.make_documents(5)
+        changes = restfulapi.fetch_changes(self.request)["results"]
+        self.request.GET["limit"] = 2
+        first_page = restfulapi.fetch_changes(self.request)
+        self.request.GET["cursor"] = first_page["next"]
+        second_page = restfulapi.fetch_changes(self.request)
+        self.assertEqual(first_page["results"] + second_page["results"], changes[:4])
+
+    def test_until_limits_the_change_list(self):
+        self.make_documents(5)
+        changes = restfulapi.fetch_changes(self.request)["results"]
+        self.request.GET["since"] = changes[0]["timestamp"]
+        self.request.GET["until"] = changes[2]["timestamp"]
+        result = restfulapi.fetch_changes(self.request)
+        self.assertEqual(result["results"], changes[1:3])
+        self.assertEqual(result["until"], changes[2]["timestamp"])
+
+    def test_changes_filtered_by_id_prefix(self):
+        self.make_documents(3)
+        self.request.GET["entity"] = "Document"
+        self.request.GET["id_prefix"] = "0000-0000-23-24-2231"
+        result = restfulapi.fetch_changes(self.request)
+        self.assertEqual(
+            [c["id"] for c in result["results"]], ["/documents/0000-0000-23-24-2231"]
+        )
+        self.assertEqual(result["id_prefix"], "0000-0000-23-24-2231")
+
+    def test_compacted_changes(self):
+        self.config.add_route("journals", pattern="/journals/{journal_id}")
+        self.request.matchdict = {"journal_id": "1678-4596-cr-49-02"}
+        self.request.validated = apptesting.journal_registry_fixture()
+        restfulapi.put_journal(self.request)
+        self.make_documents(1)
+        self.request.matchdict = {"journal_id": "1678-4596-cr-49-02"}
+        self.request.validated = {"title": "Ciência Rural-2"}
+        restfulapi.patch_journal(self.request)
+        changes = restfulapi.fetch_changes(self.request)["results"]
+        self.request.GET["compacted"] = "true"
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(restfulapi.fetch_changes(self.request)["results"], changes[1:])
+
+    def test_changes_filtered_by_entity(self):
+        self.make_documents(2)
+        self.request.GET["entity"] = "Journal"
+        self.assertEqual(restfulapi.fetch_changes(self.request)["results"], [])
+
+    def test_unknown_entity_is_a_bad_request(self):
+        self.request.GET["entity"] = "Foo"
+        self.assertRaises(HTTPBadRequest, restfulapi.fetch_changes, self.request)
+
+    def test_next_is_absent_without_results(self):
+        self.assertNotIn("next", restfulapi.fetch_changes(self.request))
+
+    def test_invalid_cursor_is_a_bad_request(self):
+        self.request.GET["cursor"] = "xxx"
+        self.assertRaises(HTTPBadRequest, restfulapi.fetch_changes, self.request)
+
+    def test_cursor_with_invalid_id_is_a_bad_request(self):
+        self.request.GET["cursor"] = base64.urlsafe_b64encode(
+            b'["2018-08-05T23:08:50.331687Z", "invalid"]'
+        ).decode("ascii")
+        self.assertRaises(HTTPBadRequest, restfulapi.fetch_changes, self.request)
+
+    def test_wait_must_be_a_number(self):
+        self.request.GET["wait"] = "foo"
+        self.assertRaises(HTTPBadRequest, restfulapi.fetch_changes, self.request)
+
+    def test_wait_returns_empty_result_list_on_timeout(self):
+        self.request.GET["wait"] = "0.01"
+        self.assertEqual(restfulapi.fetch_changes(self.request)["results"], [])
+
+    def test_wait_is_limited_by_max_wait(self):
+        self.config.registry.settings["kernel.app.changes.max_wait"] = 0
+        self.request.GET["wait"] = "3600"
+        self.assertEqual(restfulapi.fetch_changes(self.request)["results"], [])
+
+    def test_changes_are_streamed_as_server_sent_events(self):
+        self.make_documents(2)
+        self.config.registry.settings.update(
+            {
+                "kernel.app.changes.stream_duration": 0.05,
+                "kernel.app.changes.heartbeat_interval": 0.01,
+            }
+        )
+        self.request.accept = "text/event-stream"
+        response = restfulapi.fetch_changes(self.request)
+        self.assertEqual(response.content_type, "text/event-stream")
+        events = response.body.decode("utf-8").split("\n\n")
+        changes = [e for e in events if "event: change" in e]
+        self.assertEqual(len(changes), 2)
+        self.assertIn(": heartbeat", events)
+        id_line, _, data_line = changes[-1].split("\n")
+        self.assertEqual(
+            json.loads(data_line[len("data: ") :])["id"],
+            "/documents/0000-0000-23-24-2231",
+        )
+
+        self.request.headers["Last-Event-ID"] = id_line[len("id: ") :]
+        response = restfulapi.fetch_changes(self.request)
+        self.assertNotIn("event: change", response.body.decode("utf-8"))
+
+    def test_streams_of_disabled_compacted_changes_are_bad_requests(self):
+        self.request.GET["compacted"] = "true"
+        for media_type in ("text/event-stream", "application/x-ndjson"):
+            with self.subTest(media_type=media_type), patch.object(
+                apptesting.InMemoryChangesDataStore,
+                "filter",
+                side_effect=ValueError("compacted changes are not enabled"),
+            ):
+                self.request.accept = media_type
+                self.assertRaises(
+                    HTTPBadRequest, restfulapi.fetch_changes, self.request
+                )
+
+    def test_changes_are_streamed_as_ndjson(self):
+        self.make_documents(3)
+        self.request.accept = "application/x-ndjson"
+        response = restfulapi.fetch_changes(self.request)
+        self.assertEqual(response.content_type, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.body.splitlines()]
+        self.assertEqual(len(lines), 3)
+        for line in lines:
+            self.assertTrue(line["id"].startswith("/documents/"))
+            self.assertIn("cursor", line)
+
     def test_fetch_with_since_and_limit(self):
         self.make_documents(20)
         changes = restfulapi.fetch_changes(self.request)["results"]
@@ -459,6 +595,51 @@ class FetchChangeDetailsUnitTest(unittest.TestCase):
             with self.subTest(key=key):
                 self.assertTrue(key in result)
 
+    def test_change_details_without_content(self):
+        self.make_document()
+        self.request.matchdict = {"change_id": self.get_changes_ids()[0]}
+        self.request.GET["content"] = "false"
+        result = restfulapi.fetch_change(self.request)
+        self.assertNotIn("content_gz_b64", result)
+        self.assertIn("content_hash", result)
+
+    def test_change_content_is_passed_through_as_gzip_encoding(self):
+        self.make_document()
+        change_id = self.get_changes_ids()[0]
+        self.request.matchdict = {"change_id": change_id}
+        self.request.accept_encoding = create_accept_encoding_header("gzip")
+        response = restfulapi.fetch_change_content(self.request)
+        details = restfulapi.fetch_change(self.request)
+        self.assertEqual(response.body, base64.b64decode(details["content_gz_b64"]))
+        self.assertEqual(response.content_encoding, "gzip")
+        self.assertEqual(response.content_type, details["content_type"])
+        self.assertEqual(response.etag, details["content_hash"])
+
+    def test_change_content_as_application_gzip(self):
+        self.make_document()
+        self.request.matchdict = {"change_id": self.get_changes_ids()[0]}
+        self.request.accept_encoding = create_accept_encoding_header("identity")
+        response = restfulapi.fetch_change_content(self.request)
+        self.assertEqual(response.content_type, "application/gzip")
+        self.assertIsNone(response.content_encoding)
+        self.assertIn(b"<article", gzip.decompress(response.body))
+
+    def test_change_content_representations_have_distinct_etags(self):
+        self.make_document()
+        self.request.matchdict = {"change_id": self.get_changes_ids()[0]}
+        etags = set()
+        for accept_encoding in ["gzip", "identity"]:
+            self.request.accept_encoding = create_accept_encoding_header(
+                accept_encoding
+            )
+            etags.add(restfulapi.fetch_change_content(self.request).etag)
+        self.assertEqual(len(etags), 2)
+
+    def test_change_content_of_unknown_change(self):
+        self.request.matchdict = {"change_id": "missing"}
+        self.request.accept_encoding = create_accept_encoding_header("gzip")
+        self.assertRaises(HTTPNotFound, restfulapi.fetch_change_content, self.request)
+
 
 class CreateJournalUnitTests(unittest.TestCase):
     def setUp(self):
@@ -991,3 +1172,118 @@ class DeleteDocumentUnitTests(unittest.TestCase):
         request.matchdict = {"document_id": "unknown"}
         request.services["delete_document"] = Mock()
         self.assertRaises(HTTPNoContent, restfulapi.delete_document, request)
+
+
+class UpdateConflictUnitTests(unittest.TestCase):
+    def test_returns_http_409(self):
+        response = restfulapi.update_conflict(exceptions.UpdateConflict(), None)
+        self.assertEqual(response.status_code, 409)
+
+
+@patch("documentstore.domain.fetch_data", new=fetch_data_stub)
+class PostDocumentsBulkUnitTests(unittest.TestCase):
+    def make_request(self, *ids):
+        request = make_request()
+        request.validated = {
+            "documents": [
+                {"id": id, **apptesting.document_registry_data_fixture()}
+                for id in ids
+            ]
+        }
+        return request
+
+    def test_new_documents_are_created(self):
+        request = self.make_request("doc-1", "doc-2")
+        self.assertEqual(
+            restfulapi.post_documents_bulk(request),
+            {
+                "results": [
+                    {"id": "doc-1", "status": "created"},
+                    {"id": "doc-2", "status": "created"},
+                ]
+            },
+        )
+
+    def test_existing_documents_are_reported_as_unchanged(self):
+        request = self.make_request("doc-1")
+        restfulapi.post_documents_bulk(request)
+        request.validated = self.make_request("doc-1", "doc-2").validated
+        self.assertEqual(
+            restfulapi.post_documents_bulk(request),
+            {
+                "results": [
+                    {"id": "doc-1", "status": "unchanged"},
+                    {"id": "doc-2", "status": "created"},
+                ]
+            },
+        )
+
+    def test_response_matches_the_result_schema(self):
+        request = self.make_request("doc-1", "doc-2")
+        response = restfulapi.post_documents_bulk(request)
+        self.assertEqual(
+            restfulapi.RegisterDocumentsResultSchema().deserialize(response), response
+        )
+
+    def test_assets_are_converted_to_mapping(self):
+        request = self.make_request("doc-1")
+        request.services["register_documents"] = Mock(return_value=[])
+        restfulapi.post_documents_bulk(request)
+        documents = request.services["register_documents"].call_args[1]["documents"]
+        self.assertEqual(
+            documents[0]["assets"]["0034-8910-rsp-48-2-0347-gf01"],
+            "http://www.scielo.br/img/revistas/rsp/v48n2/0034-8910-rsp-48-2-0347-gf01.jpg",
+        )
+
+
+class GetBulkUnitTests(unittest.TestCase):
+    def test_ids_may_be_repeated_or_comma_separated(self):
+        request = make_request()
+        request.GET = MultiDict([("ids", "j1,j2"), ("ids", "j3")])
+        request.services["fetch_journals"] = Mock(return_value={})
+        restfulapi.get_journals_bulk(request)
+        request.services["fetch_journals"].assert_called_once_with(
+            ids=["j1", "j2", "j3"]
+        )
+
+    def test_missing_ids_returns_400(self):
+        request = make_request()
+        request.GET = MultiDict()
+        self.assertRaises(
+            HTTPBadRequest, restfulapi.get_documents_bundles_bulk, request
+        )
+
+    def test_documents_manifests_are_returned(self):
+        request = make_request()
+        request.GET = MultiDict([("ids", "doc-1")])
+        self.assertEqual(
+            restfulapi.get_documents_bulk(request), {"items": [], "missing": ["doc-1"]}
+        )
+
+
+class SessionScopeTweenTests(unittest.TestCase):
+    def test_requests_are_handled_inside_a_session_scope(self):
+        handler = Mock(side_effect=lambda request: services._SESSION_SCOPE.get())
+        tween = restfulapi.session_scope_tween_factory(handler, None)
+        self.assertEqual(tween(testing.DummyRequest()), {})
+        self.assertIsNone(services._SESSION_SCOPE.get())
+
+
+class ExitOnSigtermTests(unittest.TestCase):
+    def test_sigterm_raises_system_exit(self):
+        with patch.object(
+            restfulapi.signal, "getsignal", return_value=restfulapi.signal.SIG_DFL
+        ), patch.object(restfulapi.signal, "signal") as mock_signal:
+            restfulapi._exit_on_sigterm()
+        signum, handler = mock_signal.call_args[0]
+        self.assertEqual(signum, restfulapi.signal.SIGTERM)
+        with self.assertRaises(SystemExit) as context:
+            handler(signum, None)
+        self.assertEqual(context.exception.code, 128 + signum)
+
+    def test_installed_handlers_are_kept(self):
+        with patch.object(
+            restfulapi.signal, "getsignal", return_value=lambda signum, frame: None
+        ), patch.object(restfulapi.signal, "signal") as mock_signal:
+            restfulapi._exit_on_sigterm()
+        mock_signal.assert_not_called()
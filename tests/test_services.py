@@ -1,7 +1,12 @@
 import unittest
 from unittest import mock
+import base64
 import datetime
+import json
 import random
+import threading
+import time
+from copy import deepcopy
 
 from bson.objectid import ObjectId
 from documentstore import services, exceptions, domain
@@ -95,6 +100,15 @@ class FetchDocumentsBundleTest(CommandTestMixin, unittest.TestCase):
             result["items"], [{"id": "/document/1"}, {"id": "/document/2"}]
         )
 
+    def test_result_can_be_modified(self):
+        self.services["create_documents_bundle"](id="xpto")
+        self.command(id="xpto")["items"].append({"id": "/document/1"})
+        self.assertEqual(self.command(id="xpto")["items"], [])
+        self.services["fetch_documents_bundles"](ids=["xpto"])["items"][0][
+            "items"
+        ].append({"id": "/document/1"})
+        self.assertEqual(self.command(id="xpto")["items"], [])
+
     def test_command_with_metadata_success(self):
         self.services["create_documents_bundle"](
             id="xpto", metadata={"publication_year": "2018", "volume": "2"}
@@ -832,6 +846,14 @@ class FetchJournalTest(CommandTestMixin, unittest.TestCase):
     def test_should_require_an_id(self):
         self.assertRaises(TypeError, self.command)
 
+    def test_result_can_be_modified(self):
+        self.command(id="1678-4596-cr-49-02")["items"].append({"id": "issue-1"})
+        self.assertEqual(self.command(id="1678-4596-cr-49-02")["items"], [])
+        self.services["fetch_journals"](ids=["1678-4596-cr-49-02"])["items"][0][
+            "items"
+        ].append({"id": "issue-1"})
+        self.assertEqual(self.command(id="1678-4596-cr-49-02")["items"], [])
+
 
 class UpdateJornalMetadataTest(CommandTestMixin, unittest.TestCase):
     def setUp(self):
@@ -1137,6 +1159,104 @@ class DeleteDocumentTest(CommandTestMixin, unittest.TestCase):
             )
 
 
+class ExportSnapshotTest(CommandTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        self.command = self.services["export_snapshot"]
+
+    def test_empty_snapshot(self):
+        self.assertEqual(list(self.command()), [{"cursor": None, "timestamp": ""}])
+
+    def test_first_record_is_the_latest_change_cursor(self):
+        for i in range(2):
+            self.session.changes.add(
+                {
+                    "timestamp": "2018-08-05T23:08:50.33168%sZ" % i,
+                    "entity": "Journal",
+                    "id": "journal-1",
+                }
+            )
+        header = next(self.command())
+        self.assertEqual(header["timestamp"], "2018-08-05T23:08:50.331681Z")
+        self.assertEqual(
+            services.decode_changes_cursor(header["cursor"])[0],
+            "2018-08-05T23:08:50.331681Z",
+        )
+
+    def test_entities_current_state(self):
+        self.session.journals.add(domain.Journal(id="journal-1"))
+        self.session.documents_bundles.add(domain.DocumentsBundle(id="bundle-1"))
+        document = domain.Document(manifest=apptesting.manifest_data_fixture())
+        self.session.documents.add(document)
+        self.session.rendered_documents.add(document.data_key(), b"<article/>")
+
+        records = list(self.command())[1:]
+        self.assertEqual(
+            [(r["entity"], r["id"]) for r in records],
+            [
+                ("Journal", "journal-1"),
+                ("DocumentsBundle", "bundle-1"),
+                ("Document", document.id()),
+            ],
+        )
+        self.assertEqual(json.loads(records[0]["content"])["id"], "journal-1")
+        self.assertEqual(records[0]["content_type"], "application/json")
+        self.assertEqual(records[2]["content"], "<article/>")
+
+    def test_deleted_documents(self):
+        document = domain.Document(manifest=apptesting.manifest_data_fixture())
+        self.session.documents.add(document)
+        self.services["delete_document"](document.id())
+        self.assertEqual(
+            list(self.command())[1:],
+            [{"entity": "Document", "id": document.id(), "deleted": True}],
+        )
+
+    def test_document_renditions(self):
+        document = domain.Document(manifest=apptesting.manifest_data_fixture())
+        self.session.documents.add(document)
+        self.session.rendered_documents.add(document.data_key(), b"<article/>")
+        self.services["register_rendition_version"](
+            document.id(),
+            "0034-8910-rsp-48-2-0275-pt.pdf",
+            "https://link.to/0034-8910-rsp-48-2-0275-pt.pdf",
+            "application/pdf",
+            "pt",
+            23456,
+        )
+        records = list(self.command())[1:]
+        self.assertEqual(
+            [(r["entity"], r["id"]) for r in records],
+            [("Document", document.id()), ("DocumentRendition", document.id())],
+        )
+        self.assertEqual(
+            json.loads(records[1]["content"]),
+            self.services["fetch_document_renditions"](document.id()),
+        )
+
+    def test_unavailable_contents_do_not_interrupt_the_export(self):
+        self.session.journals.add(domain.Journal(id="journal-1"))
+        self.session.journals.add(domain.Journal(id="journal-2"))
+        with mock.patch.object(
+            domain.Journal,
+            "data_bytes",
+            side_effect=[exceptions.RetryableError("timeout"), b'{"id": 2}'],
+        ):
+            records = list(self.command())[1:]
+        self.assertEqual(
+            records,
+            [
+                {"entity": "Journal", "id": "journal-1", "error": "timeout"},
+                {
+                    "entity": "Journal",
+                    "id": "journal-2",
+                    "content_type": "application/json",
+                    "content": '{"id": 2}',
+                },
+            ],
+        )
+
+
 class FetchChangeTest(CommandTestMixin, unittest.TestCase):
     def setUp(self):
         self.services, self.session = make_services()
@@ -1162,3 +1282,891 @@ class FetchChangeTest(CommandTestMixin, unittest.TestCase):
 
     def test_should_require_an_id(self):
         self.assertRaises(TypeError, self.command)
+
+
+class ChangesCursorTest(unittest.TestCase):
+    def test_cursor_roundtrip(self):
+        change = {"timestamp": "2018-08-05T23:08:50.331687Z", "_id": ObjectId()}
+        self.assertEqual(
+            services.decode_changes_cursor(services.encode_changes_cursor(change)),
+            (change["timestamp"], str(change["_id"])),
+        )
+
+    def test_invalid_cursor_raises_value_error(self):
+        for cursor in ["xxx", "", "WzFd", "eyJhIjogMX0="]:
+            with self.subTest(cursor=cursor):
+                self.assertRaises(ValueError, services.decode_changes_cursor, cursor)
+
+    def test_cursor_with_invalid_id_raises_value_error(self):
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(["2018-08-05T23:08:50.331687Z", "invalid"]).encode("utf-8")
+        ).decode("ascii")
+        self.assertRaises(ValueError, services.decode_changes_cursor, cursor)
+
+
+class FetchChangesCursorTest(CommandTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        for i in range(5):
+            self.session.changes.add(
+                {
+                    "_id": str(ObjectId()),
+                    "timestamp": "2018-08-05T23:08:50.33168%sZ" % i,
+                    "entity": "Document",
+                    "id": "doc-%s" % i,
+                }
+            )
+        self.command = self.services.get("fetch_changes")
+
+    def test_cursor_resumes_after_the_given_change(self):
+        first_page = list(self.command(limit=2))
+        cursor = services.encode_changes_cursor(first_page[-1])
+        second_page = list(self.command(cursor=cursor, limit=2))
+        self.assertEqual(
+            [c["id"] for c in first_page + second_page],
+            ["doc-0", "doc-1", "doc-2", "doc-3"],
+        )
+
+    def test_invalid_cursor_raises_value_error(self):
+        self.assertRaises(ValueError, self.command, cursor="xxx")
+
+    def test_until_limits_the_changes(self):
+        changes = list(self.command(until="2018-08-05T23:08:50.331682Z"))
+        self.assertEqual([c["id"] for c in changes], ["doc-0", "doc-1", "doc-2"])
+
+    def test_ranges_cover_all_changes_once(self):
+        ranges = self.session.changes.ranges(2)
+        changes = [
+            c["id"]
+            for since, until in ranges
+            for c in self.command(since=since, until=until)
+        ]
+        self.assertEqual(len(ranges), 2)
+        self.assertEqual(changes, ["doc-0", "doc-1", "doc-2", "doc-3", "doc-4"])
+
+    def test_wait_returns_a_list(self):
+        self.assertEqual(len(self.command(wait=0.01)), 5)
+
+
+class FetchChangesFilterTest(CommandTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        for i, (entity, id) in enumerate(
+            [
+                ("Document", "0034-8910-rsp-1"),
+                ("Journal", "0034-8910"),
+                ("Document", "0034-8910-rsp-2"),
+                ("Document", "1678-4596-cr-1"),
+                ("Document", "0034-8910-rsp-1"),
+            ]
+        ):
+            self.session.changes.add(
+                {
+                    "timestamp": "2018-08-05T23:08:50.33168%sZ" % i,
+                    "entity": entity,
+                    "id": id,
+                }
+            )
+        self.command = self.services.get("fetch_changes")
+
+    def test_filter_by_entity(self):
+        self.assertEqual(
+            [c["id"] for c in self.command(entity="Journal")], ["0034-8910"]
+        )
+
+    def test_filter_by_id(self):
+        changes = list(self.command(entity="Document", id="0034-8910-rsp-1"))
+        self.assertEqual(
+            [c["timestamp"] for c in changes],
+            ["2018-08-05T23:08:50.331680Z", "2018-08-05T23:08:50.331684Z"],
+        )
+
+    def test_compacted_changes(self):
+        self.assertEqual(
+            [(c["entity"], c["id"]) for c in self.command(compacted=True)],
+            [
+                ("Journal", "0034-8910"),
+                ("Document", "0034-8910-rsp-2"),
+                ("Document", "1678-4596-cr-1"),
+                ("Document", "0034-8910-rsp-1"),
+            ],
+        )
+
+    def test_filter_by_id_prefix(self):
+        self.assertEqual(
+            [c["id"] for c in self.command(entity="Document", id_prefix="0034-8910")],
+            ["0034-8910-rsp-1", "0034-8910-rsp-2", "0034-8910-rsp-1"],
+        )
+
+
+class ChangesNotifierTest(unittest.TestCase):
+    def setUp(self):
+        self.notifier = services.ChangesNotifier()
+
+    def test_wait_returns_when_notified(self):
+        version = self.notifier.version()
+        threading.Timer(0.01, self.notifier.notify).start()
+        self.assertTrue(self.notifier.wait(version, timeout=5))
+
+    def test_notifications_before_the_wait_are_not_lost(self):
+        version = self.notifier.version()
+        self.notifier.notify()
+        self.assertTrue(self.notifier.wait(version, timeout=0))
+
+    def test_wait_times_out(self):
+        self.assertFalse(self.notifier.wait(self.notifier.version(), timeout=0.01))
+
+    def test_log_change_notifies(self):
+        version = services.CHANGES_NOTIFIER.version()
+        services.log_change(
+            {"id": "journal-1", "instance": domain.Journal(id="journal-1")},
+            apptesting.Session(),
+            entity="Journal",
+        )
+        self.assertNotEqual(services.CHANGES_NOTIFIER.version(), version)
+
+
+class WaitForChangesTest(unittest.TestCase):
+    def setUp(self):
+        self.notifier = services.ChangesNotifier()
+        self.changes = []
+
+    def test_returns_the_available_changes_immediately(self):
+        self.changes.append({"id": "doc-1"})
+        fetch = mock.Mock(return_value=self.changes)
+        self.assertEqual(
+            services.wait_for_changes(fetch, 5, notifier=self.notifier),
+            [{"id": "doc-1"}],
+        )
+        fetch.assert_called_once_with()
+
+    def test_returns_when_notified_of_new_changes(self):
+        def add_change():
+            self.changes.append({"id": "doc-1"})
+            self.notifier.notify()
+
+        threading.Timer(0.01, add_change).start()
+        self.assertEqual(
+            services.wait_for_changes(
+                lambda: self.changes, 5, recheck_interval=5, notifier=self.notifier
+            ),
+            [{"id": "doc-1"}],
+        )
+
+    def test_changes_are_rechecked_without_notifications(self):
+        threading.Timer(0.01, self.changes.append, [{"id": "doc-1"}]).start()
+        self.assertEqual(
+            services.wait_for_changes(
+                lambda: self.changes, 5, recheck_interval=0.01, notifier=self.notifier
+            ),
+            [{"id": "doc-1"}],
+        )
+
+    def test_returns_empty_list_on_timeout(self):
+        self.assertEqual(
+            services.wait_for_changes(lambda: [], 0.01, notifier=self.notifier), []
+        )
+
+
+class FetchDocumentDataTest(CommandTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        self.command = self.services["fetch_document_data"]
+        self.document = domain.Document(manifest=apptesting.manifest_data_fixture())
+        self.session.documents.add(self.document)
+
+    def test_rendered_data_is_returned_without_rendering(self):
+        self.session.rendered_documents.add(self.document.data_key(), b"<article/>")
+        with mock.patch.object(domain.Document, "data") as mock_data:
+            self.assertEqual(self.command(self.document.id()), b"<article/>")
+            mock_data.assert_not_called()
+
+    def test_missing_rendered_data_is_rendered_and_stored(self):
+        with mock.patch.object(
+            domain.Document, "data", return_value=b"<article/>"
+        ) as mock_data:
+            self.assertEqual(self.command(self.document.id()), b"<article/>")
+            self.assertEqual(self.command(self.document.id()), b"<article/>")
+            mock_data.assert_called_once_with(version_index=-1, version_at=None)
+        self.assertEqual(
+            self.session.rendered_documents.fetch(self.document.data_key()),
+            b"<article/>",
+        )
+
+    def test_data_is_rendered_when_materialization_is_disabled(self):
+        with mock.patch.object(
+            type(self.session), "rendered_documents", new_callable=mock.PropertyMock
+        ) as mock_rendered_documents, mock.patch.object(
+            domain.Document, "data", return_value=b"<article/>"
+        ) as mock_data:
+            mock_rendered_documents.return_value = None
+            self.assertEqual(self.command(self.document.id()), b"<article/>")
+            mock_data.assert_called_once_with(version_index=-1, version_at=None)
+
+
+class MaterializeDocumentDataTest(unittest.TestCase):
+    def setUp(self):
+        self.session = apptesting.Session()
+        self.document = domain.Document(manifest=apptesting.manifest_data_fixture())
+
+    def test_rendered_data_is_stored_by_its_key(self):
+        with mock.patch.object(domain.Document, "data", return_value=b"<article/>"):
+            services.materialize_document_data(
+                {"instance": self.document}, self.session
+            )
+        self.assertEqual(
+            self.session.rendered_documents.fetch(self.document.data_key()),
+            b"<article/>",
+        )
+
+    def test_xml_is_rendered_once_for_the_change_log_and_materialization(self):
+        with mock.patch.object(
+            domain.Document, "_data", return_value=b"<article/>"
+        ) as mock_data:
+            services.log_change(
+                {"instance": self.document, "id": self.document.id()},
+                self.session,
+                entity="Document",
+            )
+            services.materialize_document_data(
+                {"instance": self.document}, self.session
+            )
+        mock_data.assert_called_once()
+
+    def test_subscribed_to_document_changing_events(self):
+        events = [
+            event
+            for event, callback in services.DEFAULT_SUBSCRIBERS
+            if callback is services.materialize_document_data
+        ]
+        self.assertEqual(
+            events,
+            [
+                services.Events.DOCUMENT_REGISTERED,
+                services.Events.DOCUMENT_VERSION_REGISTERED,
+                services.Events.ASSET_VERSION_REGISTERED,
+            ],
+        )
+
+
+class RetryOnConflictTest(unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        self.command = self.services["add_document_to_documents_bundle"]
+        self.session.documents_bundles.add(domain.DocumentsBundle(id="bundle-1"))
+        sleep = mock.patch.object(services.retry_on_conflict, "_sleep")
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_command_is_retried_from_a_fresh_read(self):
+        with mock.patch.object(
+            self.session.documents_bundles,
+            "update",
+            side_effect=[exceptions.UpdateConflict(), None],
+        ) as mock_update, mock.patch.object(
+            self.session.documents_bundles,
+            "fetch",
+            wraps=self.session.documents_bundles.fetch,
+        ) as mock_fetch:
+            self.command(id="bundle-1", doc={"id": "doc-1"})
+        self.assertEqual(mock_update.call_count, 2)
+        self.assertEqual(mock_fetch.call_count, 2)
+
+    def test_conflict_is_raised_after_max_retries(self):
+        with mock.patch.object(
+            self.session.documents_bundles,
+            "update",
+            side_effect=exceptions.UpdateConflict(),
+        ) as mock_update:
+            self.assertRaises(
+                exceptions.UpdateConflict,
+                self.command,
+                id="bundle-1",
+                doc={"id": "doc-1"},
+            )
+        self.assertEqual(
+            mock_update.call_count, services.retry_on_conflict.max_retries + 1
+        )
+
+
+@mock.patch(
+    "documentstore.domain.fetch_data",
+    new=lambda url, timeout=None: b'<article xmlns:xlink="http://www.w3.org/1999/xlink"/>',
+)
+class RegisterDocumentOrVersionTest(CommandTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        self.command = self.services["register_document_or_version"]
+
+    def test_new_documents_are_created(self):
+        self.assertTrue(self.command(id="doc-1", data_url="/rawfiles/ab12/0347.xml"))
+        self.assertEqual(len(self.session.documents.fetch("doc-1").manifest_view["versions"]), 1)
+
+    def test_existing_documents_get_a_new_version(self):
+        self.command(id="doc-1", data_url="/rawfiles/ab12/0347.xml")
+        self.assertFalse(self.command(id="doc-1", data_url="/rawfiles/cd34/0347.xml"))
+        self.assertEqual(len(self.session.documents.fetch("doc-1").manifest_view["versions"]), 2)
+
+    def test_notify_events(self):
+        with mock.patch.object(self.session, "notify") as mock_notify:
+            self.command(id="doc-1", data_url="/rawfiles/ab12/0347.xml")
+            self.command(id="doc-1", data_url="/rawfiles/cd34/0347.xml")
+        self.assertEqual(
+            [call[0][0] for call in mock_notify.call_args_list],
+            [
+                services.Events.DOCUMENT_REGISTERED,
+                services.Events.DOCUMENT_VERSION_REGISTERED,
+            ],
+        )
+
+    def test_repeated_version_is_detected_before_fetching_the_xml(self):
+        self.command(id="doc-1", data_url="/rawfiles/ab12/0347.xml")
+        with mock.patch("documentstore.domain.fetch_data") as mock_fetch_data:
+            self.assertRaises(
+                exceptions.VersionAlreadySet,
+                self.command,
+                id="doc-1",
+                data_url="/rawfiles/ab12/0347.xml",
+            )
+        mock_fetch_data.assert_not_called()
+
+    def test_concurrent_registration_is_retried_as_a_new_version(self):
+        add = self.session.documents.add
+
+        def add_concurrently(document):
+            other = domain.Document(id=document.id())
+            other.new_version("/rawfiles/ef56/0347.xml")
+            add(other)
+            add(document)
+
+        with mock.patch.object(
+            services.retry_on_conflict, "_sleep"
+        ), mock.patch.object(
+            self.session.documents, "add", side_effect=add_concurrently
+        ):
+            self.assertFalse(
+                self.command(id="doc-1", data_url="/rawfiles/ab12/0347.xml")
+            )
+        self.assertEqual(len(self.session.documents.fetch("doc-1").manifest_view["versions"]), 2)
+
+
+@mock.patch(
+    "documentstore.domain.fetch_data",
+    new=lambda url, timeout=None: b'<article xmlns:xlink="http://www.w3.org/1999/xlink"/>',
+)
+class RegisterDocumentsTest(CommandTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        self.command = self.services["register_documents"]
+        self.event = services.Events.DOCUMENTS_REGISTERED
+
+    def make_item(self, id, data_url="/rawfiles/ab12/0347.xml"):
+        return {"id": id, "data_url": data_url, "assets": {}}
+
+    def test_event(self):
+        self.assertIn(self.event, self.SUBSCRIBERS_EVENTS)
+
+    def test_documents_are_added_at_once(self):
+        with mock.patch.object(
+            self.session.documents,
+            "add_many",
+            wraps=self.session.documents.add_many,
+        ) as mock_add_many:
+            self.command([self.make_item("doc-1"), self.make_item("doc-2")])
+        mock_add_many.assert_called_once()
+        self.assertEqual(self.session.documents.fetch("doc-2").id(), "doc-2")
+
+    def test_per_item_status(self):
+        self.command([self.make_item("doc-1"), self.make_item("doc-2")])
+        self.assertEqual(
+            self.command(
+                [
+                    self.make_item("doc-1"),
+                    self.make_item("doc-2", "/rawfiles/cd34/0347.xml"),
+                    self.make_item("doc-3"),
+                ]
+            ),
+            [
+                {"id": "doc-1", "status": "unchanged"},
+                {"id": "doc-2", "status": "updated"},
+                {"id": "doc-3", "status": "created"},
+            ],
+        )
+
+    def test_failures_do_not_affect_other_items(self):
+        with mock.patch.object(
+            services.RegisterDocuments,
+            "_new_document",
+            side_effect=[exceptions.NonRetryableError("boom"), domain.Document(id="doc-2")],
+        ):
+            results = self.command([self.make_item("doc-1"), self.make_item("doc-2")])
+        self.assertEqual(
+            results,
+            [
+                {"id": "doc-1", "status": "error", "error": "boom"},
+                {"id": "doc-2", "status": "created"},
+            ],
+        )
+
+    def test_changes_are_logged_for_the_inserted_subset(self):
+        with mock.patch.object(
+            self.session.documents,
+            "add_many",
+            return_value=[exceptions.NonRetryableError("bad value"), None],
+        ), mock.patch.object(self.session, "notify") as mock_notify:
+            results = self.command([self.make_item("doc-1"), self.make_item("doc-2")])
+        self.assertEqual(
+            results,
+            [
+                {"id": "doc-1", "status": "error", "error": "bad value"},
+                {"id": "doc-2", "status": "created"},
+            ],
+        )
+        mock_notify.assert_called_once_with(
+            self.event, {"instances": [mock.ANY], "ids": ["doc-2"]}
+        )
+
+    def test_command_notify_event_for_created_documents(self):
+        self.command([self.make_item("doc-1")])
+        with mock.patch.object(self.session, "notify") as mock_notify:
+            self.command([self.make_item("doc-1"), self.make_item("doc-2")])
+        mock_notify.assert_called_once_with(
+            self.event, {"instances": [mock.ANY], "ids": ["doc-2"]}
+        )
+
+
+class LogChangeContentHashTest(unittest.TestCase):
+    def test_identical_contents_have_the_same_hash(self):
+        session = apptesting.Session()
+        journal = domain.Journal(id="journal-1")
+        for _ in range(2):
+            services.log_change(
+                {"instance": journal, "id": "journal-1"}, session, entity="Journal"
+            )
+        hashes = [change["content_hash"] for change in session.changes.filter()]
+        self.assertEqual(
+            hashes, [services.hashlib.sha256(journal.data_bytes()).hexdigest()] * 2
+        )
+
+    def test_deleted_changes_have_no_hash(self):
+        session = apptesting.Session()
+        services.log_change({"id": "doc-1"}, session, entity="Document", deleted=True)
+        self.assertNotIn("content_hash", session.changes.filter()[0])
+
+
+class LogChangesTest(unittest.TestCase):
+    def test_changes_are_added_at_once_with_increasing_timestamps(self):
+        session = apptesting.Session()
+        instances = [domain.Journal(id="journal-1"), domain.Journal(id="journal-2")]
+        with mock.patch.object(
+            session.changes, "add_many", wraps=session.changes.add_many
+        ) as mock_add_many:
+            services.log_changes(
+                {"instances": instances},
+                session,
+                now=lambda: "2018-08-05T23:03:44.971230Z",
+                entity="Journal",
+            )
+        mock_add_many.assert_called_once()
+        self.assertEqual(
+            [(change["id"], change["timestamp"]) for change in session.changes.filter()],
+            [
+                ("journal-1", "2018-08-05T23:03:44.971230Z"),
+                ("journal-2", "2018-08-05T23:03:44.971231Z"),
+            ],
+        )
+
+
+class ChangesWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.session = apptesting.Session()
+        self.writer = services.ChangesWriter(
+            lambda: self.session, workers=1, ack_timeout=5
+        )
+        self.addCleanup(self.writer.close)
+
+    def make_change(self, id, timestamp="2018-08-05T23:03:44.971230Z"):
+        return {"timestamp": timestamp, "entity": "Journal", "id": id}
+
+    def test_content_is_compressed_and_written(self):
+        future = self.writer.submit(self.make_change("journal-1"), b'{"id": 1}')
+        self.assertIsNone(future.result(timeout=5))
+        change = self.session.changes.filter()[0]
+        self.assertEqual(services.gzip.decompress(change["content_gz"]), b'{"id": 1}')
+
+    def test_changes_are_written_in_batches(self):
+        with mock.patch.object(
+            self.session.changes, "add_many", wraps=self.session.changes.add_many
+        ) as mock_add_many:
+            futures = self.writer.submit_many(
+                [
+                    (self.make_change("journal-1"), None),
+                    (
+                        self.make_change("journal-2", "2018-08-05T23:03:44.971231Z"),
+                        None,
+                    ),
+                ]
+            )
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertLessEqual(mock_add_many.call_count, 2)
+        self.assertEqual(len(self.session.changes.filter()), 2)
+
+    def test_conflicts_affect_only_the_conflicting_changes(self):
+        self.writer.submit(self.make_change("journal-1")).result(timeout=5)
+        futures = self.writer.submit_many(
+            [
+                (self.make_change("journal-2"), None),
+                (self.make_change("journal-3", "2018-08-05T23:03:44.971231Z"), None),
+            ]
+        )
+        self.assertRaises(exceptions.AlreadyExists, futures[0].result, timeout=5)
+        self.assertIsNone(futures[1].result(timeout=5))
+
+    def test_close_writes_pending_changes(self):
+        writer = services.ChangesWriter(lambda: self.session, workers=2)
+        futures = [
+            writer.submit(
+                self.make_change("journal-%d" % i, "2018-08-05T23:03:44.97123%dZ" % i)
+            )
+            for i in range(5)
+        ]
+        writer.close()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(len(self.session.changes.filter()), 5)
+
+    def test_batches_are_written_in_submission_order(self):
+        def compress(content):
+            if content == b"slow":
+                time.sleep(0.1)
+            return content
+
+        writer = services.ChangesWriter(
+            lambda: self.session, workers=2, batch_size=1, compress=compress
+        )
+        self.addCleanup(writer.close)
+        written = []
+        with mock.patch.object(
+            self.session.changes,
+            "add_many",
+            side_effect=lambda changes: written.extend(c["id"] for c in changes),
+        ):
+            futures = writer.submit_many(
+                [
+                    (self.make_change("journal-1"), b"slow"),
+                    (
+                        self.make_change("journal-2", "2018-08-05T23:03:44.971231Z"),
+                        b"fast",
+                    ),
+                ]
+            )
+            for future in futures:
+                future.result(timeout=5)
+        self.assertEqual(written, ["journal-1", "journal-2"])
+
+    def test_log_change_submits_to_the_writer(self):
+        services.set_changes_writer(self.writer)
+        self.addCleanup(services.set_changes_writer, None)
+        request_session = apptesting.Session()
+        services.log_change(
+            {"instance": domain.Journal(id="journal-1"), "id": "journal-1"},
+            request_session,
+            entity="Journal",
+        )
+        self.assertEqual(request_session.changes.filter(), [])
+        self.assertEqual(self.session.changes.filter()[0]["id"], "journal-1")
+
+
+class JSONDiffTest(unittest.TestCase):
+    def assertRoundTrip(self, old, new):
+        operations = services.json_diff(old, new)
+        self.assertEqual(services.json_patch(deepcopy(old), operations), new)
+        return operations
+
+    def test_equal_values(self):
+        self.assertEqual(self.assertRoundTrip({"a": [1]}, {"a": [1]}), [])
+
+    def test_dict_changes(self):
+        self.assertRoundTrip(
+            {"a": 1, "b": {"c": 2}, "d": 3}, {"a": 1, "b": {"c": 4}, "e": 5}
+        )
+
+    def test_items_appended_to_list(self):
+        operations = self.assertRoundTrip(
+            {"items": [{"id": 1}, {"id": 2}]},
+            {"items": [{"id": 1}, {"id": 2}, {"id": 3}]},
+        )
+        self.assertEqual(
+            operations, [{"op": "add", "path": "/items/2", "value": {"id": 3}}]
+        )
+
+    def test_items_inserted_and_removed(self):
+        self.assertRoundTrip([1, 2, 3, 4], [0, 1, 3, 5, 4])
+        self.assertRoundTrip([1, 2, 3], [])
+        self.assertRoundTrip([], [1, 2])
+
+    def test_item_modified_in_place(self):
+        operations = self.assertRoundTrip(
+            [{"id": 1, "order": 1}, {"id": 2}], [{"id": 1, "order": 2}, {"id": 2}]
+        )
+        self.assertEqual(
+            operations, [{"op": "replace", "path": "/0/order", "value": 2}]
+        )
+
+    def test_keys_are_escaped(self):
+        self.assertRoundTrip({"a/b": 1, "c~d": 2}, {"a/b": 2, "c~d": 3})
+
+    def test_json_types_are_preserved(self):
+        for old, new in [(1, True), (0, False), (1, 1.0), (1.0, 1)]:
+            with self.subTest(old=old, new=new):
+                operations = self.assertRoundTrip({"a": [old, 2]}, {"a": [new, 2]})
+                self.assertEqual(
+                    operations, [{"op": "replace", "path": "/a/0", "value": new}]
+                )
+                patched = services.json_patch(deepcopy({"a": [old]}), operations)
+                self.assertIs(type(patched["a"][0]), type(new))
+
+    def test_type_changes(self):
+        self.assertRoundTrip({"a": [1]}, {"a": {"b": 1}})
+        self.assertRoundTrip([1], {"a": 1})
+
+
+class DeltaEncoderTest(unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        services.set_changes_delta_encoder(services.DeltaEncoder(keyframe_interval=2))
+        self.addCleanup(services.set_changes_delta_encoder, None)
+        self.journal = domain.Journal(id="journal-1")
+        self.journal.title = "Ciência Rural"
+        self.snapshots = []
+
+    def log_change(self):
+        services.log_change(
+            {"instance": self.journal, "id": "journal-1"},
+            self.session,
+            entity="Journal",
+        )
+        self.snapshots.append(self.journal.data())
+
+    def add_issues(self, count):
+        for i in range(count):
+            self.journal.add_issue({"id": "issue-%d" % i})
+            self.log_change()
+
+    def test_changes_are_stored_as_deltas_between_keyframes(self):
+        self.log_change()
+        self.add_issues(3)
+        changes = self.session.changes.filter()
+        self.assertEqual(
+            ["delta_gz" in change for change in changes], [False, True, True, False]
+        )
+        self.assertEqual(str(changes[1]["delta_base"]), changes[0]["_id"])
+
+    def test_fetch_change_reconstructs_the_snapshot(self):
+        self.log_change()
+        self.add_issues(3)
+        for change, snapshot in zip(self.session.changes.filter(), self.snapshots):
+            fetched = self.services["fetch_change"](id=change["_id"])
+            self.assertNotIn("delta_gz", fetched)
+            self.assertEqual(
+                services.json.loads(services.gzip.decompress(fetched["content_gz"])),
+                snapshot,
+            )
+
+    def test_reconstructed_contents_are_stable(self):
+        self.log_change()
+        self.add_issues(1)
+        change_id = self.session.changes.filter()[1]["_id"]
+        contents = []
+        for now in (1000.0, 2000.0):
+            with mock.patch("time.time", return_value=now):
+                contents.append(self.services["fetch_change"](id=change_id))
+        self.assertIn("content_gz", contents[0])
+        self.assertEqual(contents[0]["content_gz"], contents[1]["content_gz"])
+
+    def test_xml_contents_are_not_encoded(self):
+        document = mock.Mock(data_type="text/xml")
+        document.data_bytes.return_value = b"<article/>"
+        for _ in range(2):
+            services.log_change(
+                {"instance": document, "id": "doc-1"}, self.session, entity="Document"
+            )
+        self.assertTrue(
+            all("content_gz" in change for change in self.session.changes.filter())
+        )
+
+    def test_failed_writes_are_not_used_as_base(self):
+        self.log_change()
+        self.journal.add_issue({"id": "issue-1"})
+        with mock.patch.object(
+            self.session.changes, "add", side_effect=exceptions.AlreadyExists
+        ):
+            self.assertRaises(exceptions.AlreadyExists, self.log_change)
+        self.journal.add_issue({"id": "issue-2"})
+        self.log_change()
+        change = self.services["fetch_change"](
+            id=self.session.changes.filter()[-1]["_id"]
+        )
+        self.assertEqual(
+            services.json.loads(services.gzip.decompress(change["content_gz"])),
+            self.journal.data(),
+        )
+
+    def test_failed_background_writes_are_not_used_as_base(self):
+        self.log_change()
+        writer = services.ChangesWriter(lambda: self.session, batch_size=1)
+        services.set_changes_writer(writer)
+        self.addCleanup(services.set_changes_writer, None)
+        self.addCleanup(writer.close)
+        add_many = self.session.changes.add_many
+        started, proceed = threading.Event(), threading.Event()
+
+        def fail_first_write(changes):
+            if not started.is_set():
+                started.set()
+                proceed.wait(5)
+                raise RuntimeError()
+            add_many(changes)
+
+        with mock.patch.object(
+            self.session.changes, "add_many", side_effect=fail_first_write
+        ):
+            self.add_issues(1)
+            started.wait(5)
+            self.journal.add_issue({"id": "issue-2"})
+            self.log_change()
+            proceed.set()
+            writer.close()
+        change = self.services["fetch_change"](
+            id=self.session.changes.filter()[-1]["_id"]
+        )
+        self.assertEqual(
+            services.json.loads(services.gzip.decompress(change["content_gz"])),
+            self.journal.data(),
+        )
+
+    def test_snapshots_are_limited_by_size(self):
+        encoder = services.DeltaEncoder(max_bytes=100)
+        for id in ["journal-1", "journal-2", "journal-1"]:
+            change = {
+                "timestamp": "2018-08-05T23:03:44.971230Z",
+                "entity": "Journal",
+                "id": id,
+                "content_type": "application/json",
+            }
+            content, snapshot = encoder.encode(change, b'{"title": "%s"}' % (b"x" * 60))
+            encoder.remember(change, snapshot)
+        self.assertNotIn("delta_base", change)
+
+    def test_deltas_identify_the_keyframe_of_their_chain(self):
+        self.log_change()
+        self.add_issues(1)
+        keyframe, delta = self.session.changes.filter()
+        self.assertNotIn("delta_keyframe", keyframe)
+        self.assertEqual(delta["delta_keyframe"], keyframe["timestamp"])
+
+    def test_old_keyframes_are_not_used_as_base(self):
+        services.set_changes_delta_encoder(
+            services.DeltaEncoder(keyframe_interval=50, keyframe_max_age=3600)
+        )
+        timestamps = iter(["2018-08-05T10:00:00.000000Z", "2018-08-05T11:00:01Z"])
+        for issue in ["issue-1", "issue-2"]:
+            self.journal.add_issue({"id": issue})
+            services.log_change(
+                {"instance": self.journal, "id": "journal-1"},
+                self.session,
+                now=lambda: next(timestamps),
+                entity="Journal",
+            )
+        self.assertTrue(
+            all("content_gz" in change for change in self.session.changes.filter())
+        )
+
+
+class FetchManyTest(unittest.TestCase):
+    def setUp(self):
+        self.services, self.session = make_services()
+        self.session.documents.add(
+            domain.Document(manifest=apptesting.manifest_data_fixture())
+        )
+        self.session.documents_bundles.add(domain.DocumentsBundle(id="bundle-1"))
+        self.session.journals.add(domain.Journal(id="journal-1"))
+
+    def test_fetch_documents_manifests(self):
+        result = self.services["fetch_documents_manifests"](
+            ids=["missing", "0034-8910-rsp-48-2"]
+        )
+        self.assertEqual(result["missing"], ["missing"])
+        self.assertEqual(
+            [manifest["id"] for manifest in result["items"]], ["0034-8910-rsp-48-2"]
+        )
+
+    def test_fetch_documents_bundles(self):
+        result = self.services["fetch_documents_bundles"](ids=["bundle-1", "missing"])
+        self.assertEqual(result["missing"], ["missing"])
+        self.assertEqual(
+            result["items"], [self.session.documents_bundles.fetch("bundle-1").data()]
+        )
+
+    def test_fetch_journals(self):
+        result = self.services["fetch_journals"](ids=["journal-1"])
+        self.assertEqual(result["missing"], [])
+        self.assertEqual(
+            result["items"], [self.session.journals.fetch("journal-1").data()]
+        )
+
+
+class GetHandlersTest(unittest.TestCase):
+    def test_sessions_share_the_observers_table(self):
+        sessions = []
+
+        def Session():
+            session = apptesting.Session()
+            sessions.append(session)
+            return session
+
+        handlers = services.get_handlers(Session)
+        handlers["create_journal"](id="journal-1")
+        handlers["create_journal"](id="journal-2")
+        self.assertEqual(len(sessions), 2)
+        self.assertIs(sessions[0]._observers, sessions[1]._observers)
+
+    def test_observers_table_groups_callbacks_by_event(self):
+        callback = mock.Mock()
+        session = apptesting.Session()
+        handlers = services.get_handlers(
+            lambda: session,
+            subscribers=[
+                (services.Events.JOURNAL_CREATED, callback),
+                (services.Events.JOURNAL_CREATED, callback),
+            ],
+        )
+        handlers["create_journal"](id="journal-1")
+        callback.assert_called_once_with(mock.ANY, session)
+
+
+class SessionScopeTest(unittest.TestCase):
+    def setUp(self):
+        self.Session = mock.Mock(side_effect=apptesting.Session)
+        self.handlers = services.get_handlers(self.Session, subscribers=[])
+
+    def test_commands_share_the_session_inside_a_scope(self):
+        with services.session_scope():
+            self.handlers["create_journal"](id="journal-1")
+            self.assertEqual(
+                self.handlers["fetch_journal"](id="journal-1")["id"], "journal-1"
+            )
+        self.assertEqual(self.Session.call_count, 1)
+
+    def test_commands_use_new_sessions_outside_a_scope(self):
+        self.handlers["create_journal"](id="journal-1")
+        self.assertRaises(
+            exceptions.DoesNotExist, self.handlers["fetch_journal"], id="journal-1"
+        )
+        self.assertEqual(self.Session.call_count, 2)
+
+    def test_scopes_dont_share_sessions(self):
+        with services.session_scope():
+            self.handlers["create_journal"](id="journal-1")
+        with services.session_scope():
+            self.handlers["create_journal"](id="journal-1")
+        self.assertEqual(self.Session.call_count, 2)